@@ -1,136 +1,258 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
+import logging
 from datetime import datetime, timedelta
-from collections import defaultdict
 from typing import Optional, Literal
 
+from utils.wordfilter import WordMatcher
+from utils.ratelimit import SlidingWindow
+from utils.fingerprint import FingerprintWindow, fingerprint
+from utils.automod_rules import ACTIONS, MessageFeatures, RuleSet, parse_conditions
+from utils.textnorm import fold
+from utils.logdispatch import HIGH, NORMAL
+from utils.urls import DomainIndex, normalize_domain, parse_domain_list
+from utils.message_index import RecentMessages, bulk_delete
+from utils.settings import AutomodSettings, GuildSettings, defaults
+from utils.pipeline import MessageContext
+
+logger = logging.getLogger(__name__)
+
+# Caps on tracked senders and guilds, so a flood of unique accounts can't exhaust memory
+MAX_TRACKED_USERS = 50000
+MAX_TRACKED_GUILDS = 10000
+# Rate windows with no activity for this long are dropped by the sweeper
+RATE_WINDOW_IDLE_SECONDS = 300
+# Recent messages remembered per user for spam cleanup
+RECENT_MESSAGES_PER_USER = 50
+RECENT_MESSAGE_SECONDS = 120
+# Bulk delete requests in flight at once, shared by every cleanup
+BULK_DELETE_CONCURRENCY = 4
+# Automod runs before every other message stage
+PIPELINE_PRIORITY = 10
+# Per-server allow/block list size; bigger shared lists go in DOMAIN_BLOCKLIST
+MAX_GUILD_DOMAINS = 10000
+
 class AutoModeration(commands.Cog):
     """Auto-moderation system with anti-spam, anti-raid, and content filtering"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.message_cache = defaultdict(list)  # user_id: [timestamps]
-        self.join_cache = defaultdict(list)  # guild_id: [timestamps]
+        self.message_cache = SlidingWindow(MAX_TRACKED_USERS)  # (guild_id, user_id): message times
+        self.join_cache = SlidingWindow(MAX_TRACKED_GUILDS)  # guild_id: join times
         self.warned_users = set()
+        self.word_matchers = {}  # guild_id: (settings version, words, WordMatcher)
+        self.fingerprints = {}  # guild_id: FingerprintWindow of recent messages
+        self.rule_sets = {}  # guild_id: (settings version, RuleSet)
+        self.domain_indexes = {}  # guild_id: (settings version, domain lists, DomainIndex)
+        self.recent_messages = RecentMessages(RECENT_MESSAGES_PER_USER, MAX_TRACKED_USERS, RECENT_MESSAGE_SECONDS)
+        self.delete_semaphore = asyncio.Semaphore(BULK_DELETE_CONCURRENCY)
+        self.sweep_rate_windows.start()
+        bot.pipeline.register('automod', self.check_message, PIPELINE_PRIORITY)
+    
+    def cog_unload(self):
+        self.sweep_rate_windows.cancel()
+        self.bot.pipeline.unregister('automod')
+    
+    @tasks.loop(seconds=60)
+    async def sweep_rate_windows(self):
+        """Forget users and guilds that have gone quiet"""
+        self.message_cache.sweep(RATE_WINDOW_IDLE_SECONDS)
+        self.join_cache.sweep(RATE_WINDOW_IDLE_SECONDS)
+        self.recent_messages.sweep()
+        for guild_id, window in list(self.fingerprints.items()):
+            window.expire()
+            if not window:
+                del self.fingerprints[guild_id]
         
     def get_automod_config(self, guild_id: int) -> dict:
-        """Get automod configuration for a guild"""
+        """Get a guild's automod configuration as an editable dict, for commands that change it.
+        Message and join handlers read ``bot.settings`` instead."""
         guild_data = self.bot.data.get(str(guild_id), {})
-        return guild_data.get('automod', {
-            'enabled': False,
-            'anti_spam': True,
-            'anti_raid': True,
-            'spam_threshold': 5,  # messages
-            'spam_interval': 5,   # seconds
-            'spam_action': 'mute',  # warn, mute, kick, ban
-            'raid_threshold': 5,  # joins
-            'raid_interval': 10,  # seconds
-            'banned_words': [],
-            'banned_words_action': 'delete',  # delete, warn, mute
-            'mention_spam': True,
-            'mention_limit': 5,
-            'caps_spam': True,
-            'caps_percentage': 70,
-            'link_spam': False,
-            'exempt_roles': [],
-            'log_actions': True
-        })
+        config = defaults(AutomodSettings)
+        config.update(guild_data.get('automod', {}))
+        return config
     
     def save_automod_config(self, guild_id: int, config: dict):
         """Save automod configuration"""
         guild_data = self.bot.data.get(str(guild_id), {})
         guild_data['automod'] = config
         self.bot.data[str(guild_id)] = guild_data
-        self.bot.save_data()
+        self.bot.save_settings(guild_id)
     
-    def is_exempt(self, member: discord.Member, config: dict) -> bool:
-        """Check if member is exempt from automod"""
-        if member.guild_permissions.administrator:
-            return True
-        
-        exempt_roles = config.get('exempt_roles', [])
-        return any(role.id in exempt_roles for role in member.roles)
+    def build_rules(self, config: AutomodSettings) -> list:
+        """The built-in checks expressed as rules, followed by the guild's custom rules"""
+        rules = []
+        if config.banned_words:
+            rules.append({'name': 'Banned Word', 'conditions': [['banned_word', 'is', True]], 'handler': 'banned_word'})
+        if config.link_filter and (config.blocked_domains or len(self.bot.domain_blocklist)):
+            rules.append({'name': 'Blocked Link', 'conditions': [['blocked_links', '>=', 1]], 'handler': 'blocked_link'})
+        if config.mention_spam:
+            rules.append({
+                'name': 'Mention Spam',
+                'conditions': [['mentions', '>=', config.mention_limit]],
+                'handler': 'mention_spam'
+            })
+        if config.caps_spam:
+            rules.append({
+                'name': 'Caps Spam',
+                'conditions': [['length', '>', 10], ['caps_percent', '>=', config.caps_percentage]],
+                'handler': 'caps_spam'
+            })
+        if config.link_spam:
+            rules.append({'name': 'Link Spam', 'conditions': [['external_links', '>=', 1]], 'handler': 'link_spam'})
+        return rules + list(config.rules)
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """Monitor messages for spam and banned content"""
-        if not message.guild or message.author.bot:
-            return
-        
-        config = self.get_automod_config(message.guild.id)
-        
-        if not config.get('enabled', False):
-            return
+    def get_rule_set(self, guild_id: int, settings: GuildSettings) -> RuleSet:
+        """Get the guild's compiled rules, rebuilt when its settings change"""
+        cached = self.rule_sets.get(guild_id)
+        if cached is None or cached[0] != settings.version:
+            cached = (settings.version, RuleSet(self.build_rules(settings.automod)))
+            self.rule_sets[guild_id] = cached
+        return cached[1]
+    
+    def get_word_matcher(self, guild_id: int, settings: GuildSettings) -> WordMatcher:
+        """Get the guild's compiled banned word matcher, building it if the list changed"""
+        cached = self.word_matchers.get(guild_id)
+        if cached is not None and cached[0] == settings.version:
+            return cached[2]
+        config = settings.automod
+        words = (config.banned_words, config.banned_words_whole_word)
+        if cached is not None and cached[1] == words:
+            matcher = cached[2]  # other settings changed
+        else:
+            # Terms are folded the same way as messages, so "cafe" also catches "cаfé"
+            matcher = WordMatcher([fold(word) for word in config.banned_words], config.banned_words_whole_word)
+        self.word_matchers[guild_id] = (settings.version, words, matcher)
+        return matcher
+    
+    def get_domain_index(self, guild_id: int, settings: GuildSettings) -> DomainIndex:
+        """Get the guild's compiled domain lists on top of the shared blocklist"""
+        config = settings.automod
+        if not config.allowed_domains and not config.blocked_domains:
+            return self.bot.domain_blocklist
+        cached = self.domain_indexes.get(guild_id)
+        if cached is not None and cached[0] == settings.version:
+            return cached[2]
+        domains = (config.allowed_domains, config.blocked_domains)
+        if cached is not None and cached[1] == domains:
+            index = cached[2]
+        else:
+            index = DomainIndex(parent=self.bot.domain_blocklist)
+            index.update(config.blocked_domains, False)
+            index.update(config.allowed_domains, True)  # listed in both: allowing wins
+        self.domain_indexes[guild_id] = (settings.version, domains, index)
+        return index
+    
+    async def check_message(self, ctx: MessageContext):
+        """Monitor messages for spam and banned content (the bot's first message stage)"""
+        message = ctx.message
+        settings = ctx.settings
+        config = settings.automod
         
-        if self.is_exempt(message.author, config):
+        if not config.enabled or ctx.exempt:
             return
         
-        # Check banned words
-        if config.get('banned_words'):
-            content_lower = message.content.lower()
-            for word in config['banned_words']:
-                if word.lower() in content_lower:
-                    await self.handle_banned_word(message, word, config)
-                    return
-        
-        # Check mention spam
-        if config.get('mention_spam', True):
-            mention_limit = config.get('mention_limit', 5)
-            total_mentions = len(message.mentions) + len(message.role_mentions)
-            if total_mentions >= mention_limit:
+        self.recent_messages.add((message.guild.id, message.author.id), message.channel.id, message.id)
+        
+        # Content rules (banned words, mentions, caps, links and custom rules)
+        matcher = self.get_word_matcher(message.guild.id, settings) if config.banned_words else None
+        features = MessageFeatures(message, matcher, self.get_domain_index(message.guild.id, settings), ctx)
+        rule = self.get_rule_set(message.guild.id, settings).evaluate(message, features)
+        if rule is not None:
+            # Later stages (XP) skip messages that are removed; flag-only rules let them through
+            if rule.handler or {'delete', 'kick', 'ban'} & set(rule.actions):
+                ctx.stop(rule.name)
+            if rule.handler == 'banned_word':
+                await self.handle_banned_word(message, features.banned_word, config)
+            elif rule.handler == 'mention_spam':
                 await self.handle_mention_spam(message, config)
-                return
-        
-        # Check caps spam
-        if config.get('caps_spam', True) and len(message.content) > 10:
-            caps_count = sum(1 for c in message.content if c.isupper())
-            caps_percentage = (caps_count / len(message.content)) * 100
-            if caps_percentage >= config.get('caps_percentage', 70):
+            elif rule.handler == 'caps_spam':
                 await self.handle_caps_spam(message, config)
-                return
-        
-        # Check link spam
-        if config.get('link_spam', False):
-            if 'http://' in message.content or 'https://' in message.content:
+            elif rule.handler == 'blocked_link':
+                await self.handle_blocked_link(message, features.blocked_host, config)
+            elif rule.handler == 'link_spam':
                 await self.handle_link_spam(message, config)
+            else:
+                await self.handle_rule(message, rule, config)
+            return
+        
+        # Check the same text posted by several accounts
+        if config.duplicate_spam:
+            if await self.check_duplicates(message, config, features):
+                ctx.stop('Duplicate Spam')
                 return
         
         # Check message spam (rate limit)
-        if config.get('anti_spam', True):
-            await self.check_spam(message, config)
+        if config.anti_spam:
+            if await self.check_spam(message, config):
+                ctx.stop('Spam')
     
-    async def check_spam(self, message: discord.Message, config: dict):
+    async def check_spam(self, message: discord.Message, config: AutomodSettings) -> bool:
         """Check for spam based on message rate"""
-        user_id = message.author.id
-        now = datetime.utcnow()
-        
-        # Add current message timestamp
-        self.message_cache[user_id].append(now)
-        
-        # Remove old messages outside interval
-        interval = config.get('spam_interval', 5)
-        self.message_cache[user_id] = [
-            ts for ts in self.message_cache[user_id]
-            if (now - ts).total_seconds() <= interval
-        ]
+        key = (message.guild.id, message.author.id)
         
         # Check if threshold exceeded
-        threshold = config.get('spam_threshold', 5)
-        if len(self.message_cache[user_id]) >= threshold:
-            await self.handle_spam(message, config)
-            self.message_cache[user_id].clear()
+        threshold = config.spam_threshold
+        interval = config.spam_interval
+        if not self.message_cache.hit(key, threshold, interval):
+            return False
+        self.message_cache.reset(key)
+        await self.handle_spam(message, config)
+        return True
+    
+    async def check_duplicates(self, message: discord.Message, config: AutomodSettings, features: MessageFeatures) -> bool:
+        """Check for near-identical messages from different accounts"""
+        signature = fingerprint(features.normalized)
+        if signature is None:
+            return False
+        
+        interval = config.duplicate_interval
+        window = self.fingerprints.get(message.guild.id)
+        if window is None or window.interval != interval:
+            window = self.fingerprints[message.guild.id] = FingerprintWindow(interval)
+        
+        cluster = window.add(signature, message.author.id, (message.channel.id, message.id))
+        authors = {entry.author_id for entry in cluster}
+        if len(authors) < config.duplicate_authors:
+            return False
+        
+        await self.handle_duplicate_spam(message, cluster, len(authors), config)
+        return True
     
-    async def handle_spam(self, message: discord.Message, config: dict):
+    async def handle_duplicate_spam(self, message: discord.Message, cluster: list, authors: int, config: AutomodSettings):
+        """Delete every message in a cluster of copies that hasn't been removed yet.
+        
+        A burst is reported once: later copies that match messages already
+        acted on are deleted silently until those expire from the window.
+        """
+        entries = [entry for entry in cluster if not entry.flagged]
+        reported = len(entries) < len(cluster)
+        for entry in entries:
+            entry.flagged = True
+        
+        await bulk_delete(
+            message.guild, [entry.ref for entry in entries], self.delete_semaphore,
+            reason="Auto-mod: Duplicate spam"
+        )
+        
+        if config.log_actions and not reported:
+            await self.log_action(
+                message.guild, "Duplicate Spam", message.author,
+                f"{authors} accounts posted near-identical messages; {len(entries)} deleted"
+            )
+    
+    async def handle_spam(self, message: discord.Message, config: AutomodSettings):
         """Handle spam violation"""
-        action = config.get('spam_action', 'mute')
+        action = config.spam_action
         
         try:
-            # Delete recent messages
-            async for msg in message.channel.history(limit=10):
-                if msg.author.id == message.author.id:
-                    await msg.delete()
+            # Delete the spammer's recent messages in every channel, 100 per request
+            await bulk_delete(
+                message.guild, self.recent_messages.pop((message.guild.id, message.author.id)),
+                self.delete_semaphore, reason="Auto-mod: Spam detected"
+            )
             
             # Take action
             if action == 'warn':
@@ -161,15 +283,15 @@ class AutoModeration(commands.Cog):
                 await message.channel.send(f"{message.author.mention} has been banned for spamming.")
             
             # Log action
-            if config.get('log_actions', True):
+            if config.log_actions:
                 await self.log_action(message.guild, "Spam Detected", message.author, action)
         
         except Exception as e:
             pass
     
-    async def handle_banned_word(self, message: discord.Message, word: str, config: dict):
+    async def handle_banned_word(self, message: discord.Message, word: str, config: AutomodSettings):
         """Handle banned word violation"""
-        action = config.get('banned_words_action', 'delete')
+        action = config.banned_words_action
         
         try:
             await message.delete()
@@ -196,13 +318,40 @@ class AutoModeration(commands.Cog):
                     )
             
             # Log action
-            if config.get('log_actions', True):
+            if config.log_actions:
                 await self.log_action(message.guild, "Banned Word", message.author, f"Word: {word}")
         
         except Exception as e:
             pass
     
-    async def handle_mention_spam(self, message: discord.Message, config: dict):
+    async def handle_rule(self, message: discord.Message, rule, config: AutomodSettings):
+        """Apply a custom rule's actions"""
+        try:
+            if 'delete' in rule.actions:
+                await message.delete()
+            
+            if 'warn' in rule.actions:
+                await message.channel.send(
+                    f"{message.author.mention} ⚠️ {rule.message or f'Your message broke the rule: {rule.name}'}",
+                    delete_after=5
+                )
+            
+            if 'mute' in rule.actions:
+                muted_role = discord.utils.get(message.guild.roles, name="Muted")
+                if muted_role:
+                    await message.author.add_roles(muted_role, reason=f"Auto-mod: {rule.name}")
+            
+            if 'kick' in rule.actions:
+                await message.author.kick(reason=f"Auto-mod: {rule.name}")
+            elif 'ban' in rule.actions:
+                await message.author.ban(reason=f"Auto-mod: {rule.name}", delete_message_days=1)
+        except:
+            pass
+        
+        if config.log_actions:
+            await self.log_action(message.guild, rule.name, message.author, ", ".join(rule.actions) or "Flagged")
+    
+    async def handle_mention_spam(self, message: discord.Message, config: AutomodSettings):
         """Handle mention spam"""
         try:
             await message.delete()
@@ -211,12 +360,12 @@ class AutoModeration(commands.Cog):
                 delete_after=5
             )
             
-            if config.get('log_actions', True):
+            if config.log_actions:
                 await self.log_action(message.guild, "Mention Spam", message.author, "Excessive mentions")
         except:
             pass
     
-    async def handle_caps_spam(self, message: discord.Message, config: dict):
+    async def handle_caps_spam(self, message: discord.Message, config: AutomodSettings):
         """Handle caps spam"""
         try:
             await message.delete()
@@ -227,7 +376,7 @@ class AutoModeration(commands.Cog):
         except:
             pass
     
-    async def handle_link_spam(self, message: discord.Message, config: dict):
+    async def handle_link_spam(self, message: discord.Message, config: AutomodSettings):
         """Handle link spam"""
         try:
             await message.delete()
@@ -238,39 +387,50 @@ class AutoModeration(commands.Cog):
         except:
             pass
     
+    async def handle_blocked_link(self, message: discord.Message, domain: str, config: AutomodSettings):
+        """Handle a link to a blocked domain"""
+        try:
+            await message.delete()
+            await message.channel.send(
+                f"{message.author.mention} ⚠️ Links to that site are blocked in this server!",
+                delete_after=5
+            )
+            if config.log_actions:
+                await self.log_action(message.guild, "Blocked Link", message.author, f"Posted a link to `{domain}`")
+        except:
+            pass
+    
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         """Monitor for raid attempts"""
-        config = self.get_automod_config(member.guild.id)
-        
-        if not config.get('enabled', False) or not config.get('anti_raid', True):
+        settings = self.bot.settings.get(member.guild.id)
+        config = settings.automod
+        
+        # While raid mode is on, new accounts get the raid action straight away
+        if settings.raid_mode and not member.bot:
+            plan = self.bot.data.get(str(member.guild.id), {}).get('raid_mode') or {}
+            try:
+                await self.punish_raider(member, plan.get('action', 'none'))
+            except:
+                pass
             return
         
-        guild_id = member.guild.id
-        now = datetime.utcnow()
-        
-        # Add join timestamp
-        self.join_cache[guild_id].append(now)
-        
-        # Remove old joins outside interval
-        interval = config.get('raid_interval', 10)
-        self.join_cache[guild_id] = [
-            ts for ts in self.join_cache[guild_id]
-            if (now - ts).total_seconds() <= interval
-        ]
+        if not config.enabled or not config.anti_raid:
+            return
         
         # Check if raid threshold exceeded
-        threshold = config.get('raid_threshold', 5)
-        if len(self.join_cache[guild_id]) >= threshold:
-            await self.handle_raid(member.guild, config)
+        threshold = config.raid_threshold
+        interval = config.raid_interval
+        if self.join_cache.hit(member.guild.id, threshold, interval):
+            await self.handle_raid(member.guild, settings)
     
-    async def handle_raid(self, guild: discord.Guild, config: dict):
+    async def handle_raid(self, guild: discord.Guild, settings: GuildSettings):
         """Handle potential raid"""
+        config = settings.automod
         try:
             # Log raid attempt
-            if config.get('log_actions', True):
-                guild_data = self.bot.data.get(str(guild.id), {})
-                log_channel_id = guild_data.get('log_channel')
+            if config.log_actions:
+                log_channel_id = settings.log_channel
                 
                 if log_channel_id:
                     log_channel = guild.get_channel(log_channel_id)
@@ -278,24 +438,172 @@ class AutoModeration(commands.Cog):
                         embed = discord.Embed(
                             title="🚨 Potential Raid Detected",
                             description=f"Multiple users joined in a short time!\n"
-                                       f"**Joins:** {len(self.join_cache[guild.id])} users\n"
-                                       f"**Interval:** {config.get('raid_interval', 10)} seconds",
+                                       f"**Joins:** {self.join_cache.count(guild.id, config.raid_interval)} users\n"
+                                       f"**Interval:** {config.raid_interval} seconds",
                             color=discord.Color.red(),
                             timestamp=datetime.utcnow()
                         )
-                        await log_channel.send(embed=embed)
+                        await self.bot.log_dispatcher.send(log_channel, embed, HIGH)
             
             # Clear cache
-            self.join_cache[guild.id].clear()
+            self.join_cache.reset(guild.id)
+            
+            if config.raid_mode_auto and not settings.raid_mode:
+                await self.start_raid_mode(guild, None, config.raid_mode_action, config)
         
         except Exception as e:
             pass
     
+    async def run_limited(self, jobs: list, limit: int) -> int:
+        """Await API calls with at most ``limit`` in flight. Returns how many succeeded."""
+        semaphore = asyncio.Semaphore(max(1, limit))
+        
+        async def run(job):
+            async with semaphore:
+                try:
+                    await job
+                    return 1
+                except discord.HTTPException:
+                    return 0
+                except Exception as e:
+                    # One bad call must not stop the rest of raid mode from being applied and saved
+                    logger.error(f'[ERROR] Raid mode action failed: {e}')
+                    return 0
+        
+        return sum(await asyncio.gather(*(run(job) for job in jobs)))
+    
+    async def punish_raider(self, member: discord.Member, action: str):
+        """Kick or ban a raid account and remove what it posted"""
+        if action == 'ban':
+            await member.ban(reason="Raid mode", delete_message_seconds=3600)
+        elif action == 'kick':
+            await member.kick(reason="Raid mode")
+            await bulk_delete(member.guild, self.recent_messages.pop((member.guild.id, member.id)), self.delete_semaphore)
+    
+    def raid_suspects(self, guild: discord.Guild, window: float) -> list:
+        """Members who joined within the last ``window`` seconds and hold no staff permissions"""
+        cutoff = discord.utils.utcnow() - timedelta(seconds=window)
+        return [
+            member for member in guild.members
+            if member.joined_at and member.joined_at >= cutoff and not member.bot
+            and not member.guild_permissions.manage_messages
+        ]
+    
+    async def start_raid_mode(self, guild: discord.Guild, moderator: Optional[discord.Member], action: str, config: AutomodSettings) -> dict:
+        """Lock text channels, raise verification and remove recent joiners, all at once.
+        
+        The previous @everyone overwrites and verification level are saved
+        before anything changes, so stop_raid_mode can undo it even after a restart.
+        """
+        everyone = guild.default_role
+        limit = config.raid_concurrency
+        
+        plan = {
+            'started': datetime.utcnow().isoformat(),
+            'moderator': moderator.id if moderator else None,
+            'action': action,
+            'verification_level': None,
+            'overwrites': {}  # channel_id: [allow, deny] of the @everyone overwrite, or None if there was none
+        }
+        jobs = []
+        for channel in guild.text_channels:
+            overwrite = channel.overwrites.get(everyone)
+            if overwrite is not None and overwrite.send_messages is False:
+                continue  # already locked
+            if overwrite is None:
+                plan['overwrites'][str(channel.id)] = None
+                locked = discord.PermissionOverwrite()
+            else:
+                allow, deny = overwrite.pair()
+                plan['overwrites'][str(channel.id)] = [allow.value, deny.value]
+                locked = discord.PermissionOverwrite.from_pair(allow, deny)
+            locked.send_messages = False
+            jobs.append(channel.set_permissions(everyone, overwrite=locked, reason="Raid mode"))
+        
+        if guild.verification_level < discord.VerificationLevel.high:
+            plan['verification_level'] = guild.verification_level.value
+            jobs.append(guild.edit(verification_level=discord.VerificationLevel.high, reason="Raid mode"))
+        
+        # Save the plan first so a crash halfway through can still be undone
+        guild_data = self.bot.data.get(str(guild.id), {})
+        guild_data['raid_mode'] = plan
+        self.bot.data[str(guild.id)] = guild_data
+        self.bot.save_settings(guild.id)
+        
+        suspects = self.raid_suspects(guild, config.raid_mode_window)
+        if action == 'ban' and hasattr(guild, 'bulk_ban'):
+            # Up to 200 accounts per request
+            jobs.extend(
+                guild.bulk_ban(suspects[i:i + 200], reason="Raid mode", delete_message_seconds=3600)
+                for i in range(0, len(suspects), 200)
+            )
+        elif action in ('kick', 'ban'):
+            jobs.extend(self.punish_raider(member, action) for member in suspects)
+        
+        done = await self.run_limited(jobs, limit)
+        plan['summary'] = {'channels': len(plan['overwrites']), 'members': len(suspects) if action != 'none' else 0}
+        self.bot.save_data(guild.id)
+        
+        await self.log_raid(
+            guild, "🛡️ Raid Mode Enabled",
+            f"**By:** {moderator.mention if moderator else 'Auto-mod'}\n"
+            f"**Channels locked:** {len(plan['overwrites'])}\n"
+            f"**Verification raised:** {'Yes' if plan['verification_level'] is not None else 'Already high'}\n"
+            f"**Recent joins {action if action != 'none' else 'left alone'}:** {len(suspects)}\n"
+            f"**Requests:** {done}/{len(jobs)} succeeded",
+            discord.Color.red()
+        )
+        return plan
+    
+    async def stop_raid_mode(self, guild: discord.Guild, moderator: Optional[discord.Member], config: AutomodSettings) -> int:
+        """Restore the overwrites and verification level saved by start_raid_mode"""
+        guild_data = self.bot.data.get(str(guild.id), {})
+        plan = guild_data.get('raid_mode')
+        if not plan:
+            return 0
+        everyone = guild.default_role
+        
+        jobs = []
+        for channel_id, pair in plan.get('overwrites', {}).items():
+            channel = guild.get_channel(int(channel_id))
+            if channel is None:
+                continue
+            if pair is None:
+                overwrite = None
+            else:
+                overwrite = discord.PermissionOverwrite.from_pair(discord.Permissions(pair[0]), discord.Permissions(pair[1]))
+            jobs.append(channel.set_permissions(everyone, overwrite=overwrite, reason="Raid mode off"))
+        if plan.get('verification_level') is not None:
+            level = discord.VerificationLevel(plan['verification_level'])
+            jobs.append(guild.edit(verification_level=level, reason="Raid mode off"))
+        
+        done = await self.run_limited(jobs, config.raid_concurrency)
+        del guild_data['raid_mode']
+        self.bot.save_settings(guild.id)
+        
+        await self.log_raid(
+            guild, "✅ Raid Mode Disabled",
+            f"**By:** {moderator.mention if moderator else 'Auto-mod'}\n"
+            f"**Requests:** {done}/{len(jobs)} succeeded",
+            discord.Color.green()
+        )
+        return done
+    
+    async def log_raid(self, guild: discord.Guild, title: str, description: str, color: discord.Color):
+        """Send a raid mode summary to the log channel"""
+        try:
+            log_channel = guild.get_channel(self.bot.settings.get(guild.id).log_channel or 0)
+            if log_channel:
+                embed = discord.Embed(title=title, description=description, color=color, timestamp=datetime.utcnow())
+                await self.bot.log_dispatcher.send(log_channel, embed, HIGH)
+        except:
+            pass
+    
     async def log_action(self, guild: discord.Guild, action_type: str, user: discord.Member, details: str):
         """Log automod action"""
         try:
-            guild_data = self.bot.data.get(str(guild.id), {})
-            log_channel_id = guild_data.get('log_channel')
+            settings = self.bot.settings.get(guild.id)
+            log_channel_id = settings.log_channel
             
             if log_channel_id:
                 log_channel = guild.get_channel(log_channel_id)
@@ -307,12 +615,9 @@ class AutoModeration(commands.Cog):
                     )
                     embed.add_field(name="User", value=f"{user.mention} ({user.id})", inline=True)
                     embed.add_field(name="Action", value=details, inline=True)
+                    embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
                     
-                    footer_icon = guild_data.get('footer_icon', '')
-                    footer_text = guild_data.get('footer_text', 'Synergy Bot')
-                    embed.set_footer(text=footer_text, icon_url=footer_icon)
-                    
-                    await log_channel.send(embed=embed)
+                    await self.bot.log_dispatcher.send(log_channel, embed, NORMAL)
         except:
             pass
     
@@ -322,7 +627,8 @@ class AutoModeration(commands.Cog):
         enabled="Enable or disable auto-moderation",
         anti_spam="Enable anti-spam protection",
         anti_raid="Enable anti-raid protection",
-        spam_action="Action to take on spam (warn/mute/kick/ban)"
+        spam_action="Action to take on spam (warn/mute/kick/ban)",
+        duplicate_spam="Delete the same text posted by several accounts at once"
     )
     async def automod_config(
         self,
@@ -330,7 +636,8 @@ class AutoModeration(commands.Cog):
         enabled: Optional[bool] = None,
         anti_spam: Optional[bool] = None,
         anti_raid: Optional[bool] = None,
-        spam_action: Optional[Literal['warn', 'mute', 'kick', 'ban']] = None
+        spam_action: Optional[Literal['warn', 'mute', 'kick', 'ban']] = None,
+        duplicate_spam: Optional[bool] = None
     ):
         """Configure auto-moderation settings"""
         config = self.get_automod_config(interaction.guild.id)
@@ -343,6 +650,8 @@ class AutoModeration(commands.Cog):
             config['anti_raid'] = anti_raid
         if spam_action is not None:
             config['spam_action'] = spam_action
+        if duplicate_spam is not None:
+            config['duplicate_spam'] = duplicate_spam
         
         self.save_automod_config(interaction.guild.id, config)
         
@@ -355,6 +664,7 @@ class AutoModeration(commands.Cog):
         embed.add_field(name="Anti-Spam", value="✅" if config['anti_spam'] else "❌", inline=True)
         embed.add_field(name="Anti-Raid", value="✅" if config['anti_raid'] else "❌", inline=True)
         embed.add_field(name="Spam Action", value=config['spam_action'].title(), inline=True)
+        embed.add_field(name="Duplicate Spam", value="✅" if config.get('duplicate_spam', False) else "❌", inline=True)
         
         guild_data = self.bot.data.get(str(interaction.guild.id), {})
         footer_icon = guild_data.get('footer_icon', '')
@@ -367,17 +677,23 @@ class AutoModeration(commands.Cog):
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(
         action="Add or remove a banned word",
-        word="The word to ban/unban"
+        word="The word to ban/unban (* at the start or end matches any prefix/suffix)",
+        whole_word="Only match whole words instead of anywhere in a message"
     )
     async def banned_words(
         self,
         interaction: discord.Interaction,
         action: Literal['add', 'remove', 'list'],
-        word: Optional[str] = None
+        word: Optional[str] = None,
+        whole_word: Optional[bool] = None
     ):
         """Manage banned words"""
         config = self.get_automod_config(interaction.guild.id)
         
+        if whole_word is not None:
+            config['banned_words_whole_word'] = whole_word
+            self.save_automod_config(interaction.guild.id, config)
+        
         if action == 'add' and word:
             if word.lower() not in config['banned_words']:
                 config['banned_words'].append(word.lower())
@@ -397,12 +713,243 @@ class AutoModeration(commands.Cog):
         elif action == 'list':
             if config['banned_words']:
                 words = ", ".join(f"`{w}`" for w in config['banned_words'])
-                await interaction.response.send_message(f"**Banned Words:** {words}", ephemeral=True)
+                mode = "whole words" if config.get('banned_words_whole_word', False) else "anywhere in a message"
+                await interaction.response.send_message(f"**Banned Words** (matching {mode}): {words}", ephemeral=True)
             else:
                 await interaction.response.send_message("No banned words configured.", ephemeral=True)
         
         else:
             await interaction.response.send_message("Please provide a word when adding or removing.", ephemeral=True)
 
+    @app_commands.command(name="linkfilter", description="Manage allowed and blocked link domains")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        action="Allow or block a domain (and its subdomains), remove it, list both lists or import a blocklist",
+        domain="e.g. example.com",
+        file="Text file of domains to block, one per line (hosts and ||domain^ formats work too)"
+    )
+    async def link_filter(
+        self,
+        interaction: discord.Interaction,
+        action: Literal['allow', 'block', 'remove', 'list', 'import'],
+        domain: Optional[str] = None,
+        file: Optional[discord.Attachment] = None
+    ):
+        """Manage the guild's domain allowlist and blocklist"""
+        config = self.get_automod_config(interaction.guild.id)
+        allowed = config.setdefault('allowed_domains', [])
+        blocked = config.setdefault('blocked_domains', [])
+        
+        if action == 'list':
+            lines = [
+                f"**Allowed:** {', '.join(f'`{d}`' for d in allowed[:50]) or 'none'}"
+                + (f" (+{len(allowed) - 50} more)" if len(allowed) > 50 else ""),
+                f"**Blocked:** {', '.join(f'`{d}`' for d in blocked[:50]) or 'none'}"
+                + (f" (+{len(blocked) - 50} more)" if len(blocked) > 50 else ""),
+                f"**Shared blocklist:** {len(self.bot.domain_blocklist)} domains",
+                f"**Link spam** (delete links to unlisted domains): {'✅' if config.get('link_spam', False) else '❌'}"
+            ]
+            return await interaction.response.send_message("\n".join(lines), ephemeral=True)
+        
+        if action == 'import':
+            if file is None:
+                return await interaction.response.send_message("Please attach a file of domains.", ephemeral=True)
+            await interaction.response.defer(ephemeral=True)
+            text = (await file.read()).decode('utf-8', errors='ignore')
+            known = set(blocked)
+            new = [d for d in dict.fromkeys(parse_domain_list(text.splitlines())) if d not in known]
+            room = max(MAX_GUILD_DOMAINS - len(blocked), 0)
+            blocked.extend(new[:room])
+            self.save_automod_config(interaction.guild.id, config)
+            message = f"✅ Blocked {min(len(new), room)} new domain(s)."
+            if len(new) > room:
+                message += f" {len(new) - room} skipped: the limit is {MAX_GUILD_DOMAINS} per server."
+            return await interaction.followup.send(message, ephemeral=True)
+        
+        name = normalize_domain(domain or '')
+        if name is None:
+            return await interaction.response.send_message("Please provide a valid domain, e.g. `example.com`.", ephemeral=True)
+        
+        if action == 'remove':
+            if name not in allowed and name not in blocked:
+                return await interaction.response.send_message(f"⚠️ `{name}` is not listed.", ephemeral=True)
+            allowed[:] = [d for d in allowed if d != name]
+            blocked[:] = [d for d in blocked if d != name]
+            self.save_automod_config(interaction.guild.id, config)
+            return await interaction.response.send_message(f"✅ Removed `{name}`.", ephemeral=True)
+        
+        target, other = (allowed, blocked) if action == 'allow' else (blocked, allowed)
+        if name in target:
+            return await interaction.response.send_message(f"⚠️ `{name}` is already on that list.", ephemeral=True)
+        if len(target) >= MAX_GUILD_DOMAINS:
+            return await interaction.response.send_message(f"⚠️ Lists hold at most {MAX_GUILD_DOMAINS} domains.", ephemeral=True)
+        if name in other:
+            other.remove(name)
+        target.append(name)
+        self.save_automod_config(interaction.guild.id, config)
+        verb = "Allowed" if action == 'allow' else "Blocked"
+        await interaction.response.send_message(f"✅ {verb} `{name}` and its subdomains.", ephemeral=True)
+
+    @app_commands.command(name="raidmode", description="Lock down the server during a raid, or undo the lockdown")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        action="on: lock channels, raise verification and remove recent joins; off: restore everything",
+        punish="What to do with accounts that joined recently (and while raid mode is on)",
+        window="Accounts that joined within this many seconds count as raiders",
+        auto="Turn raid mode on automatically when a raid is detected",
+        concurrency="Discord requests sent at once (lower it if you hit rate limits)"
+    )
+    async def raid_mode(
+        self,
+        interaction: discord.Interaction,
+        action: Literal['on', 'off', 'status'],
+        punish: Optional[Literal['none', 'kick', 'ban']] = None,
+        window: Optional[app_commands.Range[int, 10, 3600]] = None,
+        auto: Optional[bool] = None,
+        concurrency: Optional[app_commands.Range[int, 1, 25]] = None
+    ):
+        """Turn raid mode on or off"""
+        config = self.get_automod_config(interaction.guild.id)
+        if punish is not None:
+            config['raid_mode_action'] = punish
+        if window is not None:
+            config['raid_mode_window'] = window
+        if auto is not None:
+            config['raid_mode_auto'] = auto
+        if concurrency is not None:
+            config['raid_concurrency'] = concurrency
+        if any(value is not None for value in (punish, window, auto, concurrency)):
+            self.save_automod_config(interaction.guild.id, config)
+        
+        plan = self.bot.data.get(str(interaction.guild.id), {}).get('raid_mode')
+        
+        if action == 'status':
+            lines = [
+                f"**Raid mode:** {'🛡️ On since ' + plan['started'][:16].replace('T', ' ') + ' UTC' if plan else 'Off'}",
+                f"**Recent joins:** {config['raid_mode_action']} (joined within {config['raid_mode_window']}s)",
+                f"**Automatic:** {'✅' if config['raid_mode_auto'] else '❌'}",
+                f"**Requests at once:** {config['raid_concurrency']}"
+            ]
+            return await interaction.response.send_message("\n".join(lines), ephemeral=True)
+        
+        if action == 'on':
+            if plan:
+                return await interaction.response.send_message("⚠️ Raid mode is already on.", ephemeral=True)
+            await interaction.response.defer()
+            settings = self.bot.settings.get(interaction.guild.id).automod
+            plan = await self.start_raid_mode(interaction.guild, interaction.user, settings.raid_mode_action, settings)
+            summary = plan.get('summary', {})
+            return await interaction.followup.send(
+                f"🛡️ Raid mode is on: {summary.get('channels', 0)} channel(s) locked, "
+                f"{summary.get('members', 0)} recent account(s) removed. Use `/raidmode off` to undo."
+            )
+        
+        if not plan:
+            return await interaction.response.send_message("⚠️ Raid mode is not on.", ephemeral=True)
+        await interaction.response.defer()
+        await self.stop_raid_mode(interaction.guild, interaction.user, self.bot.settings.get(interaction.guild.id).automod)
+        await interaction.followup.send("✅ Raid mode is off: channel permissions and verification level restored.")
+
+    @app_commands.command(name="automodrule", description="Manage custom auto-moderation rules")
+    @app_commands.checks.has_permissions(administrator=True)
+    @app_commands.describe(
+        action="Add, remove or list rules, or exempt a role/channel from a rule (unexempt to undo)",
+        name="Rule name",
+        conditions="e.g. caps_percent >= 80, length > 20, blocked_links >= 1 (see README for all features)",
+        actions="Comma-separated: delete, warn, mute, kick, ban",
+        message="Warning shown to the user",
+        exempt_role="Members with this role are not checked by the rule",
+        exempt_channel="Messages in this channel are not checked by the rule"
+    )
+    async def automod_rule(
+        self,
+        interaction: discord.Interaction,
+        action: Literal['add', 'remove', 'exempt', 'unexempt', 'list'],
+        name: Optional[str] = None,
+        conditions: Optional[str] = None,
+        actions: Optional[str] = 'delete, warn',
+        message: Optional[str] = None,
+        exempt_role: Optional[discord.Role] = None,
+        exempt_channel: Optional[discord.TextChannel] = None
+    ):
+        """Manage custom automod rules"""
+        config = self.get_automod_config(interaction.guild.id)
+        rules = config.setdefault('rules', [])
+        
+        if action == 'add':
+            if not name or not conditions:
+                return await interaction.response.send_message("Please provide a name and conditions.", ephemeral=True)
+            try:
+                parsed = parse_conditions(conditions)
+            except ValueError as e:
+                return await interaction.response.send_message(f"⚠️ {e}", ephemeral=True)
+            
+            chosen = [a.strip().lower() for a in (actions or '').split(',') if a.strip()]
+            unknown = [a for a in chosen if a not in ACTIONS]
+            if unknown:
+                return await interaction.response.send_message(
+                    f"⚠️ Unknown action(s): {', '.join(unknown)}. Use {', '.join(ACTIONS)}.", ephemeral=True
+                )
+            
+            # Replacing a rule keeps its exemptions
+            old = next((r for r in rules if r.get('name', '').lower() == name.lower()), {})
+            rule = {
+                'name': name, 'conditions': parsed, 'actions': chosen, 'message': message,
+                'exempt_roles': list(old.get('exempt_roles', [])),
+                'exempt_channels': list(old.get('exempt_channels', []))
+            }
+            if exempt_role and exempt_role.id not in rule['exempt_roles']:
+                rule['exempt_roles'].append(exempt_role.id)
+            if exempt_channel and exempt_channel.id not in rule['exempt_channels']:
+                rule['exempt_channels'].append(exempt_channel.id)
+            rules[:] = [r for r in rules if r is not old]
+            rules.append(rule)
+            self.save_automod_config(interaction.guild.id, config)
+            await interaction.response.send_message(f"✅ Saved rule **{name}**.", ephemeral=True)
+        
+        elif action in ('exempt', 'unexempt'):
+            rule = next((r for r in rules if r.get('name', '').lower() == (name or '').lower()), None)
+            if rule is None:
+                return await interaction.response.send_message(f"⚠️ No rule named `{name}`.", ephemeral=True)
+            if not exempt_role and not exempt_channel:
+                return await interaction.response.send_message("Please provide a role or a channel.", ephemeral=True)
+            for key, target in (('exempt_roles', exempt_role), ('exempt_channels', exempt_channel)):
+                if target is None:
+                    continue
+                ids = rule.setdefault(key, [])
+                if action == 'exempt' and target.id not in ids:
+                    ids.append(target.id)
+                elif action == 'unexempt' and target.id in ids:
+                    ids.remove(target.id)
+            self.save_automod_config(interaction.guild.id, config)
+            verb = "no longer checks" if action == 'exempt' else "checks"
+            targets = " and ".join(target.mention for target in (exempt_role, exempt_channel) if target)
+            await interaction.response.send_message(f"✅ **{rule['name']}** {verb} {targets}.", ephemeral=True)
+        
+        elif action == 'remove':
+            remaining = [r for r in rules if r.get('name', '').lower() != (name or '').lower()]
+            if len(remaining) == len(rules):
+                return await interaction.response.send_message(f"⚠️ No rule named `{name}`.", ephemeral=True)
+            rules[:] = remaining
+            self.save_automod_config(interaction.guild.id, config)
+            await interaction.response.send_message(f"✅ Removed rule **{name}**.", ephemeral=True)
+        
+        else:
+            if not rules:
+                return await interaction.response.send_message("No custom rules configured.", ephemeral=True)
+            lines = []
+            for rule in rules:
+                condition_text = ", ".join(
+                    (feature if value else f"!{feature}") if op == 'is' else f"{feature} {op} {value}"
+                    for feature, op, value in rule['conditions']
+                )
+                line = f"**{rule['name']}**: {condition_text} → {', '.join(rule.get('actions', [])) or 'log only'}"
+                exempt = [f"<@&{role_id}>" for role_id in rule.get('exempt_roles', [])]
+                exempt += [f"<#{channel_id}>" for channel_id in rule.get('exempt_channels', [])]
+                if exempt:
+                    line += f" (except {', '.join(exempt)})"
+                lines.append(line)
+            await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(AutoModeration(bot))
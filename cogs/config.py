@@ -2,15 +2,21 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from typing import Optional
+import asyncio
+import json
+
+# Per-member guild sub-dicts that /compactdata sweeps for members who left
+MEMBER_DOMAINS = ('leveling_users', 'economy', 'warnings')
+
+def encoded_size(value) -> int:
+    return len(json.dumps(value, separators=(',', ':')))
 
 class Config(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     async def get_embed(self, ctx, title: str, description: str, color: discord.Color) -> discord.Embed:
-        guild_data = self.bot.data.get(str(ctx.guild.id), {})
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
+        settings = self.bot.settings.get(ctx.guild.id)
         
         embed = discord.Embed(
             title=title,
@@ -18,13 +24,14 @@ class Config(commands.Cog):
             color=color,
             timestamp=discord.utils.utcnow()
         )
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
+        embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
         return embed
 
     @app_commands.command(name="setup", description="Setup the bot's configuration")
     @app_commands.checks.has_permissions(administrator=True)
     @app_commands.describe(
         log_channel="The channel where logs will be sent",
+        log_webhook="Post logs through a webhook so busy logging doesn't slow down commands",
         ticket_category="The category where ticket channels will be created",
         muted_role="The role to use for muting members"
     )
@@ -32,6 +39,7 @@ class Config(commands.Cog):
         self,
         interaction: discord.Interaction,
         log_channel: Optional[discord.TextChannel] = None,
+        log_webhook: Optional[bool] = None,
         ticket_category: Optional[discord.CategoryChannel] = None,
         muted_role: Optional[discord.Role] = None
     ):
@@ -46,6 +54,13 @@ class Config(commands.Cog):
             config['log_channel'] = log_channel.id
             changes.append(f"✅ Log channel set to {log_channel.mention}")
             
+        if log_webhook is not None:
+            config['log_webhook'] = log_webhook
+            if log_webhook:
+                changes.append("✅ Logs will be posted through a webhook (needs Manage Webhooks in the log channel)")
+            else:
+                changes.append("✅ Logs will be posted as normal bot messages")
+            
         if ticket_category:
             config['ticket_category'] = ticket_category.id
             changes.append(f"✅ Ticket category set to {ticket_category.name}")
@@ -65,7 +80,7 @@ class Config(commands.Cog):
                 ephemeral=True
             )
         
-        self.bot.save_data()
+        self.bot.save_settings(guild_id)
         
         embed = await self.get_embed(
             interaction,
@@ -108,7 +123,7 @@ class Config(commands.Cog):
                 ephemeral=True
             )
         
-        self.bot.save_data()
+        self.bot.save_settings(guild_id)
         
         embed = await self.get_embed(
             interaction,
@@ -136,7 +151,7 @@ class Config(commands.Cog):
             self.bot.data[guild_id] = {}
         
         self.bot.data[guild_id]['admin_roles'] = [role.id]
-        self.bot.save_data()
+        self.bot.save_data(guild_id)
         
         await interaction.response.send_message(
             embed=await self.get_embed(
@@ -161,7 +176,7 @@ class Config(commands.Cog):
             
         if role.id not in self.bot.data[guild_id]['mod_roles']:
             self.bot.data[guild_id]['mod_roles'].append(role.id)
-            self.bot.save_data()
+            self.bot.save_data(guild_id)
             
             await interaction.response.send_message(
                 embed=await self.get_embed(
@@ -196,7 +211,7 @@ class Config(commands.Cog):
             
         if role.id not in self.bot.data[guild_id]['ticket_support_roles']:
             self.bot.data[guild_id]['ticket_support_roles'].append(role.id)
-            self.bot.save_data()
+            self.bot.save_data(guild_id)
             
             await interaction.response.send_message(
                 embed=await self.get_embed(
@@ -243,6 +258,7 @@ class Config(commands.Cog):
         log_channel = interaction.guild.get_channel(config.get('log_channel', 0))
         description.append("\n**📜 Logging**")
         description.append(f"• Log Channel: {log_channel.mention if log_channel else '❌ Not set'}")
+        description.append(f"• Delivery: {'Webhook' if config.get('log_webhook') else 'Bot messages'}")
         
         # Roles
         description.append("\n**👥 Roles**")
@@ -289,5 +305,92 @@ class Config(commands.Cog):
         
         await interaction.response.send_message(embed=embed, ephemeral=True)
 
+    async def sweep_orphaned_data(self) -> dict:
+        """Remove data for guilds the bot has left and members who left a guild"""
+        present = {str(guild.id): guild for guild in self.bot.guilds}
+        stats = {'guilds': 0, 'records': 0, 'bytes': 0, 'skipped': 0}
+
+        for key in list(self.bot.data):
+            if not key.isdigit():
+                continue
+            guild = present.get(key)
+            guild_data = self.bot.data.get(key)
+            if guild is None:
+                stats['bytes'] += encoded_size(guild_data)
+                del self.bot.data[key]
+                self.bot.save_settings(key)
+                self.bot.dispatch('member_data_removed', key)
+                stats['guilds'] += 1
+            elif not guild.chunked:
+                # Without a full member list we can't tell who left
+                stats['skipped'] += 1
+            elif isinstance(guild_data, dict):
+                before = encoded_size(guild_data)
+                removed = 0
+                for domain in MEMBER_DOMAINS:
+                    records = guild_data.get(domain)
+                    if not isinstance(records, dict):
+                        continue
+                    # Economy settings share the dict with balances, so only numeric keys are members
+                    for user_id in [u for u in records if str(u).isdigit() and not guild.get_member(int(u))]:
+                        del records[user_id]
+                        removed += 1
+                if removed:
+                    stats['records'] += removed
+                    stats['bytes'] += before - encoded_size(guild_data)
+                    self.bot.save_data(key)
+                    # Cogs drop their rankings of this guild instead of guessing they went stale
+                    self.bot.dispatch('member_data_removed', key)
+            # Loading every guild can take a while on big bots
+            await asyncio.sleep(0)
+
+        return stats
+
+    @app_commands.command(name="compactdata", description="Remove saved data for servers and members the bot no longer sees")
+    async def compact_data(self, interaction: discord.Interaction):
+        if not await self.bot.is_owner(interaction.user):
+            return await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        size_before = await self.bot.store.disk_size()
+        stats = await self.sweep_orphaned_data()
+        # Rewrite the snapshot and drop the journal so the space is freed on disk too
+        await self.bot.store.compact()
+        await self.bot.store.flush()
+        freed = max(0, size_before - await self.bot.store.disk_size())
+
+        description = (
+            f"• Departed servers removed: **{stats['guilds']}**\n"
+            f"• Member records removed: **{stats['records']}**\n"
+            f"• Data removed: **~{stats['bytes']:,} bytes** (estimated from its JSON size)\n"
+            f"• Disk space freed: **{freed:,} bytes**"
+        )
+        if stats['skipped']:
+            description += f"\n• Servers skipped (member list not cached): **{stats['skipped']}**"
+
+        embed = await self.get_embed(interaction, "🧹 Data Compacted", description, discord.Color.green())
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="messagestats", description="Show how long each message handling stage takes")
+    @app_commands.describe(reset="Clear the timings after showing them")
+    async def message_stats(self, interaction: discord.Interaction, reset: Optional[bool] = False):
+        if not await self.bot.is_owner(interaction.user):
+            return await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+
+        rows = self.bot.pipeline.report()
+        if not any(calls for _, calls, _, _ in rows):
+            description = "No messages handled yet."
+        else:
+            description = "\n".join(
+                f"• **{name}**: {calls:,} messages, avg **{avg:.2f} ms**, max {peak:.1f} ms"
+                for name, calls, avg, peak in rows
+            )
+        if reset:
+            self.bot.pipeline.reset_stats()
+
+        embed = await self.get_embed(interaction, "⏱️ Message Pipeline", description, discord.Color.blue())
+        embed.set_footer(text="Stages run in order; a moderation verdict skips the later ones")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(Config(bot))
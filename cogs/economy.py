@@ -5,29 +5,22 @@ from datetime import datetime, timedelta
 import random
 from typing import Optional, Literal
 
+from utils.ranking import RankIndex
+
+# Keys in guild_data['economy'] that are settings rather than balances
+SETTINGS_KEYS = ('currency', 'enabled')
+LEADERBOARD_PAGE_SIZE = 10
+
+# Command cooldowns in seconds; these are saved so they survive restarts
+DAILY_COOLDOWN = 86400  # 24 hours
+WORK_COOLDOWN = 3600  # 1 hour
+CRIME_COOLDOWN = 7200  # 2 hours
+
 class Economy(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Custom cooldown mapping that works with interactions
-        self.daily_cooldown = commands.CooldownMapping.from_cooldown(
-            1, 86400, commands.BucketType.user  # 24 hours cooldown
-        )
-        self.work_cooldown = commands.CooldownMapping.from_cooldown(
-            1, 3600, commands.BucketType.user  # 1 hour cooldown
-        )
-        self.crime_cooldown = commands.CooldownMapping.from_cooldown(
-            1, 7200, commands.BucketType.user  # 2 hours cooldown
-        )
-        
-    def _get_cooldown_bucket(self, interaction, cooldown_mapping):
-        """Helper method to get cooldown bucket for interactions"""
-        # Create a mock message with the author attribute that cooldown expects
-        mock_ctx = type('MockContext', (), {
-            'author': interaction.user,
-            'guild': interaction.guild,
-            'channel': interaction.channel
-        })()
-        return cooldown_mapping.get_bucket(mock_ctx.message)
+        self.leaderboards = {}  # guild_id: RankIndex of balances
+        self.leaderboard_pages = {}  # guild_id: {page: rendered leaderboard text}
         self.daily_bonus = 100
         self.work_min = 50
         self.work_max = 150
@@ -36,9 +29,7 @@ class Economy(commands.Cog):
         self.crime_max = 500
         
     async def get_embed(self, ctx, title: str, description: str, color: discord.Color) -> discord.Embed:
-        guild_data = self.bot.data.get(str(ctx.guild.id), {})
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
+        settings = self.bot.settings.get(ctx.guild.id)
         
         embed = discord.Embed(
             title=title,
@@ -46,7 +37,7 @@ class Economy(commands.Cog):
             color=color,
             timestamp=discord.utils.utcnow()
         )
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
+        embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
         return embed
     
     def get_currency_name(self, guild_id: str) -> str:
@@ -69,7 +60,44 @@ class Economy(commands.Cog):
             self.bot.data[guild_id_str]['economy'] = {}
         
         self.bot.data[guild_id_str]['economy'][str(user_id)] = max(0, amount)  # Prevent negative balance
-        self.bot.save_data()
+        self.bot.save_value(guild_id_str, ['economy', str(user_id)], max(0, amount))
+        self.update_leaderboard(guild_id_str, user_id, max(0, amount))
+    
+    def get_leaderboard(self, guild_id: str) -> RankIndex:
+        """Get the guild's balance ranking, building it on first use"""
+        guild_id = str(guild_id)
+        index = self.leaderboards.get(guild_id)
+        if index is None:
+            economy = self.bot.data.get(guild_id, {}).get('economy', {})
+            index = RankIndex({
+                user_id: balance for user_id, balance in economy.items()
+                if isinstance(balance, int) and user_id not in SETTINGS_KEYS
+            })
+            self.leaderboards[guild_id] = index
+            self.leaderboard_pages.pop(guild_id, None)
+        return index
+    
+    def update_leaderboard(self, guild_id: str, user_id: int, balance: int) -> None:
+        """Move a user in the ranking and drop the cached pages whose rows shifted"""
+        index = self.leaderboards.get(guild_id)
+        if index is None or index.score(user_id) == balance:
+            return
+        
+        old_rank = index.rank(user_id)
+        index.update(user_id, balance)
+        new_rank = index.rank(user_id)
+        
+        # Everything between the old and new position moves by one; a new user
+        # pushes down every row below them
+        first = min(old_rank or new_rank, new_rank)
+        last = len(index) if old_rank is None else max(old_rank, new_rank)
+        
+        pages = self.leaderboard_pages.get(guild_id)
+        if pages:
+            first_page = (first - 1) // LEADERBOARD_PAGE_SIZE + 1
+            last_page = (last - 1) // LEADERBOARD_PAGE_SIZE + 1
+            for page in [p for p in pages if first_page <= p <= last_page]:
+                del pages[page]
     
     def add_money(self, guild_id: str, user_id: int, amount: int) -> int:
         """Add money to a user's balance and return the new balance"""
@@ -87,6 +115,17 @@ class Economy(commands.Cog):
         self.set_user_balance(guild_id, user_id, current - amount)
         return True
     
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.leaderboards.pop(str(guild.id), None)
+        self.leaderboard_pages.pop(str(guild.id), None)
+    
+    @commands.Cog.listener()
+    async def on_member_data_removed(self, guild_id: str):
+        """Balances were deleted outside this cog (/compactdata); rebuild the ranking on next use"""
+        self.leaderboards.pop(str(guild_id), None)
+        self.leaderboard_pages.pop(str(guild_id), None)
+    
     @app_commands.command(name="balance", description="Check your balance or another user's balance")
     @app_commands.describe(user="The user whose balance to check (defaults to you)")
     async def balance(self, interaction: discord.Interaction, user: Optional[discord.Member] = None):
@@ -114,9 +153,8 @@ class Economy(commands.Cog):
         guild_id = str(interaction.guild.id)
         user_id = interaction.user.id
         
-        # Check cooldown using the helper method
-        bucket = self._get_cooldown_bucket(interaction, self.daily_cooldown)
-        retry_after = bucket.update_rate_limit()
+        # Check cooldown
+        retry_after = self.bot.cooldowns.hit(guild_id, user_id, 'daily', DAILY_COOLDOWN, persist=True)
         
         if retry_after:
             # Calculate remaining time
@@ -162,9 +200,8 @@ class Economy(commands.Cog):
         guild_id = str(interaction.guild.id)
         user_id = interaction.user.id
         
-        # Check cooldown using the helper method
-        bucket = self._get_cooldown_bucket(interaction, self.work_cooldown)
-        retry_after = bucket.update_rate_limit()
+        # Check cooldown
+        retry_after = self.bot.cooldowns.hit(guild_id, user_id, 'work', WORK_COOLDOWN, persist=True)
         
         if retry_after:
             # Calculate remaining time
@@ -218,8 +255,7 @@ class Economy(commands.Cog):
         user_id = interaction.user.id
         
         # Check cooldown
-        bucket = self.crime_cooldown.get_bucket(interaction)
-        retry_after = bucket.update_rate_limit()
+        retry_after = self.bot.cooldowns.hit(guild_id, user_id, 'crime', CRIME_COOLDOWN, persist=True)
         
         if retry_after:
             # Calculate remaining time
@@ -401,14 +437,9 @@ class Economy(commands.Cog):
                 )
             )
         
-        # Get all users with a balance
-        users_balances = [
-            (int(user_id), balance)
-            for user_id, balance in guild_data['economy'].items()
-            if isinstance(balance, int) and user_id != 'currency' and user_id != 'enabled'
-        ]
+        index = self.get_leaderboard(guild_id)
         
-        if not users_balances:
+        if not len(index):
             return await interaction.response.send_message(
                 embed=await self.get_embed(
                     interaction,
@@ -418,36 +449,35 @@ class Economy(commands.Cog):
                 )
             )
         
-        # Sort by balance (descending)
-        users_balances.sort(key=lambda x: x[1], reverse=True)
-        
         # Calculate pagination
-        items_per_page = 10
-        total_pages = (len(users_balances) + items_per_page - 1) // items_per_page
+        total_pages = (len(index) + LEADERBOARD_PAGE_SIZE - 1) // LEADERBOARD_PAGE_SIZE
         page = max(1, min(page, total_pages))
         
-        start_idx = (page - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        page_data = users_balances[start_idx:end_idx]
-        
-        # Create leaderboard text
-        currency = self.get_currency_name(guild_id)
-        leaderboard_text = []
-        
-        for i, (user_id, balance) in enumerate(page_data, start=start_idx + 1):
-            user = interaction.guild.get_member(user_id)
-            username = str(user) if user else f"Unknown User ({user_id})"
-            leaderboard_text.append(f"`{i}.` **{username}** - {balance:,} {currency}")
+        pages = self.leaderboard_pages.setdefault(guild_id, {})
+        if page not in pages:
+            start_idx = (page - 1) * LEADERBOARD_PAGE_SIZE
+            page_data = index.page(start_idx, LEADERBOARD_PAGE_SIZE)
+            
+            # Create leaderboard text
+            currency = self.get_currency_name(guild_id)
+            leaderboard_text = []
+            
+            for i, (user_id, balance) in enumerate(page_data, start=start_idx + 1):
+                user = interaction.guild.get_member(int(user_id))
+                username = str(user) if user else f"Unknown User ({user_id})"
+                leaderboard_text.append(f"`{i}.` **{username}** - {balance:,} {currency}")
+            
+            pages[page] = "\n".join(leaderboard_text) if leaderboard_text else "No data available."
         
         # Create embed
         embed = await self.get_embed(
             interaction,
             f"{interaction.guild.name} Economy Leaderboard",
-            "\n".join(leaderboard_text) if leaderboard_text else "No data available.",
+            pages[page],
             discord.Color.blue()
         )
         
-        embed.set_footer(text=f"Page {page}/{total_pages} • Total users: {len(users_balances)}")
+        embed.set_footer(text=f"Page {page}/{total_pages} • Total users: {len(index)}")
         
         await interaction.response.send_message(embed=embed)
     
@@ -466,7 +496,8 @@ class Economy(commands.Cog):
         
         old_currency = self.bot.data[guild_id]['economy'].get('currency', 'coins')
         self.bot.data[guild_id]['economy']['currency'] = currency_name
-        self.bot.save_data()
+        self.bot.save_data(guild_id)
+        self.leaderboard_pages.pop(guild_id, None)
         
         await interaction.response.send_message(
             embed=await self.get_embed(
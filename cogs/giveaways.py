@@ -16,25 +16,34 @@ class Giveaways(commands.Cog):
     def cog_unload(self):
         self.check_giveaways.cancel()
     
+    def get_schedule(self) -> dict:
+        """Active giveaways by message ID, so the checker doesn't need to load every guild"""
+        if 'giveaway_schedule' not in self.bot.data:
+            # One-time build from existing guild data
+            schedule = {}
+            for guild_id in list(self.bot.data):
+                if not str(guild_id).isdigit():
+                    continue
+                for giveaway_id, giveaway in self.bot.data[guild_id].get('giveaways', {}).items():
+                    if giveaway.get('status') == 'active':
+                        schedule[giveaway_id] = {
+                            'guild_id': int(guild_id),
+                            'end_time': giveaway['end_time']
+                        }
+            self.bot.data['giveaway_schedule'] = schedule
+            self.bot.save_data('giveaway_schedule')
+        return self.bot.data['giveaway_schedule']
+    
     @tasks.loop(seconds=30)
     async def check_giveaways(self):
         """Check for ended giveaways"""
         now = datetime.utcnow()
         
-        for guild_id, guild_data in self.bot.data.items():
-            if 'giveaways' not in guild_data:
-                continue
-            
-            giveaways = guild_data['giveaways'].copy()
+        for giveaway_id, entry in list(self.get_schedule().items()):
+            end_time = datetime.fromisoformat(entry['end_time'])
             
-            for giveaway_id, giveaway in giveaways.items():
-                if giveaway['status'] != 'active':
-                    continue
-                
-                end_time = datetime.fromisoformat(giveaway['end_time'])
-                
-                if now >= end_time:
-                    await self.end_giveaway(int(guild_id), giveaway_id)
+            if now >= end_time:
+                await self.end_giveaway(entry['guild_id'], giveaway_id)
     
     @check_giveaways.before_loop
     async def before_check_giveaways(self):
@@ -43,12 +52,18 @@ class Giveaways(commands.Cog):
     async def end_giveaway(self, guild_id: int, giveaway_id: str):
         """End a giveaway and select winners"""
         try:
+            schedule = self.get_schedule()
+            if schedule.pop(giveaway_id, None) is not None:
+                self.bot.save_data('giveaway_schedule')
+            
             guild_data = self.bot.data.get(str(guild_id), {})
             if 'giveaways' not in guild_data or giveaway_id not in guild_data['giveaways']:
                 return
             
             giveaway = guild_data['giveaways'][giveaway_id]
             giveaway['status'] = 'ended'
+            # Saved now: it's already off the schedule, and the steps below may return early
+            self.bot.save_data(guild_id)
             
             # Get guild and channel
             guild = self.bot.get_guild(guild_id)
@@ -79,9 +94,6 @@ class Giveaways(commands.Cog):
                 
                 await message.edit(embed=embed)
                 await channel.send("The giveaway ended but no one participated!")
-                
-                guild_data['giveaways'][giveaway_id] = giveaway
-                self.bot.save_data()
                 return
             
             # Select winners
@@ -91,7 +103,7 @@ class Giveaways(commands.Cog):
             # Update giveaway data
             giveaway['selected_winners'] = winners
             guild_data['giveaways'][giveaway_id] = giveaway
-            self.bot.save_data()
+            self.bot.save_data(guild_id)
             
             # Create winner list
             winner_mentions = []
@@ -208,7 +220,11 @@ class Giveaways(commands.Cog):
         }
         
         self.bot.data[str(interaction.guild.id)] = guild_data
-        self.bot.save_data()
+        self.get_schedule()[giveaway_id] = {
+            'guild_id': interaction.guild.id,
+            'end_time': end_time.isoformat()
+        }
+        self.bot.save_data(interaction.guild.id, 'giveaway_schedule')
         
         await interaction.followup.send(
             f"✅ Giveaway started in {channel.mention}!\n"
@@ -246,7 +262,7 @@ class Giveaways(commands.Cog):
         if payload.user_id not in giveaway['participants']:
             giveaway['participants'].append(payload.user_id)
             guild_data['giveaways'][giveaway_id] = giveaway
-            self.bot.save_data()
+            self.bot.save_data(payload.guild_id)
     
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
@@ -276,7 +292,7 @@ class Giveaways(commands.Cog):
         if payload.user_id in giveaway['participants']:
             giveaway['participants'].remove(payload.user_id)
             guild_data['giveaways'][giveaway_id] = giveaway
-            self.bot.save_data()
+            self.bot.save_data(payload.guild_id)
     
     @app_commands.command(name="gend", description="End a giveaway early")
     @app_commands.checks.has_permissions(manage_guild=True)
@@ -323,7 +339,7 @@ class Giveaways(commands.Cog):
         # Update data
         giveaway['selected_winners'] = winners
         guild_data['giveaways'][message_id] = giveaway
-        self.bot.save_data()
+        self.bot.save_data(interaction.guild.id)
         
         # Announce new winners
         winner_mentions = []
@@ -1,65 +1,120 @@
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+import asyncio
 import random
 import math
 from datetime import datetime, timedelta
-from collections import defaultdict
 from typing import Optional
 import io
+import logging
+
+from utils.ranking import RankIndex
+from utils.settings import LevelingSettings, defaults
+from utils.pipeline import MessageContext
+
+logger = logging.getLogger(__name__)
+
+# How often queued XP grants are applied and saved
+XP_TICK_SECONDS = 1.0
+# XP is awarded after moderation stages have had their say
+PIPELINE_PRIORITY = 100
 
 class Leveling(commands.Cog):
     """Leveling and XP system with customizable rewards"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.xp_cooldowns = defaultdict(datetime)  # user_id: last_xp_time
+        self.rank_indexes = {}  # guild_id: RankIndex of user XP
+        self.pending_xp = {}  # (guild_id, user_id): [grants, latest message]
         self.load_leveling_data()
+        self.apply_xp.start()
+        bot.pipeline.register('leveling', self.award_xp, PIPELINE_PRIORITY)
+    
+    def cog_unload(self):
+        self.apply_xp.cancel()
+        self.bot.pipeline.unregister('leveling')
+        # Keep what was earned since the last tick; announcements are skipped
+        self.apply_pending_xp()
     
     def load_leveling_data(self):
-        """Load or initialize leveling data"""
-        if 'leveling' not in self.bot.data:
-            self.bot.data['leveling'] = {}
+        """Move users out of the old global leveling dict into their guilds"""
+        legacy = self.bot.data.get('leveling')
+        if legacy is None:
+            return
+
+        guilds = set()
+        for key, user_data in legacy.items():
+            guild_id, _, user_id = str(key).partition(':')
+            if not user_id:
+                continue
+            guild_data = self.bot.data.get(guild_id)
+            if guild_data is None:
+                guild_data = self.bot.data[guild_id] = {}
+            guild_data.setdefault('leveling_users', {})[user_id] = user_data
+            guilds.add(guild_id)
+
+        del self.bot.data['leveling']
+        self.bot.save_data('leveling', *guilds)
+        logger.info(f"[OK] Moved {len(legacy)} leveling entries into {len(guilds)} guilds")
     
     def get_guild_leveling_config(self, guild_id: int) -> dict:
-        """Get leveling configuration for a guild"""
+        """Get a guild's leveling configuration as an editable dict, for commands that change it.
+        Message handling reads ``bot.settings`` instead."""
         guild_data = self.bot.data.get(str(guild_id), {})
-        return guild_data.get('leveling', {
-            'enabled': False,
-            'xp_min': 15,
-            'xp_max': 25,
-            'xp_cooldown': 60,  # seconds
-            'level_up_message': True,
-            'level_up_channel': None,  # None = same channel
-            'level_roles': {},  # level: role_id
-            'ignored_channels': [],
-            'xp_multiplier': 1.0,
-            'announce_levelup': True
-        })
+        config = defaults(LevelingSettings)
+        config.update(guild_data.get('leveling', {}))
+        return config
     
     def save_guild_leveling_config(self, guild_id: int, config: dict):
         """Save leveling configuration"""
         guild_data = self.bot.data.get(str(guild_id), {})
         guild_data['leveling'] = config
         self.bot.data[str(guild_id)] = guild_data
-        self.bot.save_data()
+        self.bot.save_settings(guild_id)
+    
+    def get_guild_users(self, guild_id: int) -> dict:
+        """Get the XP data of every user in a guild"""
+        guild_data = self.bot.data.get(str(guild_id))
+        if guild_data is None:
+            guild_data = self.bot.data[str(guild_id)] = {}
+        return guild_data.setdefault('leveling_users', {})
+    
+    def get_rank_index(self, guild_id: int) -> RankIndex:
+        """Get the guild's XP ranking, building it on first use"""
+        index = self.rank_indexes.get(str(guild_id))
+        if index is None:
+            users = self.get_guild_users(guild_id)
+            index = RankIndex({user_id: data.get('xp', 0) for user_id, data in users.items()})
+            self.rank_indexes[str(guild_id)] = index
+        return index
     
     def get_user_xp(self, guild_id: int, user_id: int) -> dict:
         """Get user XP data"""
-        key = f"{guild_id}:{user_id}"
-        if key not in self.bot.data['leveling']:
-            self.bot.data['leveling'][key] = {
+        users = self.get_guild_users(guild_id)
+        key = str(user_id)
+        if key not in users:
+            users[key] = {
                 'xp': 0,
                 'level': 0,
                 'messages': 0
             }
-        return self.bot.data['leveling'][key]
+            index = self.rank_indexes.get(str(guild_id))
+            if index is not None:
+                index.update(key, 0)
+        return users[key]
+    
+    def store_user_xp(self, guild_id: int, user_id: int, data: dict):
+        """Update user XP data in memory and in the rank index"""
+        self.get_guild_users(guild_id)[str(user_id)] = data
+        index = self.rank_indexes.get(str(guild_id))
+        if index is not None:
+            index.update(user_id, data['xp'])
     
     def save_user_xp(self, guild_id: int, user_id: int, data: dict):
         """Save user XP data"""
-        key = f"{guild_id}:{user_id}"
-        self.bot.data['leveling'][key] = data
-        self.bot.save_data()
+        self.store_user_xp(guild_id, user_id, data)
+        self.bot.save_value(guild_id, ['leveling_users', str(user_id)], data)
     
     def xp_to_level(self, xp: int) -> int:
         """Calculate level from XP"""
@@ -69,70 +124,101 @@ class Leveling(commands.Cog):
         """Calculate XP needed for level"""
         return (level ** 2) * 100
     
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        """Award XP for messages"""
-        if not message.guild or message.author.bot:
-            return
+    async def award_xp(self, ctx: MessageContext):
+        """Award XP for messages (a message stage, skipped for messages automod removed)"""
+        message = ctx.message
+        config = ctx.settings.leveling
         
-        config = self.get_guild_leveling_config(message.guild.id)
-        
-        if not config.get('enabled', False):
+        if not config.enabled:
             return
         
         # Check ignored channels
-        if message.channel.id in config.get('ignored_channels', []):
+        if message.channel.id in config.ignored_channels:
             return
         
-        # Check cooldown
-        user_key = message.author.id
-        now = datetime.utcnow()
-        last_xp = self.xp_cooldowns.get(user_key)
-        
-        cooldown = config.get('xp_cooldown', 60)
-        if last_xp and (now - last_xp).total_seconds() < cooldown:
+        # Check and start the per-guild cooldown (memory only; it's short)
+        if self.bot.cooldowns.hit(message.guild.id, message.author.id, 'xp', config.xp_cooldown):
             return
         
-        # Update cooldown
-        self.xp_cooldowns[user_key] = now
-        
-        # Get user data
-        user_data = self.get_user_xp(message.guild.id, message.author.id)
-        old_level = user_data['level']
-        
-        # Award XP
-        xp_min = config.get('xp_min', 15)
-        xp_max = config.get('xp_max', 25)
-        xp_multiplier = config.get('xp_multiplier', 1.0)
-        
-        xp_gain = random.randint(xp_min, xp_max) * xp_multiplier
-        user_data['xp'] += int(xp_gain)
-        user_data['messages'] += 1
-        
-        # Calculate new level
-        new_level = self.xp_to_level(user_data['xp'])
-        user_data['level'] = new_level
-        
-        # Save data
-        self.save_user_xp(message.guild.id, message.author.id, user_data)
-        
-        # Check for level up
-        if new_level > old_level:
-            await self.handle_level_up(message, new_level, config)
+        # Queue the grant; apply_xp rolls, saves and checks level ups in bulk
+        pending = self.pending_xp.get((message.guild.id, message.author.id))
+        if pending is None:
+            self.pending_xp[(message.guild.id, message.author.id)] = [1, message]
+        else:
+            pending[0] += 1
+            pending[1] = message
     
-    async def handle_level_up(self, message: discord.Message, new_level: int, config: dict):
-        """Handle level up event"""
+    def apply_pending_xp(self) -> list:
+        """Apply queued XP grants and save them. Returns (message, old level, new level) level ups."""
+        if not self.pending_xp:
+            return []
+        pending, self.pending_xp = self.pending_xp, {}
+        
+        changes = []
+        level_ups = []
+        for (guild_id, user_id), (grants, message) in pending.items():
+            config = self.bot.settings.get(guild_id).leveling
+            xp_min = config.xp_min
+            xp_max = config.xp_max
+            xp_multiplier = config.xp_multiplier
+            xp_gain = sum(int(random.randint(xp_min, xp_max) * xp_multiplier) for _ in range(grants))
+            
+            user_data = self.get_user_xp(guild_id, user_id)
+            old_level = user_data['level']
+            user_data['xp'] += xp_gain
+            user_data['messages'] += grants
+            user_data['level'] = self.xp_to_level(user_data['xp'])
+            
+            self.store_user_xp(guild_id, user_id, user_data)
+            changes.append((guild_id, ['leveling_users', str(user_id)], user_data))
+            if user_data['level'] > old_level:
+                level_ups.append((message, old_level, user_data['level']))
+        
+        # One journal append for the whole batch
+        self.bot.save_values(changes)
+        return level_ups
+    
+    @tasks.loop(seconds=XP_TICK_SECONDS)
+    async def apply_xp(self):
+        """Apply queued XP and announce level ups"""
+        level_ups = self.apply_pending_xp()
+        if not level_ups:
+            return
+        results = await asyncio.gather(
+            *(self.handle_level_up(message, old_level, new_level, self.bot.settings.get(message.guild.id).leveling)
+              for message, old_level, new_level in level_ups),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f'[ERROR] Level up handling failed: {result}')
+    
+    @apply_xp.before_loop
+    async def before_apply_xp(self):
+        await self.bot.wait_until_ready()
+    
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self.rank_indexes.pop(str(guild.id), None)
+    
+    @commands.Cog.listener()
+    async def on_member_data_removed(self, guild_id: str):
+        """XP records were deleted outside this cog (/compactdata); rebuild the ranking on next use"""
+        self.rank_indexes.pop(str(guild_id), None)
+    
+    async def handle_level_up(self, message: discord.Message, old_level: int, new_level: int, config: LevelingSettings):
+        """Handle level up event. XP is applied in batches, so one level up can skip levels."""
         # Send level up message
-        if config.get('announce_levelup', True):
+        if config.announce_levelup:
             # Get level up channel
-            channel_id = config.get('level_up_channel')
+            channel_id = config.level_up_channel
             if channel_id:
                 channel = message.guild.get_channel(channel_id)
             else:
                 channel = message.channel
             
             if channel:
-                guild_data = self.bot.data.get(str(message.guild.id), {})
+                settings = self.bot.settings.get(message.guild.id)
                 
                 embed = discord.Embed(
                     title="🎉 Level Up!",
@@ -140,21 +226,24 @@ class Leveling(commands.Cog):
                     color=discord.Color.gold()
                 )
                 
-                # Check for role rewards
-                level_roles = config.get('level_roles', {})
-                if str(new_level) in level_roles:
-                    role_id = level_roles[str(new_level)]
-                    role = message.guild.get_role(role_id)
-                    if role:
-                        try:
-                            await message.author.add_roles(role, reason=f"Reached level {new_level}")
-                            embed.add_field(name="Role Unlocked", value=role.mention, inline=False)
-                        except:
-                            pass
+                # Check for role rewards of every level reached, not only the last one
+                roles = [
+                    message.guild.get_role(role_id) for level, role_id in sorted(config.level_roles.items())
+                    if old_level < level <= new_level
+                ]
+                roles = [role for role in roles if role]
+                if roles:
+                    try:
+                        await message.author.add_roles(*roles, reason=f"Reached level {new_level}")
+                        embed.add_field(
+                            name="Role Unlocked" if len(roles) == 1 else "Roles Unlocked",
+                            value=" ".join(role.mention for role in roles),
+                            inline=False
+                        )
+                    except:
+                        pass
                 
-                footer_icon = guild_data.get('footer_icon', '')
-                footer_text = guild_data.get('footer_text', 'Synergy Bot')
-                embed.set_footer(text=footer_text, icon_url=footer_icon)
+                embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
                 
                 await channel.send(embed=embed)
     
@@ -184,13 +273,7 @@ class Leveling(commands.Cog):
         xp_needed = next_level_xp - current_level_xp
         
         # Calculate rank (leaderboard position)
-        all_users = []
-        for key, data in self.bot.data.get('leveling', {}).items():
-            if ':' in str(key) and str(key).startswith(str(interaction.guild.id)):
-                all_users.append((key, data.get('xp', 0)))
-        
-        all_users.sort(key=lambda x: x[1], reverse=True)
-        rank = next((i + 1 for i, (key, _) in enumerate(all_users) if key == f"{interaction.guild.id}:{user.id}"), 0)
+        rank = self.get_rank_index(interaction.guild.id).rank(user.id) or 0
         
         # Create embed
         guild_data = self.bot.data.get(str(interaction.guild.id), {})
@@ -227,27 +310,19 @@ class Leveling(commands.Cog):
         if not config.get('enabled', False):
             return await interaction.response.send_message("Leveling system is not enabled!", ephemeral=True)
         
-        # Get all users in this guild
-        guild_users = []
-        for key, data in self.bot.data.get('leveling', {}).items():
-            if ':' in str(key) and str(key).startswith(str(interaction.guild.id)):
-                user_id = int(str(key).split(':')[1])
-                guild_users.append((user_id, data.get('level', 0), data.get('xp', 0), data.get('messages', 0)))
-        
-        # Sort by XP
-        guild_users.sort(key=lambda x: x[2], reverse=True)
+        guild_users = self.get_guild_users(interaction.guild.id)
+        index = self.get_rank_index(interaction.guild.id)
         
-        if not guild_users:
+        if not len(index):
             return await interaction.response.send_message("No users have XP yet!", ephemeral=True)
         
         # Pagination
         per_page = 10
-        total_pages = math.ceil(len(guild_users) / per_page)
+        total_pages = math.ceil(len(index) / per_page)
         page = max(1, min(page, total_pages))
         
         start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        page_users = guild_users[start_idx:end_idx]
+        page_users = index.page(start_idx, per_page)
         
         # Create embed
         guild_data = self.bot.data.get(str(interaction.guild.id), {})
@@ -258,9 +333,10 @@ class Leveling(commands.Cog):
         )
         
         description = []
-        for i, (user_id, level, xp, messages) in enumerate(page_users, start=start_idx + 1):
-            user = interaction.guild.get_member(user_id)
+        for i, (user_id, xp) in enumerate(page_users, start=start_idx + 1):
+            user = interaction.guild.get_member(int(user_id))
             if user:
+                level = guild_users[user_id].get('level', 0)
                 medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"**#{i}**"
                 description.append(f"{medal} {user.mention} - Level **{level}** ({xp:,} XP)")
         
@@ -2,16 +2,26 @@ import discord
 from discord import app_commands
 from discord.ext import commands
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Literal
+import time
+from utils.logdispatch import NORMAL, LOW
+from utils.content_cache import CachedMessage
+
+LOGSEARCH_PAGE_SIZE = 10
+LOGSEARCH_MAX_PAGE = 100  # deep OFFSETs make SQLite walk every skipped row; narrow the filters instead
+
+EventType = Literal[
+    'message_edit', 'message_delete', 'member_join', 'member_leave', 'member_roles', 'nickname',
+    'channel_create', 'channel_delete', 'channel_update', 'role_create', 'role_delete', 'role_update',
+    'voice_join', 'voice_leave', 'voice_move', 'action'
+]
 
 class Logging(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
     async def get_embed(self, ctx, title: str, description: str, color: discord.Color) -> discord.Embed:
-        guild_data = self.bot.data.get(str(ctx.guild.id), {})
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
+        settings = self.bot.settings.get(ctx.guild.id)
         
         embed = discord.Embed(
             title=title,
@@ -19,61 +29,59 @@ class Logging(commands.Cog):
             color=color,
             timestamp=discord.utils.utcnow()
         )
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
+        embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
         return embed
 
-    async def log_action(self, guild, title: str, description: str, color: discord.Color) -> None:
-        """Log an action to the log channel"""
-        guild_data = self.bot.data.get(str(guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
+    async def log_event(self, guild, event_type: str, embed: discord.Embed, priority: int, user=None, channel=None,
+                        content: str = '', detail: Optional[dict] = None) -> None:
+        """Store an event for /logsearch, then queue its embed for the guild's log channel.
+
+        The event is stored even when the guild has no log channel, so the
+        history is complete. Embeds are batched per channel and may be
+        dropped by priority under load (see utils.logdispatch).
+        """
+        if self.bot.events is not None:
+            self.bot.events.record(
+                guild.id, event_type,
+                user.id if user else None,
+                channel.id if channel else None,
+                content, detail
+            )
         
-        if not log_channel_id:
-            return
-            
-        log_channel = guild.get_channel(log_channel_id)
+        settings = self.bot.settings.get(guild.id)
+        log_channel = guild.get_channel(settings.log_channel) if settings.log_channel else None
         if not log_channel:
             return
-            
+        # Changes to the log channel itself aren't posted into it
+        if event_type.startswith('channel_') and channel is not None and channel.id == log_channel.id:
+            return
+        
+        embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
+        await self.bot.log_dispatcher.send(log_channel, embed, priority)
+
+    async def log_action(self, guild, title: str, description: str, color: discord.Color) -> None:
+        """Log an action to the log channel"""
         embed = discord.Embed(
             title=title,
             description=description,
             color=color,
             timestamp=discord.utils.utcnow()
         )
-        
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass  # Silently fail if we can't log the action
+        await self.log_event(guild, 'action', embed, NORMAL, content=f"{title}\n{description}")
 
     @commands.Cog.listener()
-    async def on_message_edit(self, before: discord.Message, after: discord.Message):
-        # Ignore DMs and bot messages
-        if not before.guild or before.author.bot or before.content == after.content:
-            return
-            
-        # Get log channel
-        guild_data = self.bot.data.get(str(before.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = before.guild.get_channel(log_channel_id)
-        if not log_channel:
+    async def on_cached_message_edit(self, payload: discord.RawMessageUpdateEvent, before: CachedMessage, content: str):
+        # Dispatched by the bot for user messages whose previous content is known
+        guild = self.bot.get_guild(payload.guild_id)
+        if not guild:
             return
         
         # Create embed
         embed = discord.Embed(
             title="Message Edited",
-            description=f"**Author:** {before.author.mention} (ID: {before.author.id})\n"
-                      f"**Channel:** {before.channel.mention}\n"
-                      f"[Jump to Message]({before.jump_url})",
+            description=f"**Author:** <@{before.author_id}> (ID: {before.author_id})\n"
+                      f"**Channel:** <#{payload.channel_id}>\n"
+                      f"[Jump to Message](https://discord.com/channels/{guild.id}/{payload.channel_id}/{payload.message_id})",
             color=discord.Color.blue(),
             timestamp=discord.utils.utcnow()
         )
@@ -87,43 +95,28 @@ class Logging(commands.Cog):
         
         embed.add_field(
             name="After",
-            value=after.content[:1024] or "*No content*",
+            value=content[:1024] or "*No content*",
             inline=False
         )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(
+            guild, 'message_edit', embed, LOW,
+            discord.Object(id=before.author_id), discord.Object(id=payload.channel_id),
+            content, {'message_id': payload.message_id, 'before': before.content}
+        )
 
     @commands.Cog.listener()
-    async def on_message_delete(self, message: discord.Message):
-        # Ignore DMs and bot messages
-        if not message.guild or message.author.bot:
-            return
-            
-        # Get log channel
-        guild_data = self.bot.data.get(str(message.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = message.guild.get_channel(log_channel_id)
-        if not log_channel:
+    async def on_cached_message_delete(self, payload: discord.RawMessageDeleteEvent, message: CachedMessage):
+        # Dispatched by the bot for deleted user messages whose content is known
+        guild = self.bot.get_guild(payload.guild_id)
+        if not guild:
             return
         
         # Create embed
         embed = discord.Embed(
             title="Message Deleted",
-            description=f"**Author:** {message.author.mention} (ID: {message.author.id})\n"
-                      f"**Channel:** {message.channel.mention}\n"
+            description=f"**Author:** <@{message.author_id}> (ID: {message.author_id})\n"
+                      f"**Channel:** <#{payload.channel_id}>\n"
                       f"**Message ID:** `{message.id}`",
             color=discord.Color.red(),
             timestamp=discord.utils.utcnow()
@@ -139,37 +132,21 @@ class Logging(commands.Cog):
         
         # Add attachment info if any
         if message.attachments:
-            attachment_list = [f"[Attachment {i+1}]({a.url})" for i, a in enumerate(message.attachments)]
+            attachment_list = [f"[Attachment {i+1}]({url})" for i, url in enumerate(message.attachments)]
             embed.add_field(
                 name="Attachments",
-                value="\n".join(attachment_list) or "*No attachments*",
+                value="\n".join(attachment_list)[:1024] or "*No attachments*",
                 inline=False
             )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(
+            guild, 'message_delete', embed, NORMAL,
+            discord.Object(id=message.author_id), discord.Object(id=payload.channel_id),
+            message.content, {'message_id': message.id, 'attachments': list(message.attachments)}
+        )
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
-        # Get log channel
-        guild_data = self.bot.data.get(str(member.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = member.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
-        
         # Calculate account age
         account_age = (discord.utils.utcnow() - member.created_at).days
         
@@ -186,30 +163,10 @@ class Logging(commands.Cog):
         # Add user avatar
         embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(member.guild, 'member_join', embed, LOW, member)
 
     @commands.Cog.listener()
     async def on_member_remove(self, member: discord.Member):
-        # Get log channel
-        guild_data = self.bot.data.get(str(member.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = member.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
-        
         # Calculate join duration
         join_duration = "Unknown"
         if member.joined_at:
@@ -240,16 +197,10 @@ class Logging(commands.Cog):
         # Add user avatar
         embed.set_thumbnail(url=member.avatar.url if member.avatar else member.default_avatar.url)
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(
+            member.guild, 'member_leave', embed, LOW, member,
+            detail={'roles': [role.id for role in member.roles[1:]]}
+        )
 
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member):
@@ -263,16 +214,6 @@ class Logging(commands.Cog):
     
     async def log_role_change(self, before: discord.Member, after: discord.Member):
         """Log role changes"""
-        guild_data = self.bot.data.get(str(before.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = before.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
-        
         # Get role changes
         added_roles = [role for role in after.roles if role not in before.roles]
         removed_roles = [role for role in before.roles if role not in after.roles]
@@ -305,29 +246,14 @@ class Logging(commands.Cog):
                 inline=False
             )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(
+            after.guild, 'member_roles', embed, NORMAL, after,
+            content=' '.join([f'+{role.name}' for role in added_roles] + [f'-{role.name}' for role in removed_roles]),
+            detail={'added': [role.id for role in added_roles], 'removed': [role.id for role in removed_roles]}
+        )
     
     async def log_nickname_change(self, before: discord.Member, after: discord.Member):
         """Log nickname changes"""
-        guild_data = self.bot.data.get(str(before.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = before.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
-        
         # Create embed
         embed = discord.Embed(
             title="Member Nickname Updated",
@@ -349,30 +275,13 @@ class Logging(commands.Cog):
             inline=True
         )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(
+            after.guild, 'nickname', embed, LOW, after,
+            content=f"{before.nick or before.name} → {after.nick or after.name}"
+        )
 
     @commands.Cog.listener()
     async def on_guild_channel_create(self, channel):
-        # Get log channel
-        guild_data = self.bot.data.get(str(channel.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = channel.guild.get_channel(log_channel_id)
-        if not log_channel or log_channel == channel:  # Don't log the log channel
-            return
-        
         # Get channel type
         channel_type = str(channel.type).replace('_', ' ').title()
         
@@ -422,30 +331,10 @@ class Logging(commands.Cog):
                 inline=False
             )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(channel.guild, 'channel_create', embed, NORMAL, channel=channel, content=channel.name)
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel):
-        # Get log channel
-        guild_data = self.bot.data.get(str(channel.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = channel.guild.get_channel(log_channel_id)
-        if not log_channel or log_channel == channel:  # Don't log the log channel
-            return
-        
         # Get channel type
         channel_type = str(channel.type).replace('_', ' ').title()
         
@@ -466,16 +355,7 @@ class Logging(commands.Cog):
                 inline=True
             )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(channel.guild, 'channel_delete', embed, NORMAL, channel=channel, content=channel.name)
 
     @commands.Cog.listener()
     async def on_guild_channel_update(self, before, after):
@@ -483,20 +363,6 @@ class Logging(commands.Cog):
         if before.name == after.name and before.position == after.position and before.category == after.category:
             return
             
-        # Get log channel
-        guild_data = self.bot.data.get(str(before.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = before.guild.get_channel(log_channel_id)
-        if not log_channel or log_channel == before:  # Don't log the log channel
-            return
-        
-        # Get channel type
-        channel_type = str(before.type).replace('_', ' ').title()
-        
         # Check what changed
         changes = []
         
@@ -512,6 +378,9 @@ class Logging(commands.Cog):
         if not changes:
             return
         
+        # Get channel type
+        channel_type = str(before.type).replace('_', ' ').title()
+        
         # Create embed
         embed = discord.Embed(
             title=f"{channel_type} Channel Updated",
@@ -528,30 +397,10 @@ class Logging(commands.Cog):
             inline=False
         )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(after.guild, 'channel_update', embed, NORMAL, channel=after, content="\n".join(changes))
 
     @commands.Cog.listener()
     async def on_guild_role_create(self, role):
-        # Get log channel
-        guild_data = self.bot.data.get(str(role.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = role.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
-        
         # Get role permissions
         permissions = [perm for perm, value in role.permissions if value]
         
@@ -574,30 +423,10 @@ class Logging(commands.Cog):
                 inline=False
             )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(role.guild, 'role_create', embed, NORMAL, content=role.name, detail={'role_id': role.id})
 
     @commands.Cog.listener()
     async def on_guild_role_delete(self, role):
-        # Get log channel
-        guild_data = self.bot.data.get(str(role.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = role.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
-        
         # Create embed
         embed = discord.Embed(
             title="Role Deleted",
@@ -609,16 +438,7 @@ class Logging(commands.Cog):
             timestamp=discord.utils.utcnow()
         )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(role.guild, 'role_delete', embed, NORMAL, content=role.name, detail={'role_id': role.id})
 
     @commands.Cog.listener()
     async def on_guild_role_update(self, before, after):
@@ -626,17 +446,6 @@ class Logging(commands.Cog):
         if before.name == after.name and before.color == after.color and before.permissions == after.permissions:
             return
             
-        # Get log channel
-        guild_data = self.bot.data.get(str(before.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = before.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
-        
         # Check what changed
         changes = []
         
@@ -676,36 +485,17 @@ class Logging(commands.Cog):
             inline=False
         )
         
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
-        
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        await self.log_event(after.guild, 'role_update', embed, NORMAL, content="\n".join(changes), detail={'role_id': after.id})
 
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         # Skip if no relevant changes
         if before.channel == after.channel:
             return
-            
-        # Get log channel
-        guild_data = self.bot.data.get(str(member.guild.id), {})
-        log_channel_id = guild_data.get('log_channel')
-        
-        if not log_channel_id:
-            return
-            
-        log_channel = member.guild.get_channel(log_channel_id)
-        if not log_channel:
-            return
         
         # User joined a voice channel
-        if not before.channel and after.channel:
+        if not before.channel:
+            event = 'voice_join'
             embed = discord.Embed(
                 title="Voice Channel Joined",
                 description=f"**User:** {member.mention} (ID: {member.id})\n"
@@ -715,7 +505,8 @@ class Logging(commands.Cog):
             )
         
         # User left a voice channel
-        elif before.channel and not after.channel:
+        elif not after.channel:
+            event = 'voice_leave'
             embed = discord.Embed(
                 title="Voice Channel Left",
                 description=f"**User:** {member.mention} (ID: {member.id})\n"
@@ -725,7 +516,8 @@ class Logging(commands.Cog):
             )
         
         # User moved between voice channels
-        elif before.channel != after.channel:
+        else:
+            event = 'voice_move'
             embed = discord.Embed(
                 title="Voice Channel Moved",
                 description=f"**User:** {member.mention} (ID: {member.id})\n"
@@ -735,19 +527,75 @@ class Logging(commands.Cog):
                 timestamp=discord.utils.utcnow()
             )
         
-        else:
-            return
-        
-        # Add footer
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
+        await self.log_event(member.guild, event, embed, LOW, member, after.channel or before.channel)
+
+    @app_commands.command(name="logsearch", description="Search this server's logged events")
+    @app_commands.checks.has_permissions(view_audit_log=True)
+    @app_commands.describe(
+        user="Only events for this user",
+        channel="Only events in this channel",
+        event="Only this kind of event",
+        text="Only events whose content contains this text",
+        days="Only events from the last N days",
+        page=f"Page number ({LOGSEARCH_PAGE_SIZE} events per page)"
+    )
+    async def logsearch(
+        self,
+        interaction: discord.Interaction,
+        user: Optional[discord.User] = None,
+        channel: Optional[discord.abc.GuildChannel] = None,
+        event: Optional[EventType] = None,
+        text: Optional[str] = None,
+        days: Optional[app_commands.Range[int, 1, 365]] = None,
+        page: app_commands.Range[int, 1, LOGSEARCH_MAX_PAGE] = 1
+    ):
+        if self.bot.events is None:
+            return await interaction.response.send_message(
+                embed=await self.get_embed(
+                    interaction, "Event Log Disabled",
+                    "Local event storage is turned off for this bot (`EVENT_LOG_PATH`).",
+                    discord.Color.red()
+                ),
+                ephemeral=True
+            )
         
-        # Send to log channel
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass
+        start = time.perf_counter()
+        # One extra row tells us whether there is a next page
+        events = await self.bot.events.search(
+            interaction.guild.id,
+            user_id=user.id if user else None,
+            channel_id=channel.id if channel else None,
+            event_type=event,
+            since=time.time() - days * 86400 if days else None,
+            text=text,
+            limit=LOGSEARCH_PAGE_SIZE + 1,
+            offset=(page - 1) * LOGSEARCH_PAGE_SIZE
+        )
+        elapsed = (time.perf_counter() - start) * 1000
+        has_more = len(events) > LOGSEARCH_PAGE_SIZE
+        
+        lines = []
+        for entry in events[:LOGSEARCH_PAGE_SIZE]:
+            line = f"<t:{int(entry.ts)}:R> **{entry.type.replace('_', ' ').title()}**"
+            if entry.user_id:
+                line += f" <@{entry.user_id}>"
+            if entry.channel_id:
+                line += f" in <#{entry.channel_id}>"
+            if entry.content:
+                content = entry.content.replace('\n', ' ')
+                line += f"\n> {content[:150]}{'…' if len(content) > 150 else ''}"
+            lines.append(line)
+        
+        embed = await self.get_embed(
+            interaction,
+            "🔎 Log Search",
+            "\n".join(lines) if lines else "No matching events.",
+            discord.Color.blue()
+        )
+        embed.set_footer(
+            text=f"Page {page}{' • more with page:' + str(page + 1) if has_more else ''} • {elapsed:.0f} ms"
+        )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
 
 async def setup(bot):
     await bot.add_cog(Logging(bot))
@@ -5,6 +5,7 @@ from datetime import datetime, timedelta
 import json
 import asyncio
 from typing import Optional
+from utils.logdispatch import HIGH
 
 class Moderation(commands.Cog):
     def __init__(self, bot):
@@ -16,9 +17,7 @@ class Moderation(commands.Cog):
             task.cancel()
 
     async def get_mod_embed(self, ctx, title: str, description: str, color: discord.Color) -> discord.Embed:
-        guild_data = self.bot.data.get(str(ctx.guild.id), {})
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
+        settings = self.bot.settings.get(ctx.guild.id)
         
         embed = discord.Embed(
             title=title,
@@ -26,7 +25,7 @@ class Moderation(commands.Cog):
             color=color,
             timestamp=datetime.utcnow()
         )
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
+        embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
         return embed
 
     @app_commands.command(name="tempban", description="Temporarily ban a user from the server")
@@ -366,7 +365,7 @@ class Moderation(commands.Cog):
         }
         
         self.bot.data[guild_id]['warnings'][user_id].append(warning)
-        self.bot.save_data()
+        self.bot.save_value(guild_id, ['warnings', user_id], self.bot.data[guild_id]['warnings'][user_id])
         
         # Log the warning
         await self.log_action(
@@ -445,7 +444,7 @@ class Moderation(commands.Cog):
         
         warning_count = len(self.bot.data[guild_id]['warnings'][user_id])
         del self.bot.data[guild_id]['warnings'][user_id]
-        self.bot.save_data()
+        self.bot.delete_value(guild_id, ['warnings', user_id])
         
         # Log the action
         await self.log_action(
@@ -771,10 +770,7 @@ class Moderation(commands.Cog):
         footer_text = guild_data.get('footer_text', 'Synergy Bot')
         embed.set_footer(text=footer_text, icon_url=footer_icon)
         
-        try:
-            await log_channel.send(embed=embed)
-        except:
-            pass  # Silently fail if we can't log the action
+        await self.bot.log_dispatcher.send(log_channel, embed, HIGH)
 
 async def setup(bot):
     await bot.add_cog(Moderation(bot))
@@ -70,7 +70,7 @@ class ReactionRoleEmbedModal(discord.ui.Modal, title="Reaction Role Embed Builde
         }
         
         self.bot.data[str(interaction.guild.id)] = guild_data
-        self.bot.save_data()
+        self.bot.save_data(interaction.guild.id)
         
         await interaction.response.send_message(
             f"✅ Reaction role panel created!\n"
@@ -231,7 +231,7 @@ class ReactionRoles(commands.Cog):
                     pass
             
             self.bot.data[str(interaction.guild.id)] = guild_data
-            self.bot.save_data()
+            self.bot.save_data(interaction.guild.id)
             
             await interaction.response.send_message(
                 f"✅ Added reaction role: {emoji} → {role.mention}",
@@ -243,7 +243,7 @@ class ReactionRoles(commands.Cog):
                 del message_data['roles'][emoji]
                 
                 self.bot.data[str(interaction.guild.id)] = guild_data
-                self.bot.save_data()
+                self.bot.save_data(interaction.guild.id)
                 
                 await interaction.response.send_message(f"✅ Removed reaction role for {emoji}", ephemeral=True)
             else:
@@ -318,7 +318,7 @@ class TicketCreationModal(ui.Modal, title="Create a Ticket"):
             if not category:
                 category = await interaction.guild.create_category("Tickets")
                 guild_data['ticket_category'] = category.id
-                self.bot.save_data()
+                self.bot.save_data(interaction.guild.id)
         
         # Create ticket channel
         ticket_channel = await category.create_text_channel(
@@ -393,15 +393,11 @@ class EnhancedTickets(commands.Cog):
     
     def load_data(self):
         """Load ticket data from the database."""
-        if os.path.exists('tickets.json'):
-            with open('tickets.json', 'r') as f:
-                data = json.load(f)
-                self.tickets = {int(k): v for k, v in data.get('tickets', {}).items()}
+        self.tickets = {int(k): v for k, v in self.bot.store.load_tickets().items()}
     
     def save_data(self):
-        """Save ticket data to the database."""
-        with open('tickets.json', 'w') as f:
-            json.dump({'tickets': self.tickets}, f, indent=2)
+        """Save ticket data to the database (written on the next flush)."""
+        self.bot.store.save_tickets(self.tickets)
     
     @tasks.loop(hours=1)
     async def cleanup_old_tickets(self):
@@ -435,7 +431,7 @@ class EnhancedTickets(commands.Cog):
             if not ticket_category:
                 ticket_category = await interaction.guild.create_category("Tickets")
                 guild_data['ticket_category'] = ticket_category.id
-                self.bot.save_data()
+                self.bot.save_data(interaction.guild.id)
         
         # Get ticket counter
         guild_id = interaction.guild.id
@@ -564,7 +560,7 @@ class EnhancedTickets(commands.Cog):
                 }
             ]
             guild_data['ticket_categories'] = categories
-            self.bot.save_data()
+            self.bot.save_data(interaction.guild.id)
         
         # Create embed
         embed = discord.Embed(
@@ -723,14 +719,14 @@ class EnhancedTickets(commands.Cog):
         if remove:
             if user.id in blacklist:
                 blacklist.remove(user.id)
-                self.bot.save_data()
+                self.bot.save_data(interaction.guild.id)
                 await interaction.response.send_message(f"✅ {user.mention} has been removed from the ticket blacklist.", ephemeral=True)
             else:
                 await interaction.response.send_message(f"{user.mention} is not blacklisted.", ephemeral=True)
         else:
             if user.id not in blacklist:
                 blacklist.append(user.id)
-                self.bot.save_data()
+                self.bot.save_data(interaction.guild.id)
                 await interaction.response.send_message(f"✅ {user.mention} has been blacklisted from creating tickets.", ephemeral=True)
             else:
                 await interaction.response.send_message(f"{user.mention} is already blacklisted.", ephemeral=True)
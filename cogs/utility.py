@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 import random
 import asyncio
 from typing import Optional, Literal
+from utils.content_cache import CachedMessage
 
 class Utility(commands.Cog):
     def __init__(self, bot):
@@ -16,9 +17,7 @@ class Utility(commands.Cog):
         self.edit_snipe_message_content_after = {}
 
     async def get_embed(self, ctx, title: str, description: str, color: discord.Color) -> discord.Embed:
-        guild_data = self.bot.data.get(str(ctx.guild.id), {})
-        footer_icon = guild_data.get('footer_icon', '')
-        footer_text = guild_data.get('footer_text', 'Synergy Bot')
+        settings = self.bot.settings.get(ctx.guild.id)
         
         embed = discord.Embed(
             title=title,
@@ -26,7 +25,7 @@ class Utility(commands.Cog):
             color=color,
             timestamp=discord.utils.utcnow()
         )
-        embed.set_footer(text=footer_text, icon_url=footer_icon)
+        embed.set_footer(text=settings.footer_text, icon_url=settings.footer_icon)
         return embed
     
     @app_commands.command(name="help", description="Show all available commands")
@@ -385,15 +384,20 @@ class Utility(commands.Cog):
         
         await interaction.response.send_message(embed=embed)
     
+    def resolve_author(self, guild_id: int, author_id: int):
+        guild = self.bot.get_guild(guild_id)
+        return (guild.get_member(author_id) if guild else None) or self.bot.get_user(author_id)
+    
     @commands.Cog.listener()
-    async def on_message_delete(self, message):
-        # Ignore DMs and bot messages
-        if not message.guild or message.author.bot:
+    async def on_cached_message_delete(self, payload, message: CachedMessage):
+        # Dispatched by the bot for deleted user messages, cached by discord.py or not
+        author = self.resolve_author(payload.guild_id, message.author_id)
+        if author is None:
             return
         
         # Store the deleted message
-        channel_id = str(message.channel.id)
-        self.snipe_message_author[channel_id] = message.author
+        channel_id = str(payload.channel_id)
+        self.snipe_message_author[channel_id] = author
         self.snipe_message_content[channel_id] = message.content
         
         # Clear the sniped message after 5 minutes
@@ -403,16 +407,17 @@ class Utility(commands.Cog):
             del self.snipe_message_content[channel_id]
     
     @commands.Cog.listener()
-    async def on_message_edit(self, before, after):
-        # Ignore DMs, bot messages, and embeds (to avoid logging embed updates)
-        if not before.guild or before.author.bot or before.content == after.content:
+    async def on_cached_message_edit(self, payload, before: CachedMessage, content: str):
+        # Dispatched by the bot when a user message's text changes (embed updates are skipped)
+        author = self.resolve_author(payload.guild_id, before.author_id)
+        if author is None:
             return
         
         # Store the edited message
-        channel_id = str(before.channel.id)
-        self.edit_snipe_message_author[channel_id] = before.author
+        channel_id = str(payload.channel_id)
+        self.edit_snipe_message_author[channel_id] = author
         self.edit_snipe_message_content_before[channel_id] = before.content
-        self.edit_snipe_message_content_after[channel_id] = after.content
+        self.edit_snipe_message_content_after[channel_id] = content
         
         # Clear the sniped message after 5 minutes
         await asyncio.sleep(300)
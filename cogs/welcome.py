@@ -55,7 +55,7 @@ class WelcomeEmbedModal(discord.ui.Modal, title="Welcome Embed Builder"):
         guild_data[self.embed_type]['image_url'] = self.image_url.value or None
         
         self.bot.data[str(interaction.guild.id)] = guild_data
-        self.bot.save_data()
+        self.bot.save_data(interaction.guild.id)
         
         await interaction.response.send_message(
             f"✅ {self.embed_type.title()} embed configured!\n\n"
@@ -223,7 +223,7 @@ class WelcomeGoodbye(commands.Cog):
             guild_data['welcome']['autorole'] = autorole.id
         
         self.bot.data[str(interaction.guild.id)] = guild_data
-        self.bot.save_data()
+        self.bot.save_data(interaction.guild.id)
         
         # Show current configuration
         welcome_config = guild_data['welcome']
@@ -285,7 +285,7 @@ class WelcomeGoodbye(commands.Cog):
             guild_data['goodbye']['channel'] = channel.id
         
         self.bot.data[str(interaction.guild.id)] = guild_data
-        self.bot.save_data()
+        self.bot.save_data(interaction.guild.id)
         
         # Show current configuration
         goodbye_config = guild_data['goodbye']
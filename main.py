@@ -8,19 +8,55 @@ import pytz
 from dotenv import load_dotenv
 import logging
 from typing import Optional, Literal
+from utils.storage import DataStore, create_backend
+from utils.journal import Journal
+from utils.cooldowns import CooldownStore
+from utils.urls import DomainIndex
+from utils.settings import SettingsCache
+from utils.pipeline import MessagePipeline
+from utils.logdispatch import LogDispatcher
+from utils.webhooks import WebhookPool
+from utils.eventlog import EventLog
+from utils.content_cache import CachedMessage, ContentCache
+from utils.logsetup import setup_logging
 
 # Load environment variables
 load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
+SAVE_INTERVAL = float(os.getenv('SAVE_INTERVAL', '5'))  # seconds between data flushes
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json').lower()  # json, sharded or sqlite
+SQLITE_PATH = os.getenv('SQLITE_PATH', 'synergy.db')
+DATA_DIR = os.getenv('DATA_DIR', 'data')  # per-guild files for the sharded backend
+CACHE_IDLE_SECONDS = float(os.getenv('CACHE_IDLE_SECONDS', '600'))  # evict guilds idle this long
+CACHE_MAX_MB = float(os.getenv('CACHE_MAX_MB', '0'))  # resident guild data budget, 0 = no limit
+JOURNAL_PATH = os.getenv('JOURNAL_PATH', 'journal.log')  # empty to disable the change journal
+COMPACT_INTERVAL = float(os.getenv('COMPACT_INTERVAL', '300'))  # seconds between journal compactions
+DOMAIN_BLOCKLIST = os.getenv('DOMAIN_BLOCKLIST', '')  # comma-separated domain list files blocked in every server
+LOG_FLUSH_DELAY = float(os.getenv('LOG_FLUSH_DELAY', '2'))  # seconds log embeds wait to be batched
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '100'))  # embeds queued per log channel before events are skipped
+WEBHOOK_CONNECTIONS = int(os.getenv('WEBHOOK_CONNECTIONS', '20'))  # pooled HTTP connections for webhook log delivery
+EVENT_LOG_PATH = os.getenv('EVENT_LOG_PATH', 'events.db')  # searchable copy of logged events, empty to disable
+EVENT_RETENTION_DAYS = float(os.getenv('EVENT_RETENTION_DAYS', '30'))  # logged events older than this are pruned
+CONTENT_CACHE_MB = float(os.getenv('CONTENT_CACHE_MB', '32'))  # recent message content kept for delete/edit logs
+CONTENT_CACHE_PER_CHANNEL = int(os.getenv('CONTENT_CACHE_PER_CHANNEL', '500'))  # recent messages kept per channel
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
+LOG_FILE = os.getenv('LOG_FILE', 'bot.log')  # empty to log to the terminal only
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # per-module levels, e.g. discord=WARNING,utils.storage=DEBUG
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()  # text or json (one object per line)
+LOG_MAX_MB = float(os.getenv('LOG_MAX_MB', '10'))  # rotate the log file at this size
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', '5'))  # rotated log files to keep
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN', '')  # rotate on a schedule instead, e.g. midnight
+
+# Configure logging; records are written by a background thread
+log_listener = setup_logging(
+    path=LOG_FILE,
+    level=LOG_LEVEL,
+    levels=LOG_LEVELS,
+    json_format=LOG_FORMAT == 'json',
+    max_bytes=int(LOG_MAX_MB * 1024 * 1024),
+    backups=LOG_BACKUPS,
+    when=LOG_ROTATE_WHEN
 )
 logger = logging.getLogger(__name__)
 
@@ -50,11 +86,48 @@ class SynergyBot(commands.Bot):
             'cogs.reactionroles',
             'cogs.giveaways'
         ]
-        self.data = {}
+        if STORAGE_BACKEND == 'sqlite':
+            backend = create_backend('sqlite', path=SQLITE_PATH)
+        elif STORAGE_BACKEND == 'sharded':
+            backend = create_backend('sharded', directory=DATA_DIR, tickets_path='tickets.json')
+        else:
+            backend = create_backend('json', path='save_data.json', tickets_path='tickets.json')
+        self.store = DataStore(
+            backend,
+            flush_interval=SAVE_INTERVAL,
+            idle_ttl=CACHE_IDLE_SECONDS,
+            memory_budget=int(CACHE_MAX_MB * 1024 * 1024),
+            journal=Journal(JOURNAL_PATH) if JOURNAL_PATH else None,
+            compact_interval=COMPACT_INTERVAL
+        )
+        self.data = self.store.data
         self.load_data()
+        self.cooldowns = CooldownStore(self)
+        self.settings = SettingsCache(self)
+        self.pipeline = MessagePipeline()  # guild message stages registered by cogs
+        self.domain_blocklist = DomainIndex()
+        self.webhooks = WebhookPool(self, connections=WEBHOOK_CONNECTIONS)
+        self.log_dispatcher = LogDispatcher(
+            flush_delay=LOG_FLUSH_DELAY,
+            max_queue=LOG_QUEUE_SIZE,
+            webhooks=self.webhooks
+        )
+        self.events = EventLog(EVENT_LOG_PATH, retention_days=EVENT_RETENTION_DAYS) if EVENT_LOG_PATH else None
+        self.content_cache = ContentCache(
+            per_channel=CONTENT_CACHE_PER_CHANNEL,
+            max_bytes=int(CONTENT_CACHE_MB * 1024 * 1024)
+        )
 
     async def setup_hook(self):
         """Called when the bot is starting up - loads cogs and syncs commands"""
+        # Shared phishing/scam domain lists, parsed off the event loop
+        for path in filter(None, (p.strip() for p in DOMAIN_BLOCKLIST.split(','))):
+            try:
+                count = await self.loop.run_in_executor(None, self.domain_blocklist.load, path)
+                logger.info(f'[OK] Loaded {count} blocked domains from {path}')
+            except Exception as e:
+                logger.error(f'[ERROR] Failed to load domain list {path}: {e}')
+        
         # Load all cogs
         for ext in self.initial_extensions:
             try:
@@ -63,6 +136,13 @@ class SynergyBot(commands.Bot):
             except Exception as e:
                 logger.error(f'[ERROR] Failed to load extension {ext}: {e}')
         
+        # Fold any journal tail left by the last run into a fresh snapshot
+        await self.store.compact()
+        
+        # Start the write-behind flusher
+        self.flush_task.change_interval(seconds=self.store.flush_interval)
+        self.flush_task.start()
+        
         # Sync slash commands globally
         try:
             logger.info('[SYNC] Syncing slash commands globally...')
@@ -72,27 +152,114 @@ class SynergyBot(commands.Bot):
             logger.error(f'[ERROR] Failed to sync commands: {e}')
 
     def load_data(self):
+        self.data = self.store.load()
+        self.store.replay_journal()
+
+    def save_data(self, *keys):
+        """Mark data as changed. Pass the top-level keys (usually the guild id)
+        that were modified; the flusher writes them out on its next tick."""
+        self.store.mark_dirty(*keys)
+
+    def save_settings(self, *keys):
+        """``save_data`` for changes to what ``bot.settings`` reads (log channel,
+        footer, automod, leveling, raid mode); those guilds' cached settings are
+        rebuilt on next use"""
+        self.store.mark_dirty(*keys)
+        self.settings.invalidate(*keys)
+
+    def save_value(self, key, path, value):
+        """Persist one small change, ``data[key][path...] = value``, which the
+        caller has already applied. Cheap enough to call on every message."""
+        self.store.record(key, path, value)
+
+    def save_values(self, changes):
+        """``save_value`` for a list of (key, path, value) changes at once"""
+        self.store.record_many(changes)
+
+    def delete_value(self, key, path):
+        """Persist removal of ``data[key][path...]``, which the caller has already applied"""
+        self.store.record_delete(key, path)
+
+    @tasks.loop(seconds=5)
+    async def flush_task(self):
         try:
-            with open('save_data.json', 'r') as f:
-                self.data = json.load(f)
-            logger.info('Data loaded successfully')
-        except FileNotFoundError:
-            self.data = {}
-            logger.info('No save file found, starting with empty data')
-        except json.JSONDecodeError:
-            self.data = {}
-            logger.error('Error loading save file, starting with empty data')
-
-    def save_data(self):
-        with open('save_data.json', 'w') as f:
-            json.dump(self.data, f, indent=4)
-        logger.info('Data saved successfully')
+            self.cooldowns.prune()
+            await self.store.flush()
+            await self.store.maybe_compact()
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to save data: {e}')
+        if self.events is not None:
+            try:
+                await self.events.flush()
+                await self.events.maybe_prune()
+            except Exception as e:
+                logger.error(f'[ERROR] Failed to write event log: {e}')
+
+    async def close(self):
+        """Flush pending data before shutting down"""
+        if self.is_closed():
+            return
+        self.flush_task.cancel()
+        # Post queued log embeds while the connection is still open
+        await self.log_dispatcher.close()
+        await self.webhooks.close()
+        # Cogs are unloaded here and may still save what they were holding
+        await super().close()
+        try:
+            await self.store.flush()
+            await self.store.compact()
+            logger.info('Data saved on shutdown')
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to save data on shutdown: {e}')
+        self.store.close()
+        if self.events is not None:
+            try:
+                await self.events.close()
+            except Exception as e:
+                logger.error(f'[ERROR] Failed to write event log on shutdown: {e}')
 
     async def on_ready(self):
         logger.info(f'Logged in as {self.user} (ID: {self.user.id})')
         logger.info('------')
         self.status_task.start()
 
+    async def on_message(self, message):
+        """Run guild messages through the cogs' message stages, then prefix commands"""
+        if message.guild and not message.author.bot:
+            self.content_cache.add(message)
+            if self.pipeline:
+                ctx = await self.pipeline.run(message, self.settings.get(message.guild.id))
+                if ctx.verdict is not None:
+                    return  # removed by auto-moderation
+        await self.process_commands(message)
+
+    async def on_raw_message_delete(self, payload):
+        """Dispatch ``cached_message_delete(payload, record)`` for deleted user
+        messages whose content is known, cached by discord.py or not"""
+        if payload.guild_id is None:
+            return
+        record = self.content_cache.pop(payload.message_id)
+        if record is None and payload.cached_message is not None and not payload.cached_message.author.bot:
+            record = CachedMessage.from_message(payload.cached_message)
+        if record is not None:
+            self.dispatch('cached_message_delete', payload, record)
+
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            self.content_cache.pop(message_id)
+
+    async def on_raw_message_edit(self, payload):
+        """Dispatch ``cached_message_edit(payload, before, content)`` when a
+        user message whose previous content is known has its text changed"""
+        content = payload.data.get('content')
+        if payload.guild_id is None or content is None or payload.data.get('author', {}).get('bot'):
+            return  # embed unfurls arrive as edits without content
+        before = self.content_cache.edit(payload.message_id, content)
+        if before is None and payload.cached_message is not None and not payload.cached_message.author.bot:
+            before = CachedMessage.from_message(payload.cached_message)
+        if before is not None and before.content != content:
+            self.dispatch('cached_message_edit', payload, before, content)
+
     @tasks.loop(minutes=5)
     async def status_task(self):
         await self.change_presence(
@@ -117,13 +284,13 @@ class SynergyBot(commands.Bot):
                 'economy': {},
                 'tickets': {}
             }
-            self.save_data()
+            self.save_settings(guild.id)
         logger.info(f'Joined new guild: {guild.name} (ID: {guild.id})')
 
     async def on_guild_remove(self, guild):
         if str(guild.id) in self.data:
             del self.data[str(guild.id)]
-            self.save_data()
+            self.save_settings(guild.id)
         logger.info(f'Left guild: {guild.name} (ID: {guild.id})')
 
     async def on_command_error(self, ctx, error):
@@ -149,7 +316,11 @@ class SynergyBot(commands.Bot):
 
 def main():
     bot = SynergyBot()
-    bot.run(TOKEN)
+    try:
+        # log_handler=None keeps discord.py on the queued handlers set up above
+        bot.run(TOKEN, log_handler=None)
+    finally:
+        log_listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
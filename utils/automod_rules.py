@@ -0,0 +1,212 @@
+import logging
+import operator
+import re
+from functools import cached_property
+from typing import Optional
+
+from utils.textnorm import fold
+from utils.urls import extract_links
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    '==': operator.eq,
+    '!=': operator.ne,
+    'is': lambda value, expected: bool(value) == bool(expected),
+}
+
+# Actions a custom rule can take, in the order they are applied
+ACTIONS = ('delete', 'warn', 'mute', 'kick', 'ban')
+
+_CONDITION = re.compile(r'^(\w+)\s*(>=|<=|==|!=|>|<)\s*(-?\d+(?:\.\d+)?)$')
+
+
+class MessageFeatures:
+    """What rules can test about a message.
+
+    Each feature is computed the first time a rule reads it and then reused,
+    so the message is scanned once per feature however many rules there are.
+    """
+
+    NAMES = ('length', 'caps_percent', 'mentions', 'links', 'external_links', 'blocked_links', 'masked_links',
+             'banned_word', 'attachments', 'lines')
+
+    def __init__(self, message, matcher=None, domains=None, context=None):
+        self.message = message
+        self.content = message.content
+        self.matcher = matcher
+        self.domains = domains  # DomainIndex of allowed/blocked domains
+        self.context = context  # the pipeline's MessageContext, which shares the normalized text
+
+    @cached_property
+    def normalized(self) -> str:
+        """Lowercased content with look-alike and invisible characters folded (see utils.textnorm)"""
+        if self.context is not None:
+            return self.context.normalized
+        return fold(self.content)
+
+    @cached_property
+    def length(self) -> int:
+        return len(self.content)
+
+    @cached_property
+    def caps_percent(self) -> float:
+        if not self.content:
+            return 0.0
+        return sum(map(str.isupper, self.content)) * 100 / len(self.content)
+
+    @cached_property
+    def mentions(self) -> int:
+        return len(self.message.mentions) + len(self.message.role_mentions)
+
+    @cached_property
+    def link_list(self) -> list:
+        """Links found in the message (see utils.urls.extract_links)"""
+        return extract_links(self.content)
+
+    @cached_property
+    def verdicts(self) -> list:
+        """The domain index's verdict for each link: True allowed, False blocked, None unlisted"""
+        if self.domains is None:
+            return [None] * len(self.link_list)
+        return [self.domains.lookup(link.host) for link in self.link_list]
+
+    @cached_property
+    def links(self) -> int:
+        return len(self.link_list)
+
+    @cached_property
+    def external_links(self) -> int:
+        """Links to domains that aren't on the allowlist"""
+        return sum(1 for verdict in self.verdicts if verdict is not True)
+
+    @cached_property
+    def blocked_links(self) -> int:
+        return self.verdicts.count(False)
+
+    @cached_property
+    def blocked_host(self) -> Optional[str]:
+        for link, verdict in zip(self.link_list, self.verdicts):
+            if verdict is False:
+                return link.host
+        return None
+
+    @cached_property
+    def masked_links(self) -> int:
+        return sum(1 for link in self.link_list if link.masked)
+
+    @cached_property
+    def banned_word(self) -> Optional[str]:
+        return self.matcher.find(self.normalized) if self.matcher is not None else None
+
+    @cached_property
+    def attachments(self) -> int:
+        return len(self.message.attachments)
+
+    @cached_property
+    def lines(self) -> int:
+        return self.content.count('\n') + 1
+
+
+def parse_conditions(text: str) -> list:
+    """Parse ``"caps_percent >= 80, length > 10"`` into ``[[feature, op, value], ...]``.
+
+    A bare feature name (``banned_word``) means "is present"; prefix it with
+    ``!`` for "is absent". Raises ValueError on anything it doesn't understand.
+    """
+    conditions = []
+    for part in re.split(r',|\band\b', text):
+        part = part.strip()
+        if not part:
+            continue
+        match = _CONDITION.match(part)
+        if match:
+            feature, op, value = match.groups()
+            value = float(value) if '.' in value else int(value)
+        elif re.fullmatch(r'!?\w+', part):
+            feature, op, value = part.lstrip('!'), 'is', not part.startswith('!')
+        else:
+            raise ValueError(f"Can't read condition `{part}`")
+        if feature not in MessageFeatures.NAMES:
+            raise ValueError(f"Unknown feature `{feature}` (use {', '.join(MessageFeatures.NAMES)})")
+        if feature == 'banned_word' and op != 'is':
+            raise ValueError("`banned_word` can only be tested for presence")
+        conditions.append([feature, op, value])
+    if not conditions:
+        raise ValueError("A rule needs at least one condition")
+    return conditions
+
+
+class CompiledRule:
+    __slots__ = ('name', 'checks', 'actions', 'message', 'handler', 'exempt_roles', 'exempt_channels')
+
+    def __init__(self, rule: dict):
+        self.name = rule.get('name', 'Rule')
+        self.checks = []
+        for feature, op, value in rule['conditions']:
+            if feature not in MessageFeatures.NAMES:
+                raise ValueError(f"Unknown feature `{feature}`")
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator `{op}`")
+            if feature == 'banned_word' and op != 'is':
+                raise ValueError("`banned_word` can only be tested for presence")
+            self.checks.append((feature, OPERATORS[op], value))
+        self.actions = [action for action in ACTIONS if action in rule.get('actions', [])]
+        self.message = rule.get('message')
+        # Built-in rules are handled by a named cog method instead of actions
+        self.handler = rule.get('handler')
+        self.exempt_roles = frozenset(rule.get('exempt_roles', []))
+        self.exempt_channels = frozenset(rule.get('exempt_channels', []))
+
+
+class RuleSet:
+    """A guild's rules compiled once and evaluated in order; the first match wins.
+
+    A rule skips members holding one of its ``exempt_roles`` and messages in
+    its ``exempt_channels``:
+
+    >>> from types import SimpleNamespace as Obj
+    >>> rules = RuleSet([{'name': 'Long', 'conditions': [['length', '>', 5]],
+    ...                   'exempt_roles': [10], 'exempt_channels': [20]}])
+    >>> def message(role_id, channel_id):
+    ...     msg = Obj(content='a long message', channel=Obj(id=channel_id), author=Obj(roles=[Obj(id=role_id)]))
+    ...     return rules.evaluate(msg, MessageFeatures(msg))
+    >>> message(1, 2).name
+    'Long'
+    >>> message(10, 2) is None, message(1, 20) is None
+    (True, True)
+    """
+
+    def __init__(self, rules: list):
+        self.rules = []
+        for rule in rules:
+            if not rule.get('enabled', True):
+                continue
+            try:
+                self.rules.append(CompiledRule(rule))
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping invalid automod rule {rule.get('name')!r}: {e}")
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate(self, message, features: MessageFeatures) -> Optional[CompiledRule]:
+        role_ids = None
+        for rule in self.rules:
+            if rule.exempt_channels and message.channel.id in rule.exempt_channels:
+                continue
+            if rule.exempt_roles:
+                if role_ids is None:
+                    role_ids = {role.id for role in message.author.roles}
+                if not rule.exempt_roles.isdisjoint(role_ids):
+                    continue
+            for feature, op, value in rule.checks:
+                if not op(getattr(features, feature), value):
+                    break
+            else:
+                return rule
+        return None
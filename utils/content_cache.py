@@ -0,0 +1,102 @@
+import sys
+from collections import OrderedDict, deque
+from typing import Optional
+
+# Measured per-entry cost on top of the strings: the record, its ids, its dict slot and its deque slot
+ENTRY_OVERHEAD = 270
+
+
+class CachedMessage:
+    """What logging and snipe need from a message, without the rest of the Message object"""
+
+    __slots__ = ('id', 'channel_id', 'author_id', 'content', 'attachments', 'size')
+
+    def __init__(self, id: int, channel_id: int, author_id: int, content: str, attachments: tuple = ()):
+        self.id = id
+        self.channel_id = channel_id
+        self.author_id = author_id
+        self.content = content
+        self.attachments = attachments  # attachment URLs
+        self.size = ENTRY_OVERHEAD + sys.getsizeof(content) + sum(sys.getsizeof(url) for url in attachments)
+
+    @classmethod
+    def from_message(cls, message) -> 'CachedMessage':
+        return cls(
+            message.id, message.channel.id, message.author.id, message.content,
+            tuple(attachment.url for attachment in message.attachments)
+        )
+
+
+class ContentCache:
+    """Recent message content per channel, for logging deletes and edits of
+    messages discord.py no longer has cached.
+
+    Each channel keeps its last ``per_channel`` messages in a ring buffer and
+    all channels share a ``max_bytes`` budget; when it is exceeded the oldest
+    messages anywhere are dropped first. Entries are compact ``__slots__``
+    records, a few hundred bytes each instead of a full ``Message``.
+    """
+
+    def __init__(self, per_channel: int = 500, max_bytes: int = 32 * 1024 * 1024):
+        self.per_channel = per_channel
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._messages = OrderedDict()  # message_id: CachedMessage, oldest first
+        self._channels = {}  # channel_id: deque of message ids, oldest first
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __contains__(self, message_id: int) -> bool:
+        return message_id in self._messages
+
+    def add(self, message) -> None:
+        record = CachedMessage.from_message(message)
+        ids = self._channels.get(record.channel_id)
+        if ids is None:
+            ids = self._channels[record.channel_id] = deque()
+        elif len(ids) >= self.per_channel:
+            self._discard(ids.popleft())
+        ids.append(record.id)
+        self._messages[record.id] = record
+        self.size += record.size
+        while self.size > self.max_bytes and self._messages:
+            _, oldest = self._messages.popitem(last=False)
+            self.size -= oldest.size
+            channel_ids = self._channels.get(oldest.channel_id)
+            if channel_ids and channel_ids[0] == oldest.id:
+                channel_ids.popleft()
+            elif channel_ids:
+                channel_ids.remove(oldest.id)
+            if not channel_ids:
+                self._channels.pop(oldest.channel_id, None)
+
+    def _discard(self, message_id: int) -> Optional[CachedMessage]:
+        record = self._messages.pop(message_id, None)
+        if record is not None:
+            self.size -= record.size
+        return record
+
+    def get(self, message_id: int) -> Optional[CachedMessage]:
+        return self._messages.get(message_id)
+
+    def pop(self, message_id: int) -> Optional[CachedMessage]:
+        """Forget a deleted message and return what was cached for it"""
+        record = self._discard(message_id)
+        if record is not None:
+            ids = self._channels.get(record.channel_id)
+            if ids is not None:
+                ids.remove(message_id)
+                if not ids:
+                    del self._channels[record.channel_id]
+        return record
+
+    def edit(self, message_id: int, content: str) -> Optional[CachedMessage]:
+        """Store a message's new content. Returns the record from before the edit."""
+        before = self._messages.get(message_id)
+        if before is None:
+            return None
+        after = CachedMessage(before.id, before.channel_id, before.author_id, content, before.attachments)
+        self._messages[message_id] = after  # keeps its place in the eviction order
+        self.size += after.size - before.size
+        return before
@@ -0,0 +1,126 @@
+import heapq
+import time
+
+
+class CooldownStore:
+    """Cooldowns keyed by (guild, user, action).
+
+    Checks are a dict lookup. Expiry times also go on a heap so ``prune`` can
+    drop finished cooldowns without scanning, which keeps memory proportional
+    to users with a running cooldown. Cooldowns started with ``persist=True``
+    are also saved under ``guild_data['cooldowns'][user_id][action]`` (as a
+    unix timestamp) and read back the first time a guild is used.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._expires = {}  # (guild_id, user_id, action): unix expiry time
+        self._persisted = set()  # keys that are also saved in guild data
+        self._heap = []  # (expiry, key); entries replaced since are skipped
+        self._loaded = set()  # guilds whose saved cooldowns have been read
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def _push(self, key: tuple, expiry: float) -> None:
+        self._expires[key] = expiry
+        heapq.heappush(self._heap, (expiry, key))
+        # Resets and restarts leave replaced entries behind; rebuild if they pile up
+        if len(self._heap) > 2 * len(self._expires) + 1024:
+            self._heap = [(expiry, key) for key, expiry in self._expires.items()]
+            heapq.heapify(self._heap)
+
+    def _load_guild(self, guild_id: str) -> None:
+        self._loaded.add(guild_id)
+        guild_data = self.bot.data.get(guild_id)
+        saved = guild_data.get('cooldowns') if guild_data else None
+        if not saved:
+            return
+
+        now = time.time()
+        for user_id, actions in list(saved.items()):
+            expired = [action for action, expiry in actions.items() if expiry <= now]
+            if len(expired) == len(actions):
+                del saved[user_id]
+                self.bot.delete_value(guild_id, ['cooldowns', user_id])
+                continue
+            for action in expired:
+                del actions[action]
+                self.bot.delete_value(guild_id, ['cooldowns', user_id, action])
+            for action, expiry in actions.items():
+                key = (guild_id, user_id, action)
+                self._persisted.add(key)
+                self._push(key, expiry)
+
+    def _key(self, guild_id, user_id, action: str) -> tuple:
+        guild_id = str(guild_id)
+        if guild_id not in self._loaded:
+            self._load_guild(guild_id)
+        return guild_id, str(user_id), action
+
+    def retry_after(self, guild_id, user_id, action: str) -> float:
+        """Seconds left on the cooldown, or 0 if it isn't running"""
+        expiry = self._expires.get(self._key(guild_id, user_id, action))
+        if expiry is None:
+            return 0
+        return max(0, expiry - time.time())
+
+    def trigger(self, guild_id, user_id, action: str, seconds: float, persist: bool = False) -> None:
+        """Start (or restart) a cooldown"""
+        key = self._key(guild_id, user_id, action)
+        expiry = time.time() + seconds
+        self._push(key, expiry)
+        if persist:
+            guild_id, user_id, _ = key
+            self._persisted.add(key)
+            guild_data = self.bot.data.get(guild_id)
+            if guild_data is None:
+                guild_data = self.bot.data[guild_id] = {}
+            guild_data.setdefault('cooldowns', {}).setdefault(user_id, {})[action] = expiry
+            self.bot.save_value(guild_id, ['cooldowns', user_id, action], expiry)
+
+    def hit(self, guild_id, user_id, action: str, seconds: float, persist: bool = False) -> float:
+        """Start the cooldown unless it is already running.
+
+        Returns the seconds left if it was running (the action should be
+        refused), otherwise 0.
+        """
+        retry_after = self.retry_after(guild_id, user_id, action)
+        if retry_after:
+            return retry_after
+        self.trigger(guild_id, user_id, action, seconds, persist)
+        return 0
+
+    def prune(self) -> int:
+        """Forget cooldowns that have finished. Returns how many were removed."""
+        now = time.time()
+        heap = self._heap
+        is_resident = getattr(self.bot.data, 'is_resident', None)
+        removed = 0
+        while heap and heap[0][0] <= now:
+            expiry, key = heapq.heappop(heap)
+            if self._expires.get(key) != expiry:
+                continue
+            del self._expires[key]
+            removed += 1
+            if key not in self._persisted:
+                continue
+
+            self._persisted.discard(key)
+            guild_id, user_id, action = key
+            if is_resident is not None and not is_resident(guild_id):
+                # Don't load an evicted guild just for this; its saved
+                # cooldowns are cleaned up the next time it is read
+                self._loaded.discard(guild_id)
+                continue
+            saved = self.bot.data.get(guild_id, {}).get('cooldowns', {})
+            actions = saved.get(user_id)
+            if not actions or actions.get(action) != expiry:
+                continue
+            if len(actions) == 1:
+                del saved[user_id]
+                self.bot.delete_value(guild_id, ['cooldowns', user_id])
+            else:
+                del actions[action]
+                self.bot.delete_value(guild_id, ['cooldowns', user_id, action])
+        return removed
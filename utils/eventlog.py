@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    guild_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    user_id INTEGER,
+    channel_id INTEGER,
+    content TEXT NOT NULL DEFAULT '',
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS events_guild_ts ON events (guild_id, ts);
+CREATE INDEX IF NOT EXISTS events_guild_user ON events (guild_id, user_id, ts);
+CREATE INDEX IF NOT EXISTS events_guild_channel ON events (guild_id, channel_id, ts);
+CREATE INDEX IF NOT EXISTS events_guild_type ON events (guild_id, type, ts);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+"""
+
+MAX_PENDING = 50000  # events buffered between flushes before the oldest are dropped
+PRUNE_BATCH = 5000  # rows deleted per statement, so pruning never holds the writer for long
+
+
+class Event:
+    __slots__ = ('id', 'ts', 'guild_id', 'type', 'user_id', 'channel_id', 'content', 'detail')
+
+    def __init__(self, id, ts, guild_id, type, user_id, channel_id, content, detail):
+        self.id = id
+        self.ts = ts
+        self.guild_id = guild_id
+        self.type = type
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.content = content
+        self.detail = json.loads(detail) if detail else None
+
+
+class EventLog:
+    """Append-only store of logged events, for searching the audit trail.
+
+    ``record`` only buffers the event; ``flush`` (called by the bot's flush
+    loop) writes the buffer in one transaction on a dedicated thread, which
+    owns the connection, so the event loop never waits on disk. Events are
+    indexed by guild together with user, channel, type and time, so
+    ``search`` is an index range scan whatever the filters are.
+
+    Events older than ``retention_days`` are deleted by ``maybe_prune`` in
+    small batches and the freed pages are handed back to the file system
+    (``auto_vacuum=INCREMENTAL``), which keeps the file bounded.
+    """
+
+    def __init__(self, path: str = 'events.db', retention_days: float = 30, prune_interval: float = 3600):
+        self.path = path
+        self.retention = retention_days * 86400
+        self.prune_interval = prune_interval
+        self._conn = None
+        self._pending = []
+        self._dropped = 0
+        self._last_prune = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='eventlog')
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Only touched from the executor thread
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            # Has to be set before the first table is created to take effect
+            self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def record(self, guild_id: int, event_type: str, user_id: Optional[int] = None, channel_id: Optional[int] = None,
+               content: str = '', detail: Optional[dict] = None) -> None:
+        """Buffer an event for the next flush"""
+        if len(self._pending) >= MAX_PENDING:
+            del self._pending[:len(self._pending) // 10]
+            self._dropped += MAX_PENDING // 10
+        self._pending.append((
+            time.time(), guild_id, event_type, user_id, channel_id, content or '',
+            json.dumps(detail, separators=(',', ':')) if detail else None
+        ))
+
+    def _insert(self, rows: list) -> None:
+        with self.conn as conn:
+            conn.executemany(
+                'INSERT INTO events (ts, guild_id, type, user_id, channel_id, content, detail) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+
+    async def flush(self) -> int:
+        if not self._pending:
+            return 0
+        rows, self._pending = self._pending, []
+        if self._dropped:
+            logger.warning(f'Event log fell behind; {self._dropped} events were dropped')
+            self._dropped = 0
+        try:
+            await self._run(self._insert, rows)
+        except Exception:
+            self._pending[:0] = rows  # try again on the next flush
+            raise
+        return len(rows)
+
+    def _prune(self, cutoff: float) -> int:
+        deleted = 0
+        conn = self.conn
+        while True:
+            with conn:
+                cur = conn.execute(
+                    'DELETE FROM events WHERE id IN (SELECT id FROM events WHERE ts < ? ORDER BY ts LIMIT ?)',
+                    (cutoff, PRUNE_BATCH)
+                )
+            deleted += cur.rowcount
+            if cur.rowcount < PRUNE_BATCH:
+                break
+        if deleted:
+            # executescript steps the pragma to completion; execute would free one page
+            conn.executescript('PRAGMA incremental_vacuum;')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        return deleted
+
+    async def prune(self) -> int:
+        """Delete events past the retention period. Returns how many were deleted."""
+        self._last_prune = time.monotonic()
+        deleted = await self._run(self._prune, time.time() - self.retention)
+        if deleted:
+            logger.info(f'Pruned {deleted} events older than {self.retention / 86400:g} days')
+        return deleted
+
+    async def maybe_prune(self) -> int:
+        if time.monotonic() - self._last_prune < self.prune_interval:
+            return 0
+        return await self.prune()
+
+    def _search(self, guild_id: int, filters: dict, limit: int, offset: int) -> list:
+        clauses, params = ['guild_id = ?'], [guild_id]
+        for column in ('user_id', 'channel_id', 'type'):
+            if filters.get(column) is not None:
+                clauses.append(f'{column} = ?')
+                params.append(filters[column])
+        if filters.get('since') is not None:
+            clauses.append('ts >= ?')
+            params.append(filters['since'])
+        if filters.get('text'):
+            clauses.append("content LIKE ? ESCAPE '\\'")
+            escaped = filters['text'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        rows = self.conn.execute(
+            f'SELECT id, ts, guild_id, type, user_id, channel_id, content, detail FROM events '
+            f'WHERE {" AND ".join(clauses)} ORDER BY ts DESC LIMIT ? OFFSET ?',
+            (*params, limit, offset)
+        ).fetchall()
+        return [Event(*row) for row in rows]
+
+    async def search(self, guild_id: int, user_id: Optional[int] = None, channel_id: Optional[int] = None,
+                     event_type: Optional[str] = None, since: Optional[float] = None, text: Optional[str] = None,
+                     limit: int = 10, offset: int = 0) -> list:
+        """Newest matching events first. Unflushed events are written first so they show up."""
+        await self.flush()
+        filters = {'user_id': user_id, 'channel_id': channel_id, 'type': event_type, 'since': since, 'text': text}
+        return await self._run(self._search, guild_id, filters, limit, offset)
+
+    async def close(self) -> None:
+        await self.flush()
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
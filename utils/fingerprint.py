@@ -0,0 +1,131 @@
+import time
+from collections import deque
+from operator import eq
+from typing import Optional
+
+SHINGLE_SIZE = 5  # characters per shingle
+NUM_HASHES = 16  # MinHash signature length (a power of two)
+BANDS = 8  # LSH bands of NUM_HASHES // BANDS rows each
+MIN_CHARS = 12  # shorter messages ("lol", "gg") are too common to fingerprint
+MAX_CHARS = 256  # only the start of long messages is fingerprinted
+
+_BIN_BITS = NUM_HASHES.bit_length() - 1
+_BIN_MASK = NUM_HASHES - 1
+_EMPTY = -1  # a bin no shingle hashed into
+_ROWS = NUM_HASHES // BANDS
+
+
+def normalize(text: str) -> str:
+    """Lowercase and keep only letters and digits, so spacing and punctuation tweaks don't matter"""
+    return ''.join(char for char in text.lower() if char.isalnum())
+
+
+def fingerprint(text: str) -> Optional[tuple]:
+    """MinHash signature of the message's character shingles, or None if it is too short.
+
+    Uses one-permutation hashing: each shingle is hashed once, the low bits
+    pick one of NUM_HASHES bins and each bin keeps its smallest value.
+    """
+    text = normalize(text)[:MAX_CHARS]
+    if len(text) < MIN_CHARS:
+        return None
+    signature = [_EMPTY] * NUM_HASHES
+    for i in range(len(text) - SHINGLE_SIZE + 1):
+        h = hash(text[i:i + SHINGLE_SIZE]) & 0xFFFFFFFFFFFF
+        value = h >> _BIN_BITS
+        current = signature[h & _BIN_MASK]
+        if current == _EMPTY or value < current:
+            signature[h & _BIN_MASK] = value
+    return tuple(signature)
+
+
+def empty_bins(signature: tuple) -> int:
+    """Bitmask of the signature's empty bins"""
+    mask = 0
+    for i, value in enumerate(signature):
+        if value == _EMPTY:
+            mask |= 1 << i
+    return mask
+
+
+class _Entry:
+    __slots__ = ('time', 'signature', 'empty', 'author_id', 'ref', 'bands', 'flagged')
+
+    def __init__(self, signature: tuple, empty: int, author_id: int, ref, bands: list):
+        self.time = time.monotonic()
+        self.signature = signature
+        self.empty = empty
+        self.author_id = author_id
+        self.ref = ref
+        self.bands = bands
+        self.flagged = False
+
+
+class FingerprintWindow:
+    """Recent message fingerprints for one guild.
+
+    Signatures are bucketed by LSH band, so finding near-identical messages
+    only compares against a few small buckets instead of the whole window.
+    Entries expire after ``interval`` seconds, the window holds at most
+    ``max_entries`` and each bucket at most ``bucket_size``, which keeps
+    both memory and per-message work bounded.
+    """
+
+    def __init__(self, interval: float = 30.0, similarity: float = 0.7,
+                 max_entries: int = 1000, bucket_size: int = 32):
+        self.interval = interval
+        self.max_entries = max_entries
+        self.bucket_size = bucket_size
+        self.similarity = similarity
+        self._entries = deque()
+        self._buckets = {}  # band key: deque of entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def expire(self) -> None:
+        cutoff = time.monotonic() - self.interval
+        entries = self._entries
+        while entries and (entries[0].time < cutoff or len(entries) >= self.max_entries):
+            entry = entries.popleft()
+            for key in entry.bands:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                try:
+                    bucket.remove(entry)
+                except ValueError:
+                    pass  # already pushed out of a full bucket
+                if not bucket:
+                    del self._buckets[key]
+
+    def add(self, signature: tuple, author_id: int, ref) -> list:
+        """Store a message and return the recent entries that are near-identical to it"""
+        self.expire()
+        bands = [(band, signature[band * _ROWS:(band + 1) * _ROWS]) for band in range(BANDS)]
+        # Empty bins would lump unrelated short messages together
+        bands = [key for key in bands if _EMPTY not in key[1]]
+
+        empty = empty_bins(signature)
+        matches = []
+        seen = set()
+        for key in bands:
+            for other in self._buckets.get(key, ()):
+                if id(other) in seen:
+                    continue
+                seen.add(id(other))
+                # Estimated Jaccard similarity, ignoring bins empty in both
+                both_empty = bin(empty & other.empty).count('1')
+                same = sum(map(eq, signature, other.signature)) - both_empty
+                if same >= self.similarity * (NUM_HASHES - both_empty):
+                    matches.append(other)
+
+        entry = _Entry(signature, empty, author_id, ref, bands)
+        self._entries.append(entry)
+        for key in bands:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = deque(maxlen=self.bucket_size)
+            bucket.append(entry)
+        matches.append(entry)
+        return matches
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+from collections import Counter, deque
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Event priorities; lower numbers are kept longer when a log channel falls behind
+HIGH = 0  # moderation and raid actions, never dropped
+NORMAL = 1  # message deletions, role and channel changes, automod actions
+LOW = 2  # message edits, joins and leaves, nicknames, voice moves
+
+EMBEDS_PER_MESSAGE = 10  # Discord's limit per message
+EMBED_CHARS_PER_MESSAGE = 6000  # Discord's limit on the combined size of a message's embeds
+
+
+class _ChannelQueue:
+    __slots__ = ('channel', 'entries', 'dropped', 'full', 'task')
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.entries = deque()  # (priority, embed), oldest first
+        self.dropped = Counter()  # embed title: events skipped while saturated
+        self.full = asyncio.Event()  # a whole message is waiting, skip the delay
+        self.task = None
+
+
+class LogDispatcher:
+    """Queues log embeds per channel and sends them in batches.
+
+    Instead of one ``channel.send`` per event, cogs call ``send(channel,
+    embed, priority)`` and the channel's worker posts up to 10 embeds per
+    message, ``flush_delay`` seconds after the first one arrives (or at once
+    when a full message is waiting). One message is in flight per channel,
+    so a raid or mass purge can't pile up requests behind a rate limit.
+    Batches go through ``webhooks`` when the guild has opted in.
+
+    When a channel's queue holds ``max_queue`` entries it is saturated:
+    LOW events are skipped once it is half full, NORMAL events once it is
+    full (making room by skipping a queued lower-priority event first if
+    one is waiting). HIGH events are always queued, going over the limit if
+    everything queued is HIGH too, so ``send`` never waits: moderation
+    commands log before answering their interaction, which Discord only
+    allows 3 seconds for. Skipped events are counted by title and reported
+    in one summary embed when the queue drains.
+    """
+
+    def __init__(self, flush_delay: float = 2.0, max_queue: int = 100, webhooks=None):
+        self.flush_delay = flush_delay
+        self.webhooks = webhooks  # optional WebhookPool (utils.webhooks) for guilds that opted in
+        self.max_queue = max(int(max_queue), EMBEDS_PER_MESSAGE)
+        self._queues = {}  # channel_id: _ChannelQueue
+        self._closing = False
+
+    def __len__(self) -> int:
+        """Embeds waiting to be sent, across all channels"""
+        return sum(len(queue.entries) for queue in self._queues.values())
+
+    async def send(self, channel, embed: discord.Embed, priority: int = NORMAL) -> bool:
+        """Queue ``embed`` for ``channel`` without waiting. Returns False if it was skipped because the channel is saturated."""
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = _ChannelQueue(channel)
+        queue.channel = channel
+
+        if not self._admit(queue, priority):
+            queue.dropped[embed.title or 'Untitled'] += 1
+            return False
+        queue.entries.append((priority, embed))
+        self._wake(queue)
+        return True
+
+    def _admit(self, queue: _ChannelQueue, priority: int) -> bool:
+        size = len(queue.entries)
+        if priority == LOW:
+            return size < self.max_queue // 2
+        if size < self.max_queue:
+            return True
+        # Saturated: make room by skipping the newest entry of a lower priority
+        for i in range(size - 1, -1, -1):
+            queued_priority, queued_embed = queue.entries[i]
+            if queued_priority > priority:
+                del queue.entries[i]
+                queue.dropped[queued_embed.title or 'Untitled'] += 1
+                return True
+        return priority == HIGH
+
+    def _wake(self, queue: _ChannelQueue) -> None:
+        if len(queue.entries) >= EMBEDS_PER_MESSAGE:
+            queue.full.set()
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.ensure_future(self._worker(queue))
+
+    def _summary(self, queue: _ChannelQueue) -> discord.Embed:
+        total = sum(queue.dropped.values())
+        lines = [f"{count} × {title}" for title, count in queue.dropped.most_common(10)]
+        if len(queue.dropped) > 10:
+            lines.append(f"…and {len(queue.dropped) - 10} other kinds")
+        queue.dropped.clear()
+        return discord.Embed(
+            title=f"⚠️ {total} log event{'s' if total != 1 else ''} skipped",
+            description="This channel was receiving events faster than they could be posted.\n\n" + "\n".join(lines),
+            color=discord.Color.orange(),
+            timestamp=discord.utils.utcnow()
+        )
+
+    def _next_batch(self, queue: _ChannelQueue) -> list:
+        batch, size = [], 0
+        entries = queue.entries
+        while entries and len(batch) < EMBEDS_PER_MESSAGE:
+            embed = entries[0][1]
+            length = len(embed)
+            if batch and size + length > EMBED_CHARS_PER_MESSAGE:
+                break
+            entries.popleft()
+            batch.append(embed)
+            size += length
+        if queue.dropped and len(batch) < EMBEDS_PER_MESSAGE and len(entries) < self.max_queue // 2:
+            summary = self._summary(queue)
+            if size + len(summary) <= EMBED_CHARS_PER_MESSAGE:
+                batch.append(summary)
+        return batch
+
+    async def _deliver(self, channel, batch: list) -> None:
+        if self.webhooks is not None and await self.webhooks.send(channel, batch):
+            return
+        await channel.send(embeds=batch)
+
+    async def _worker(self, queue: _ChannelQueue) -> None:
+        while queue.entries or queue.dropped:
+            if len(queue.entries) < EMBEDS_PER_MESSAGE and not self._closing:
+                try:
+                    await asyncio.wait_for(queue.full.wait(), self.flush_delay)
+                except asyncio.TimeoutError:
+                    pass
+            queue.full.clear()
+            batch = self._next_batch(queue)
+            if not batch:
+                break
+            try:
+                await self._deliver(queue.channel, batch)
+            except (discord.Forbidden, discord.NotFound):
+                # The log channel is gone or closed to us; don't retry the rest
+                queue.entries.clear()
+                queue.dropped.clear()
+            except Exception as e:
+                logger.warning(f'Failed to send {len(batch)} log embeds to channel {queue.channel.id}: {e}')
+            if len(queue.entries) >= EMBEDS_PER_MESSAGE:
+                queue.full.set()
+        if not queue.entries and self._queues.get(queue.channel.id) is queue:
+            del self._queues[queue.channel.id]
+
+    async def close(self, timeout: float = 10) -> None:
+        """Send everything still queued, without waiting for the flush delay"""
+        self._closing = True
+        tasks = []
+        for queue in list(self._queues.values()):
+            queue.full.set()
+            if queue.task is None or queue.task.done():
+                queue.task = asyncio.ensure_future(self._worker(queue))
+            tasks.append(queue.task)
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,91 @@
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_traceback = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (the objects may change before
+        # the listener runs), but leave the layout to the listener's formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> dict:
+    """``"discord=WARNING,utils.storage=DEBUG"`` → ``{'discord': 30, 'utils.storage': 10}``"""
+    levels = {}
+    for part in spec.split(','):
+        name, _, level = part.partition('=')
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def setup_logging(path: str = 'bot.log', level: str = 'INFO', levels: str = '', json_format: bool = False,
+                  max_bytes: int = 10 * 1024 * 1024, backups: int = 5, when: str = '') -> logging.handlers.QueueListener:
+    """Route every log record through a queue to a background thread.
+
+    Loggers only put the record on a queue, so logging from the event loop
+    never waits on the file or terminal; a ``QueueListener`` thread does the
+    writing. The log file rotates at ``max_bytes`` (or on the ``when``
+    schedule of ``TimedRotatingFileHandler``, e.g. ``midnight``) keeping
+    ``backups`` old files. Returns the listener, which must be stopped on
+    exit to write out what is still queued.
+    """
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if path:
+        if when:
+            handlers.append(logging.handlers.TimedRotatingFileHandler(
+                path, when=when, backupCount=backups, encoding='utf-8'
+            ))
+        else:
+            handlers.append(logging.handlers.RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8'
+            ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(records))
+    root_level = logging.getLevelName(level.strip().upper())
+    root.setLevel(root_level if isinstance(root_level, int) else logging.INFO)
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict, deque
+from typing import Optional
+
+import discord
+
+BULK_DELETE_LIMIT = 100  # messages per bulk delete request
+BULK_DELETE_MAX_AGE = 14 * 24 * 3600 - 60  # Discord refuses to bulk delete older messages
+DISCORD_EPOCH = 1420070400000
+
+
+def snowflake_age(snowflake: int) -> float:
+    """Seconds since the snowflake was created"""
+    return time.time() - ((snowflake >> 22) + DISCORD_EPOCH) / 1000
+
+
+class RecentMessages:
+    """Recent message ids per (guild_id, user_id), so spam can be cleaned up
+    without scanning channel history.
+
+    Each key keeps its last ``per_key`` messages, at most ``max_keys`` keys
+    are tracked (the least recently active is dropped first) and ``sweep``
+    forgets keys idle longer than ``max_age``, which bounds memory during a
+    raid of thousands of accounts.
+    """
+
+    def __init__(self, per_key: int = 50, max_keys: int = 50000, max_age: float = 300):
+        self.per_key = per_key
+        self.max_keys = max_keys
+        self.max_age = max_age
+        self._messages = OrderedDict()  # key: deque of (monotonic time, channel_id, message_id)
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def add(self, key, channel_id: int, message_id: int) -> None:
+        messages = self._messages.get(key)
+        if messages is None:
+            messages = self._messages[key] = deque(maxlen=self.per_key)
+            if len(self._messages) > self.max_keys:
+                self._messages.popitem(last=False)
+        else:
+            self._messages.move_to_end(key)
+        messages.append((time.monotonic(), channel_id, message_id))
+
+    def pop(self, key, within: Optional[float] = None) -> list:
+        """Forget ``key`` and return its ``(channel_id, message_id)`` pairs,
+        only those from the last ``within`` seconds if given"""
+        messages = self._messages.pop(key, None)
+        if not messages:
+            return []
+        cutoff = time.monotonic() - (self.max_age if within is None else within)
+        return [(channel_id, message_id) for ts, channel_id, message_id in messages if ts >= cutoff]
+
+    def sweep(self) -> int:
+        """Drop keys with no messages in the last ``max_age`` seconds. Returns how many were dropped."""
+        cutoff = time.monotonic() - self.max_age
+        messages = self._messages
+        dropped = 0
+        while messages:
+            key, recent = next(iter(messages.items()))
+            if recent and recent[-1][0] >= cutoff:
+                break
+            messages.popitem(last=False)
+            dropped += 1
+        return dropped
+
+
+async def bulk_delete(guild: discord.Guild, refs, semaphore: asyncio.Semaphore, reason: Optional[str] = None) -> int:
+    """Delete ``(channel_id, message_id)`` pairs with as few requests as possible.
+
+    Messages are grouped by channel and deleted up to 100 per request, with
+    at most ``semaphore``'s worth of requests in flight. Returns how many
+    messages were covered by successful requests.
+    """
+    by_channel = defaultdict(list)
+    for channel_id, message_id in dict.fromkeys(refs):
+        if snowflake_age(message_id) < BULK_DELETE_MAX_AGE:
+            by_channel[channel_id].append(message_id)
+
+    async def delete(channel, message_ids: list) -> int:
+        async with semaphore:
+            try:
+                # A single message goes through the normal delete endpoint
+                await channel.delete_messages([discord.Object(id=i) for i in message_ids], reason=reason)
+                return len(message_ids)
+            except discord.HTTPException:
+                return 0
+
+    jobs = []
+    for channel_id, message_ids in by_channel.items():
+        channel = guild.get_channel_or_thread(channel_id)
+        if not hasattr(channel, 'delete_messages'):
+            continue
+        for i in range(0, len(message_ids), BULK_DELETE_LIMIT):
+            jobs.append(delete(channel, message_ids[i:i + BULK_DELETE_LIMIT]))
+    return sum(await asyncio.gather(*jobs))
@@ -0,0 +1,65 @@
+"""Copy save_data.json and tickets.json into another storage backend.
+
+Usage:
+    python -m utils.migrate [--to sqlite|sharded] [--data save_data.json]
+                            [--tickets tickets.json] [--db synergy.db] [--dir data]
+
+Run it while the bot is stopped, then start the bot with STORAGE_BACKEND set
+to the same backend. The JSON files are left untouched; the sharded backend
+keeps using tickets.json directly.
+"""
+import argparse
+import logging
+import sys
+
+from utils.storage import JSONBackend, ShardedJSONBackend
+from utils.sqlite_backend import SQLiteBackend
+
+logger = logging.getLogger(__name__)
+
+
+def migrate(target, data_path: str = 'save_data.json', tickets_path: str = 'tickets.json') -> dict:
+    """Import the JSON save files into ``target``. Returns what was written."""
+    source = JSONBackend(data_path, tickets_path)
+    data = source.load()
+
+    # Anything already in the target but not in the source is removed, so
+    # re-running the migration overwrites instead of merging
+    removed = set(target.keys()) - set(data)
+
+    try:
+        written = target.write(data, removed, list(data.keys()))
+        tickets = 0
+        if isinstance(target, SQLiteBackend):
+            tickets = target.write_tickets(source.load_tickets())
+    finally:
+        target.close()
+
+    return {'keys': len(data), 'written': written, 'tickets': tickets}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Migrate Synergy JSON data to another storage backend')
+    parser.add_argument('--to', choices=('sqlite', 'sharded'), default='sqlite', help='Target backend')
+    parser.add_argument('--data', default='save_data.json', help='Path to save_data.json')
+    parser.add_argument('--tickets', default='tickets.json', help='Path to tickets.json')
+    parser.add_argument('--db', default='synergy.db', help='SQLite database to write')
+    parser.add_argument('--dir', default='data', help='Directory for per-guild shard files')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    if args.to == 'sqlite':
+        target, location = SQLiteBackend(args.db), args.db
+    else:
+        target, location = ShardedJSONBackend(args.dir, args.tickets), args.dir
+
+    counts = migrate(target, args.data, args.tickets)
+    logger.info(
+        f"Migrated {counts['keys']} keys ({counts['written']:,} rows/bytes written) and "
+        f"{counts['tickets']} tickets into {location}"
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import logging
+import time
+from functools import cached_property
+
+from utils.textnorm import fold
+
+logger = logging.getLogger(__name__)
+
+
+class MessageContext:
+    """What every message stage needs, worked out at most once per message"""
+
+    def __init__(self, message, settings):
+        self.message = message
+        self.guild = message.guild
+        self.author = message.author
+        self.settings = settings
+        self.verdict = None  # set by a moderation stage to stop the stages after it
+
+    @cached_property
+    def normalized(self) -> str:
+        """Lowercased content with look-alike and invisible characters folded (see utils.textnorm)"""
+        return fold(self.message.content)
+
+    @cached_property
+    def exempt(self) -> bool:
+        """Whether the author is exempt from automod (administrator or an exempt role)"""
+        if self.author.guild_permissions.administrator:
+            return True
+        exempt_roles = self.settings.automod.exempt_roles
+        return bool(exempt_roles) and any(role.id in exempt_roles for role in self.author.roles)
+
+    def stop(self, verdict: str) -> None:
+        """Record a moderation verdict; later stages are skipped"""
+        self.verdict = verdict
+
+
+class StageStats:
+    __slots__ = ('calls', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float) -> None:
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class MessagePipeline:
+    """Runs the guild message handlers of every cog in priority order.
+
+    Cogs register a stage (``async def stage(ctx: MessageContext)``) instead
+    of listening to ``on_message`` themselves, so the guild/bot checks and
+    settings lookup happen once per message. Lower priorities run first; a
+    stage that calls ``ctx.stop()`` (e.g. automod deleting the message)
+    ends the run, so a deleted message doesn't go on to earn XP. Time spent
+    in each stage is kept in ``stats``.
+    """
+
+    def __init__(self):
+        self._stages = []  # (priority, name, callback), sorted
+        self.stats = {}  # name: StageStats
+
+    def __len__(self) -> int:
+        return len(self._stages)
+
+    def register(self, name: str, callback, priority: int = 100) -> None:
+        self.unregister(name)
+        self._stages.append((priority, name, callback))
+        self._stages.sort(key=lambda stage: (stage[0], stage[1]))
+        self.stats.setdefault(name, StageStats())
+
+    def unregister(self, name: str) -> None:
+        self._stages = [stage for stage in self._stages if stage[1] != name]
+
+    async def run(self, message, settings) -> MessageContext:
+        ctx = MessageContext(message, settings)
+        clock = time.perf_counter
+        for _, name, callback in self._stages:
+            start = clock()
+            try:
+                await callback(ctx)
+            except Exception as e:
+                logger.error(f'[ERROR] Message stage {name} failed: {e}')
+            self.stats[name].add(clock() - start)
+            if ctx.verdict is not None:
+                break
+        return ctx
+
+    def report(self) -> list:
+        """``(name, calls, average ms, max ms)`` per stage, slowest total first"""
+        rows = [
+            (name, stats.calls, stats.total / stats.calls * 1000 if stats.calls else 0.0, stats.max * 1000)
+            for name, stats in self.stats.items()
+        ]
+        rows.sort(key=lambda row: row[1] * row[2], reverse=True)
+        return rows
+
+    def reset_stats(self) -> None:
+        for name in self.stats:
+            self.stats[name] = StageStats()
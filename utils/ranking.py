@@ -0,0 +1,170 @@
+from bisect import bisect_left, bisect_right, insort
+
+
+class _SortedBlocks:
+    """Sorted list stored as a list of small sorted blocks.
+
+    A Fenwick tree over the block lengths turns "position of an item" and
+    "item at position N" into O(log n) operations, while inserts and removals
+    only shift one block of at most ``2 * load`` items.
+    """
+
+    def __init__(self, items=(), load: int = 512):
+        self._load = load
+        self._build(sorted(items))
+
+    def _build(self, items: list) -> None:
+        load = self._load
+        self._blocks = [items[i:i + load] for i in range(0, len(items), load)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(items)
+        self._rebuild_tree()
+
+    def _rebuild_tree(self) -> None:
+        tree = [0] + [len(block) for block in self._blocks]
+        for i in range(1, len(tree)):
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, block_index: int, delta: int) -> None:
+        i = block_index + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, block_index: int) -> int:
+        """Number of items stored before ``block_index``"""
+        total = 0
+        i = block_index
+        tree = self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _locate(self, position: int) -> tuple:
+        """Map an absolute position to (block index, offset in block)"""
+        tree = self._tree
+        index = 0
+        step = 1 << (len(tree).bit_length() - 1)
+        while step:
+            nxt = index + step
+            if nxt < len(tree) and tree[nxt] <= position:
+                index = nxt
+                position -= tree[nxt]
+            step >>= 1
+        return index, position
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, item) -> None:
+        if not self._blocks:
+            self._build([item])
+            return
+        i = bisect_right(self._maxes, item)
+        if i == len(self._blocks):
+            i -= 1
+            self._blocks[i].append(item)
+            self._maxes[i] = item
+        else:
+            insort(self._blocks[i], item)
+        self._len += 1
+
+        block = self._blocks[i]
+        if len(block) > self._load * 2:
+            half = len(block) // 2
+            self._blocks[i:i + 1] = [block[:half], block[half:]]
+            self._maxes[i:i + 1] = [block[half - 1], block[-1]]
+            self._rebuild_tree()
+        else:
+            self._tree_add(i, 1)
+
+    def remove(self, item) -> bool:
+        i = bisect_left(self._maxes, item)
+        if i == len(self._blocks):
+            return False
+        block = self._blocks[i]
+        pos = bisect_left(block, item)
+        if pos == len(block) or block[pos] != item:
+            return False
+        del block[pos]
+        self._len -= 1
+        if not block:
+            del self._blocks[i]
+            del self._maxes[i]
+            self._rebuild_tree()
+        else:
+            self._maxes[i] = block[-1]
+            self._tree_add(i, -1)
+        return True
+
+    def index(self, item) -> int:
+        """Position of ``item``; it must be present"""
+        i = bisect_left(self._maxes, item)
+        return self._prefix(i) + bisect_left(self._blocks[i], item)
+
+    def islice(self, start: int, stop: int):
+        start, stop = max(0, start), min(stop, self._len)
+        if start >= stop:
+            return
+        i, offset = self._locate(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = self._blocks[i][offset:offset + remaining]
+            yield from chunk
+            remaining -= len(chunk)
+            i, offset = i + 1, 0
+
+
+class RankIndex:
+    """Members of one guild ordered by score, highest first.
+
+    ``rank`` and ``page`` cost O(log n + page size), and ``update`` keeps
+    the order current as scores change. Ties are ordered by member ID.
+    """
+
+    def __init__(self, scores: dict = None):
+        scores = {str(member): int(score) for member, score in (scores or {}).items()}
+        self._scores = scores
+        self._order = _SortedBlocks((-score, member) for member, score in scores.items())
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member) -> bool:
+        return str(member) in self._scores
+
+    def score(self, member):
+        return self._scores.get(str(member))
+
+    def update(self, member, score: int) -> None:
+        member, score = str(member), int(score)
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._order.remove((-old, member))
+        self._scores[member] = score
+        self._order.add((-score, member))
+
+    def discard(self, member) -> None:
+        member = str(member)
+        old = self._scores.pop(member, None)
+        if old is not None:
+            self._order.remove((-old, member))
+
+    def rank(self, member):
+        """1-based position of ``member``, or None if it isn't ranked"""
+        member = str(member)
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        return self._order.index((-score, member)) + 1
+
+    def page(self, start: int, count: int) -> list:
+        """``count`` (member, score) pairs starting at 0-based position ``start``"""
+        return [(member, -score) for score, member in self._order.islice(start, start + count)]
@@ -0,0 +1,76 @@
+import time
+from collections import OrderedDict, deque
+
+
+class SlidingWindow:
+    """Counts recent events per key, e.g. messages per (guild, user).
+
+    Each key keeps a ring buffer of its last ``limit`` event times, so a hit
+    is O(1): the limit is reached when the buffer is full and its oldest
+    entry is still inside the interval. Keys are kept in least-recently-hit
+    order, which lets ``sweep`` stop at the first active key and lets the
+    ``max_keys`` cap evict the stalest key when a flood of new keys arrives.
+
+    A key whose threshold changed is rebuilt and still moves to the end:
+
+    >>> import time
+    >>> window = SlidingWindow(max_keys=2)
+    >>> _ = window.hit('a', 5, 60), window.hit('b', 5, 60)
+    >>> time.sleep(0.05)
+    >>> _ = window.hit('a', 3, 60)  # 'a' lowered its threshold
+    >>> window.sweep(0.02)  # 'b' is idle even though it was hit after 'a' first was
+    1
+    >>> _ = window.hit('b', 5, 60), window.hit('a', 4, 60), window.hit('c', 5, 60)
+    >>> 'a' in window, 'b' in window, 'c' in window  # the cap evicts 'b', not the just-hit 'a'
+    (True, False, True)
+    """
+
+    def __init__(self, max_keys: int = 50000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()  # key: deque of monotonic timestamps
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def __contains__(self, key) -> bool:
+        return key in self._windows
+
+    def hit(self, key, limit: int, interval: float) -> bool:
+        """Record an event. Returns True once ``limit`` events fall within ``interval`` seconds."""
+        now = time.monotonic()
+        limit = max(1, int(limit))
+        window = self._windows.get(key)
+        if window is None or window.maxlen != limit:
+            # New key, or the guild changed its threshold; reinserting puts it last
+            window = deque(self._windows.pop(key, None) or (), maxlen=limit)
+            self._windows[key] = window
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(key)
+        window.append(now)
+        return len(window) == limit and now - window[0] <= interval
+
+    def count(self, key, interval: float) -> int:
+        """Number of recorded events for ``key`` within the last ``interval`` seconds"""
+        window = self._windows.get(key)
+        if not window:
+            return 0
+        cutoff = time.monotonic() - interval
+        return sum(1 for ts in window if ts >= cutoff)
+
+    def reset(self, key) -> None:
+        self._windows.pop(key, None)
+
+    def sweep(self, max_idle: float) -> int:
+        """Drop keys with no events in the last ``max_idle`` seconds. Returns how many were dropped."""
+        cutoff = time.monotonic() - max_idle
+        windows = self._windows
+        dropped = 0
+        while windows:
+            key, window = next(iter(windows.items()))
+            if window and window[-1] >= cutoff:
+                break
+            windows.popitem(last=False)
+            dropped += 1
+        return dropped
@@ -0,0 +1,156 @@
+import itertools
+import logging
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FOOTER_TEXT = 'Synergy Bot'
+
+
+class AutomodSettings(NamedTuple):
+    enabled: bool = False
+    anti_spam: bool = True
+    anti_raid: bool = True
+    spam_threshold: int = 5  # messages
+    spam_interval: float = 5  # seconds
+    spam_action: str = 'mute'  # warn, mute, kick, ban
+    raid_threshold: int = 5  # joins
+    raid_interval: float = 10  # seconds
+    banned_words: tuple = ()
+    banned_words_action: str = 'delete'  # delete, warn, mute
+    banned_words_whole_word: bool = False
+    mention_spam: bool = True
+    mention_limit: int = 5
+    caps_spam: bool = True
+    caps_percentage: float = 70
+    link_spam: bool = False
+    link_filter: bool = True  # delete links to blocked domains
+    allowed_domains: tuple = ()
+    blocked_domains: tuple = ()
+    duplicate_spam: bool = False
+    duplicate_authors: int = 3  # different accounts posting the same text
+    duplicate_interval: float = 30  # seconds
+    raid_mode_auto: bool = False  # turn raid mode on when a raid is detected
+    raid_mode_action: str = 'kick'  # none, kick, ban
+    raid_mode_window: int = 120  # joins this recent are treated as raiders
+    raid_concurrency: int = 8  # API requests in flight at once during raid mode
+    exempt_roles: frozenset = frozenset()
+    rules: tuple = ()  # custom rules, see /automodrule
+    log_actions: bool = True
+
+
+class LevelingSettings(NamedTuple):
+    enabled: bool = False
+    xp_min: int = 15
+    xp_max: int = 25
+    xp_cooldown: float = 60  # seconds
+    level_up_message: bool = True
+    level_up_channel: Optional[int] = None  # None = same channel
+    level_roles: MappingProxyType = MappingProxyType({})  # level: role_id
+    ignored_channels: frozenset = frozenset()
+    xp_multiplier: float = 1.0
+    announce_levelup: bool = True
+
+
+class GuildSettings(NamedTuple):
+    version: int  # unique per build; compare it to tell whether cached derived state is stale
+    footer_text: str
+    footer_icon: str
+    log_channel: Optional[int]
+    log_webhook: bool  # deliver logs through a webhook (see utils.webhooks)
+    muted_role: Optional[int]
+    raid_mode: bool
+    automod: AutomodSettings
+    leveling: LevelingSettings
+
+
+def defaults(settings_class) -> dict:
+    """A fresh, mutable dict of a settings class's defaults, for commands that edit and save a config"""
+    config = {}
+    for name, value in settings_class._field_defaults.items():
+        if isinstance(value, (tuple, frozenset)):
+            value = list(value)
+        elif isinstance(value, MappingProxyType):
+            value = dict(value)
+        config[name] = value
+    return config
+
+
+def _build(settings_class, config: dict):
+    values = {}
+    for name, default in settings_class._field_defaults.items():
+        value = config.get(name, default)
+        if value is None:
+            value = default
+        elif isinstance(default, tuple):
+            value = tuple(value)
+        elif isinstance(default, frozenset):
+            value = frozenset(value)
+        values[name] = value
+    return settings_class(**values)
+
+
+def _build_leveling(config: dict) -> LevelingSettings:
+    settings = _build(LevelingSettings, config)
+    # Stored with string keys (JSON); handlers look them up by int level
+    level_roles = {}
+    for level, role_id in settings.level_roles.items():
+        try:
+            level_roles[int(level)] = role_id
+        except (TypeError, ValueError):
+            # Raising here would break every message handler of the guild
+            logger.warning(f'Ignoring level role with a non-numeric level: {level!r}')
+    return settings._replace(level_roles=MappingProxyType(level_roles))
+
+
+class SettingsCache:
+    """Read-only, typed settings per guild, built from the guild data once.
+
+    Handlers call ``bot.settings.get(guild.id)`` and read attributes instead
+    of rebuilding default dicts from ``bot.data`` on every event. Commands
+    that change settings save with ``bot.save_settings``, which drops the
+    guild's entry (plain ``save_data`` doesn't, so giveaway entries and the
+    like keep the cache warm); the next ``get`` rebuilds it with a new
+    ``version``, and caches derived from settings (compiled rules, matchers)
+    keep the version they were built from and rebuild when it changes.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._settings = {}  # guild_id (int): GuildSettings
+        self._versions = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._settings)
+
+    def get(self, guild_id: int) -> GuildSettings:
+        settings = self._settings.get(guild_id)
+        if settings is None:
+            settings = self._settings[guild_id] = self._build(guild_id)
+        return settings
+
+    def _build(self, guild_id: int) -> GuildSettings:
+        guild_data = self.bot.data.get(str(guild_id), {})
+        return GuildSettings(
+            version=next(self._versions),
+            footer_text=guild_data.get('footer_text', DEFAULT_FOOTER_TEXT),
+            footer_icon=guild_data.get('footer_icon', ''),
+            log_channel=guild_data.get('log_channel'),
+            log_webhook=bool(guild_data.get('log_webhook')),
+            muted_role=guild_data.get('muted_role'),
+            raid_mode=bool(guild_data.get('raid_mode')),
+            automod=_build(AutomodSettings, guild_data.get('automod', {})),
+            leveling=_build_leveling(guild_data.get('leveling', {}))
+        )
+
+    def invalidate(self, *guild_ids) -> None:
+        """Forget the settings of ``guild_ids`` (ints or strings), or of every guild if none are given"""
+        if not guild_ids:
+            self._settings.clear()
+            return
+        for guild_id in guild_ids:
+            try:
+                self._settings.pop(int(guild_id), None)
+            except (TypeError, ValueError):
+                pass  # not a guild key, e.g. 'leveling'
@@ -0,0 +1,330 @@
+import json
+import logging
+import sqlite3
+
+from utils.storage import file_sizes
+
+logger = logging.getLogger(__name__)
+
+# Guild sub-dicts that get one row per entry instead of one blob per guild
+ROW_DOMAINS = ('economy', 'warnings', 'giveaways', 'reaction_roles', 'cooldowns')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, name)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS economy (
+    guild_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, item_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS warnings (
+    guild_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, item_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS giveaways (
+    guild_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, item_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS reaction_roles (
+    guild_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, item_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS cooldowns (
+    guild_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (guild_id, item_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS leveling (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    xp INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 0,
+    messages INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (guild_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS leveling_guild_xp ON leveling (guild_id, xp DESC);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    channel_id TEXT PRIMARY KEY,
+    guild_id TEXT,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tickets_guild ON tickets (guild_id);
+"""
+
+
+def _encode(value) -> str:
+    return json.dumps(value, separators=(',', ':'))
+
+
+class SQLiteBackend:
+    """SQLite storage with one table per data domain.
+
+    Writes happen on the DataStore's worker thread, which owns the main
+    connection. Writes are diffed against what was last written, so a flush
+    only touches the rows that actually changed. ``load_key`` uses a separate
+    read connection (WAL lets it run alongside the writer) so guilds can be
+    loaded on demand from the event loop.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str = 'synergy.db'):
+        self.path = path
+        self._conn = None
+        self._reader = None
+        self._rows = {}  # top-level key: {(table, item_id): encoded row}
+        self.sizes = {}  # top-level key: approximate encoded size in bytes
+        self._ticket_rows = None  # channel_id: (guild_id, encoded ticket)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    @property
+    def reader(self) -> sqlite3.Connection:
+        if self._reader is None:
+            self.conn  # make sure the schema exists
+            # Only used from the event loop, but closed from the worker thread
+            self._reader = sqlite3.connect(self.path, check_same_thread=False)
+        return self._reader
+
+    # -- Encoding ---------------------------------------------------------
+
+    def _rows_for(self, key: str, value: dict) -> dict:
+        """Split one top-level value into table rows"""
+        rows = {}
+        if key == 'leveling':
+            # Legacy flat layout: {"guild:user": {...}}
+            for item_id, user in value.items():
+                rows[('leveling', item_id)] = (
+                    int(user.get('xp', 0)), int(user.get('level', 0)), int(user.get('messages', 0))
+                )
+            return rows
+
+        for name, sub in value.items():
+            if name == 'leveling_users' and isinstance(sub, dict):
+                for user_id, user in sub.items():
+                    rows[('leveling', str(user_id))] = (
+                        int(user.get('xp', 0)), int(user.get('level', 0)), int(user.get('messages', 0))
+                    )
+            elif name in ROW_DOMAINS and isinstance(sub, dict):
+                for item_id, item in sub.items():
+                    rows[(name, str(item_id))] = _encode(item)
+            else:
+                rows[('guild_settings', name)] = _encode(sub)
+        return rows
+
+    def _leveling_ids(self, key: str, item_id: str) -> tuple:
+        if key == 'leveling':
+            guild_id, _, user_id = item_id.partition(':')
+            return guild_id, user_id
+        return key, item_id
+
+    def _upsert(self, cur, key: str, table: str, item_id: str, row) -> None:
+        if table == 'leveling':
+            guild_id, user_id = self._leveling_ids(key, item_id)
+            cur.execute(
+                'INSERT OR REPLACE INTO leveling (guild_id, user_id, xp, level, messages) VALUES (?, ?, ?, ?, ?)',
+                (guild_id, user_id, *row)
+            )
+        elif table == 'guild_settings':
+            cur.execute(
+                'INSERT OR REPLACE INTO guild_settings (guild_id, name, value) VALUES (?, ?, ?)',
+                (key, item_id, row)
+            )
+        else:
+            cur.execute(
+                f'INSERT OR REPLACE INTO {table} (guild_id, item_id, value) VALUES (?, ?, ?)',
+                (key, item_id, row)
+            )
+
+    def _delete(self, cur, key: str, table: str, item_id: str) -> None:
+        if table == 'leveling':
+            guild_id, user_id = self._leveling_ids(key, item_id)
+            cur.execute('DELETE FROM leveling WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))
+        elif table == 'guild_settings':
+            cur.execute('DELETE FROM guild_settings WHERE guild_id = ? AND name = ?', (key, item_id))
+        else:
+            cur.execute(f'DELETE FROM {table} WHERE guild_id = ? AND item_id = ?', (key, item_id))
+
+    def _delete_key(self, cur, key: str) -> None:
+        # The legacy ``leveling`` key shares its rows with the guilds it was
+        # split into, so dropping it only forgets the key itself
+        if key != 'leveling':
+            cur.execute('DELETE FROM guild_settings WHERE guild_id = ?', (key,))
+            cur.execute('DELETE FROM leveling WHERE guild_id = ?', (key,))
+            for table in ROW_DOMAINS:
+                cur.execute(f'DELETE FROM {table} WHERE guild_id = ?', (key,))
+        cur.execute('DELETE FROM guilds WHERE guild_id = ?', (key,))
+
+    def _select_rows(self, conn, key: str) -> dict:
+        """Read the stored rows for one top-level key, encoded like ``_rows_for``"""
+        rows = {}
+        if key == 'leveling':
+            for guild_id, user_id, xp, level, messages in conn.execute(
+                'SELECT guild_id, user_id, xp, level, messages FROM leveling'
+            ):
+                rows[('leveling', f'{guild_id}:{user_id}')] = (xp, level, messages)
+            return rows
+
+        for name, value in conn.execute('SELECT name, value FROM guild_settings WHERE guild_id = ?', (key,)):
+            rows[('guild_settings', name)] = value
+        for table in ROW_DOMAINS:
+            for item_id, value in conn.execute(f'SELECT item_id, value FROM {table} WHERE guild_id = ?', (key,)):
+                rows[(table, item_id)] = value
+        for user_id, xp, level, messages in conn.execute(
+            'SELECT user_id, xp, level, messages FROM leveling WHERE guild_id = ?', (key,)
+        ):
+            rows[('leveling', user_id)] = (xp, level, messages)
+        return rows
+
+    def _rows_to_value(self, key: str, rows: dict) -> dict:
+        value = {}
+        for (table, item_id), row in rows.items():
+            if table == 'leveling':
+                xp, level, messages = row
+                user = {'xp': xp, 'level': level, 'messages': messages}
+                if key == 'leveling':
+                    value[item_id] = user
+                else:
+                    value.setdefault('leveling_users', {})[item_id] = user
+            elif table == 'guild_settings':
+                value[item_id] = json.loads(row)
+            else:
+                value.setdefault(table, {})[item_id] = json.loads(row)
+        return value
+
+    def _row_size(self, rows: dict) -> int:
+        return sum(len(row) if isinstance(row, str) else 24 for row in rows.values())
+
+    # -- Backend interface ------------------------------------------------
+
+    def keys(self) -> list:
+        return [row[0] for row in self.conn.execute('SELECT guild_id FROM guilds')]
+
+    def load_key(self, key: str):
+        """Load one guild (or ``leveling``) using the read connection"""
+        conn = self.reader
+        if conn.execute('SELECT 1 FROM guilds WHERE guild_id = ?', (key,)).fetchone() is None:
+            return None
+        rows = self._select_rows(conn, key)
+        self.sizes[key] = self._row_size(rows)
+        return self._rows_to_value(key, rows)
+
+    def load(self) -> dict:
+        data = {}
+        for key in self.keys():
+            rows = self._select_rows(self.conn, key)
+            data[key] = self._rows_to_value(key, rows)
+            self._rows[key] = rows
+            self.sizes[key] = self._row_size(rows)
+        logger.info(f'Data loaded from {self.path} ({len(data)} keys)')
+        return data
+
+    def forget(self, keys) -> None:
+        """Drop the diff baseline for evicted keys; it is re-read on next write"""
+        for key in keys:
+            self._rows.pop(key, None)
+
+    def load_tickets(self) -> dict:
+        return {
+            channel_id: json.loads(value)
+            for channel_id, value in self.conn.execute('SELECT channel_id, value FROM tickets')
+        }
+
+    def write(self, frozen: dict, removed: set, order: list) -> int:
+        touched = 0
+        staged = {}
+        with self.conn as conn:
+            cur = conn.cursor()
+            for key in removed:
+                self._delete_key(cur, key)
+                touched += 1
+
+            for key, value in frozen.items():
+                old = self._rows.get(key)
+                new = self._rows_for(key, value) if isinstance(value, dict) else {}
+                if old is None:
+                    # First write since this key was (lazily) loaded or created
+                    cur.execute('INSERT OR IGNORE INTO guilds (guild_id) VALUES (?)', (key,))
+                    old = self._select_rows(cur, key)
+                for (table, item_id), row in new.items():
+                    if old.get((table, item_id)) != row:
+                        self._upsert(cur, key, table, item_id, row)
+                        touched += 1
+                for table, item_id in old.keys() - new.keys():
+                    self._delete(cur, key, table, item_id)
+                    touched += 1
+                staged[key] = new
+
+        # Only remember the new rows once the transaction has committed
+        for key in removed:
+            self._rows.pop(key, None)
+            self.sizes.pop(key, None)
+        self._rows.update(staged)
+        for key, rows in staged.items():
+            self.sizes[key] = self._row_size(rows)
+        return touched
+
+    def write_tickets(self, tickets: dict) -> int:
+        rows = {str(channel_id): (str(t.get('guild_id')), _encode(t)) for channel_id, t in tickets.items()}
+        old = self._ticket_rows
+        if old is None:
+            old = {
+                channel_id: (guild_id, value)
+                for channel_id, guild_id, value in self.conn.execute('SELECT channel_id, guild_id, value FROM tickets')
+            }
+        touched = 0
+        with self.conn as conn:
+            for channel_id, row in rows.items():
+                if old.get(channel_id) != row:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO tickets (channel_id, guild_id, value) VALUES (?, ?, ?)',
+                        (channel_id, *row)
+                    )
+                    touched += 1
+            for channel_id in old.keys() - rows.keys():
+                conn.execute('DELETE FROM tickets WHERE channel_id = ?', (channel_id,))
+                touched += 1
+        self._ticket_rows = rows
+        return touched
+
+    def disk_size(self) -> int:
+        # Deleted rows leave free pages that SQLite reuses rather than returning to the file system
+        return file_sizes(self.path, f'{self.path}-wal')
+
+    def close(self) -> None:
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,591 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+from utils.journal import apply_record
+
+logger = logging.getLogger(__name__)
+
+
+def freeze(value):
+    """Copy JSON-style data (dicts, lists and scalars) so it can be handed to
+    another thread. Much cheaper than ``copy.deepcopy`` for plain data."""
+    if isinstance(value, dict):
+        return {k: freeze(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [freeze(v) for v in value]
+    return value
+
+
+def file_sizes(*paths) -> int:
+    """Total size in bytes of the given files; missing ones count as 0"""
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except (OSError, TypeError):
+            pass
+    return total
+
+
+def atomic_write(path: str, payload: str) -> None:
+    """Write ``payload`` to ``path`` without ever leaving a half-written file.
+
+    The data goes to a temp file in the same directory, is fsynced, and then
+    renamed over the target. The previous version is kept as ``<path>.bak``.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = f'{path}.tmp'
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if os.path.exists(path):
+        os.replace(path, f'{path}.bak')
+    os.replace(tmp_path, path)
+
+    # Make the rename itself durable
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class JSONBackend:
+    """Single-document backend: ``save_data.json`` plus ``tickets.json``.
+
+    Each top-level key's encoded JSON is cached, so only changed keys are
+    re-encoded; the file itself is always rewritten in full.
+    """
+
+    name = 'json'
+
+    def __init__(self, path: str = 'save_data.json', tickets_path: str = 'tickets.json'):
+        self.path = path
+        self.tickets_path = tickets_path
+        self._fragments = {}  # key: serialized JSON
+
+    def _read(self, path: str):
+        """Read a JSON file, falling back to its ``.bak`` if it is corrupt.
+
+        A corrupt file is moved aside (never overwritten). Returns None if
+        neither file exists.
+        """
+        for candidate in (path, f'{path}.bak'):
+            try:
+                with open(candidate, 'r', encoding='utf-8') as f:
+                    loaded = json.load(f)
+            except FileNotFoundError:
+                continue
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                corrupt_path = f'{candidate}.corrupt-{int(time.time())}'
+                os.replace(candidate, corrupt_path)
+                logger.error(f'Save file {candidate} is corrupt ({e}), moved to {corrupt_path}')
+                continue
+            if candidate != path:
+                logger.warning(f'Recovered data from backup {candidate}')
+            return loaded
+        return None
+
+    def load(self) -> dict:
+        loaded = self._read(self.path)
+        if loaded is None:
+            self._fragments = {}
+            logger.info('No save file found, starting with empty data')
+            return {}
+        # Prime the cache so the first flush only re-encodes what changed
+        self._fragments = {
+            key: json.dumps(value, separators=(',', ':')) for key, value in loaded.items()
+        }
+        logger.info('Data loaded successfully')
+        return loaded
+
+    def load_tickets(self) -> dict:
+        loaded = self._read(self.tickets_path) or {}
+        return loaded.get('tickets', {})
+
+    def write(self, frozen: dict, removed: set, order: list) -> int:
+        for key in removed:
+            self._fragments.pop(key, None)
+        for key, value in frozen.items():
+            self._fragments[key] = json.dumps(value, separators=(',', ':'))
+
+        payload = '{' + ','.join(
+            f'{json.dumps(key)}:{self._fragments[key]}'
+            for key in order if key in self._fragments
+        ) + '}'
+        atomic_write(self.path, payload)
+        return len(payload)
+
+    def write_tickets(self, tickets: dict) -> int:
+        payload = json.dumps({'tickets': tickets}, indent=2)
+        atomic_write(self.tickets_path, payload)
+        return len(payload)
+
+    def disk_size(self) -> int:
+        """Bytes the saved data takes on disk"""
+        return file_sizes(self.path, self.tickets_path)
+
+    def close(self) -> None:
+        pass
+
+
+class ShardedJSONBackend(JSONBackend):
+    """One JSON file per top-level key (``data/<guild_id>.json``).
+
+    Keys can be loaded individually, so the store only reads a guild when it
+    is first used, and a write only re-serializes the guilds that changed.
+    """
+
+    name = 'sharded'
+
+    def __init__(self, directory: str = 'data', tickets_path: str = 'tickets.json'):
+        super().__init__(path=None, tickets_path=tickets_path)
+        self.directory = directory
+        self.sizes = {}  # key: encoded size in bytes, for the memory budget
+        os.makedirs(directory, exist_ok=True)
+
+    def _shard_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{quote(key, safe='')}.json")
+
+    def keys(self) -> list:
+        keys = set()
+        for name in os.listdir(self.directory):
+            # A crash between the two renames in atomic_write leaves only the .bak
+            if name.endswith('.json.bak'):
+                name = name[:-len('.bak')]
+            if name.endswith('.json'):
+                keys.add(unquote(name[:-len('.json')]))
+        return sorted(keys)
+
+    def load_key(self, key: str):
+        """Read a single shard. Safe to call from the event loop thread."""
+        path = self._shard_path(key)
+        value = self._read(path)
+        if value is not None:
+            try:
+                self.sizes[key] = os.path.getsize(path)
+            except OSError:
+                pass
+        return value
+
+    def load(self) -> dict:
+        data = {}
+        for key in self.keys():
+            value = self.load_key(key)
+            if value is not None:
+                data[key] = value
+        logger.info(f'Data loaded from {self.directory} ({len(data)} shards)')
+        return data
+
+    def write(self, frozen: dict, removed: set, order: list) -> int:
+        size = 0
+        for key in removed:
+            self.sizes.pop(key, None)
+            path = self._shard_path(key)
+            for stale in (path, f'{path}.bak'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+        for key, value in frozen.items():
+            payload = json.dumps(value, separators=(',', ':'))
+            atomic_write(self._shard_path(key), payload)
+            self.sizes[key] = len(payload)
+            size += len(payload)
+        return size
+
+    def disk_size(self) -> int:
+        shards = [os.path.join(self.directory, name) for name in os.listdir(self.directory)]
+        return file_sizes(self.tickets_path, *shards)
+
+
+def create_backend(kind: str = 'json', **options):
+    """Build a storage backend by name (``json``, ``sharded`` or ``sqlite``)"""
+    kind = (kind or 'json').lower()
+    if kind == 'json':
+        return JSONBackend(**options)
+    if kind == 'sharded':
+        return ShardedJSONBackend(**options)
+    if kind == 'sqlite':
+        from utils.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(**options)
+    raise ValueError(f'Unknown storage backend: {kind}')
+
+
+class LazyData(MutableMapping):
+    """``bot.data`` for backends that can load one key at a time.
+
+    Only keys that have been used are kept in memory. A missing key is read
+    from the backend on first access; ``in`` checks never touch the disk.
+    Resident keys are kept in LRU order so the store can evict idle guilds.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._known = set()  # every key that exists, resident or not
+        self._resident = OrderedDict()
+        self._last_access = {}
+
+    def reset(self, keys) -> None:
+        self._known = set(keys)
+        self._resident.clear()
+        self._last_access.clear()
+
+    def __getitem__(self, key):
+        try:
+            value = self._resident[key]
+        except KeyError:
+            if key not in self._known:
+                raise
+            value = self._loader(key)
+            if value is None:
+                self._known.discard(key)
+                raise KeyError(key)
+            self._resident[key] = value
+        else:
+            self._resident.move_to_end(key)
+        self._last_access[key] = time.monotonic()
+        return value
+
+    def __setitem__(self, key, value) -> None:
+        self._resident[key] = value
+        self._resident.move_to_end(key)
+        self._known.add(key)
+        self._last_access[key] = time.monotonic()
+
+    def __delitem__(self, key) -> None:
+        if key not in self._known:
+            raise KeyError(key)
+        self._resident.pop(key, None)
+        self._last_access.pop(key, None)
+        self._known.discard(key)
+
+    def __contains__(self, key) -> bool:
+        return key in self._known
+
+    def __iter__(self):
+        return iter(list(self._known))
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def is_resident(self, key) -> bool:
+        return key in self._resident
+
+    def resident_keys(self) -> list:
+        """Resident keys, least recently used first"""
+        return list(self._resident)
+
+    def idle_for(self, key) -> float:
+        return time.monotonic() - self._last_access.get(key, 0)
+
+    def evict(self, key) -> None:
+        """Drop a key from memory. It stays known and reloads on next access."""
+        self._resident.pop(key, None)
+        self._last_access.pop(key, None)
+
+
+class DataStore:
+    """Write-behind store backing ``bot.data``.
+
+    Mutations only mark top-level keys (guild ids, ``leveling``) as dirty.
+    ``flush`` coalesces everything that changed since the last flush into a
+    single backend write, so callers can mark state dirty as often as they like.
+
+    Only dirty keys are copied on the event loop; encoding and disk I/O happen
+    on a dedicated worker thread, which is the only thread that ever writes to
+    the backend.
+
+    Backends that can load a single key (``load_key``) get a ``LazyData``
+    mapping instead of a plain dict: guilds are read on first access and
+    evicted once they have been idle for ``idle_ttl`` seconds, or earlier
+    (least recently used first) when resident data exceeds ``memory_budget``
+    bytes.
+
+    With a ``Journal``, high-churn changes (XP, balances, warnings) go through
+    ``record`` instead: a few bytes are appended to the journal and the key is
+    only snapshotted at the next compaction, every ``compact_interval``
+    seconds or once the journal reaches ``journal_max_bytes``.
+    """
+
+    def __init__(self, backend=None, flush_interval: float = 5.0,
+                 idle_ttl: float = 600.0, memory_budget: int = 0,
+                 journal=None, compact_interval: float = 300.0,
+                 journal_max_bytes: int = 16 * 1024 * 1024):
+        self.backend = backend or JSONBackend()
+        self.flush_interval = flush_interval
+        self.idle_ttl = idle_ttl
+        self.memory_budget = memory_budget
+        self.journal = journal
+        self.compact_interval = compact_interval
+        self.journal_max_bytes = journal_max_bytes
+        self._journaled = set()  # keys with changes only in the journal
+        self._last_compact = time.monotonic()
+        self._compacting = asyncio.Lock()
+        self.lazy = hasattr(self.backend, 'load_key')
+        self.data = LazyData(self.backend.load_key) if self.lazy else {}
+        self._dirty = set()
+        self._all_dirty = False
+        self._written = set()  # keys the backend has a copy of
+        self._tickets = None
+        self._tickets_dirty = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='datastore')
+        self._lock = asyncio.Lock()
+        self.last_flush = None
+
+    @property
+    def dirty(self) -> bool:
+        return self._all_dirty or bool(self._dirty) or self._tickets_dirty
+
+    def _run_sync(self, func, *args):
+        """Run a backend call on the worker thread and wait for it (startup only)"""
+        return self._executor.submit(func, *args).result()
+
+    def load(self) -> dict:
+        """Load saved data into ``self.data`` and return it"""
+        if self.lazy:
+            keys = self._run_sync(self.backend.keys)
+            self.data.reset(keys)
+            logger.info(f'Found {len(keys)} stored keys, loading on demand')
+        else:
+            loaded = self._run_sync(self.backend.load)
+            # Keep the same dict object so existing references stay valid
+            self.data.clear()
+            self.data.update(loaded)
+        self._dirty.clear()
+        self._all_dirty = False
+        self._written = set(self.data.keys())
+        return self.data
+
+    def load_tickets(self) -> dict:
+        return self._run_sync(self.backend.load_tickets)
+
+    def replay_journal(self) -> int:
+        """Apply journal records written since the last snapshot (startup only)"""
+        if self.journal is None:
+            return 0
+        records = self._run_sync(lambda: list(self.journal.read()))
+        for record in records:
+            apply_record(self.data, record)
+            self._journaled.add(record['k'])
+        if records:
+            logger.info(f'Replayed {len(records)} journal record(s) for {len(self._journaled)} key(s)')
+        return len(records)
+
+    def mark_dirty(self, *keys) -> None:
+        """Mark top-level keys as changed. With no keys, everything is dirty."""
+        if not keys:
+            self._all_dirty = True
+            return
+        for key in keys:
+            self._dirty.add(str(key))
+
+    def _append(self, line: str) -> None:
+        try:
+            self.journal.append(line)
+        except Exception as e:
+            logger.error(f'[ERROR] Failed to append to journal: {e}')
+
+    def record(self, key, path, value) -> None:
+        """Persist ``data[key][path...] = value`` as one journal record.
+
+        The caller has already made the change in memory. Without a journal
+        this just marks the key dirty.
+        """
+        key = str(key)
+        if self.journal is None:
+            self.mark_dirty(key)
+            return
+        # Encode now: the value may be mutated again before the worker runs
+        line = json.dumps({'k': key, 'p': [str(p) for p in path], 'v': value}, separators=(',', ':'))
+        self._journaled.add(key)
+        self._executor.submit(self._append, line)
+
+    def record_many(self, changes) -> None:
+        """``record`` for a batch of (key, path, value) changes, written in one append"""
+        if not changes:
+            return
+        if self.journal is None:
+            self.mark_dirty(*{key for key, _, _ in changes})
+            return
+        lines = []
+        for key, path, value in changes:
+            key = str(key)
+            lines.append(json.dumps({'k': key, 'p': [str(p) for p in path], 'v': value}, separators=(',', ':')))
+            self._journaled.add(key)
+        self._executor.submit(self._append, '\n'.join(lines))
+
+    def record_delete(self, key, path) -> None:
+        """Persist removal of ``data[key][path...]`` as one journal record"""
+        key = str(key)
+        if self.journal is None:
+            self.mark_dirty(key)
+            return
+        line = json.dumps({'k': key, 'p': [str(p) for p in path], 'op': 'del'}, separators=(',', ':'))
+        self._journaled.add(key)
+        self._executor.submit(self._append, line)
+
+    def save_tickets(self, tickets: dict) -> None:
+        """Schedule the tickets mapping to be written on the next flush"""
+        self._tickets = tickets
+        self._tickets_dirty = True
+
+    def _write(self, frozen: dict, removed: set, order: list, tickets) -> int:
+        """Runs on the worker thread"""
+        size = 0
+        if self.journal is not None:
+            # Keep replay from resurrecting keys that are being deleted
+            for key in removed:
+                self.journal.append(json.dumps({'k': key, 'op': 'del'}, separators=(',', ':')))
+        if frozen or removed:
+            size += self.backend.write(frozen, removed, order)
+        if tickets is not None:
+            size += self.backend.write_tickets(tickets)
+        return size
+
+    async def flush(self, force: bool = False) -> bool:
+        """Write pending changes to disk. Returns True if a write happened."""
+        async with self._lock:
+            if not self.dirty and not force:
+                return False
+
+            # Only the single-file backend needs the full key order
+            order = [] if self.lazy else list(self.data.keys())
+            if self._all_dirty or force:
+                changed = set(self.data.resident_keys() if self.lazy else order)
+                removed = self._written - set(self.data)
+            else:
+                changed = {k for k in self._dirty if self._is_resident(k)}
+                removed = {k for k in self._dirty if k not in self.data}
+            dirty_keys, all_dirty = set(self._dirty), self._all_dirty
+
+            # Copy-on-write handoff: the worker only ever sees this frozen copy,
+            # so cogs can keep mutating bot.data while the write is in flight.
+            frozen = {key: freeze(self.data[key]) for key in changed}
+            tickets = freeze(self._tickets) if self._tickets_dirty else None
+            self._dirty.clear()
+            self._all_dirty = False
+            self._tickets_dirty = False
+
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            try:
+                size = await loop.run_in_executor(
+                    self._executor, self._write, frozen, removed, order, tickets
+                )
+            except Exception:
+                # Put everything back so the next tick retries it
+                self._dirty.update(dirty_keys)
+                self._all_dirty = self._all_dirty or all_dirty
+                self._tickets_dirty = self._tickets_dirty or tickets is not None
+                raise
+
+            self._written.update(changed)
+            self._written.difference_update(removed)
+            self.last_flush = time.time()
+            logger.debug(
+                f'Data saved ({len(changed)} changed key(s), {size:,} bytes, '
+                f'{(time.perf_counter() - started) * 1000:.1f}ms)'
+            )
+            if self.lazy:
+                self._evict()
+            return True
+
+    def _is_resident(self, key) -> bool:
+        return self.data.is_resident(key) if self.lazy else key in self.data
+
+    def _evict(self) -> int:
+        """Drop clean guilds that are idle or over the memory budget"""
+        sizes = getattr(self.backend, 'sizes', {})
+        resident = self.data.resident_keys()
+        total = sum(sizes.get(key, 0) for key in resident)
+        # Never evict something touched in the last couple of flushes; a cog may
+        # still hold a reference to it across an await
+        min_idle = self.flush_interval * 2
+
+        evicted = []
+        for key in resident:  # least recently used first
+            idle = self.data.idle_for(key)
+            over_budget = self.memory_budget and total > self.memory_budget
+            if idle < self.idle_ttl and not (over_budget and idle >= min_idle):
+                break
+            if key in self._dirty or key in self._journaled:
+                continue
+            self.data.evict(key)
+            total -= sizes.get(key, 0)
+            evicted.append(key)
+
+        if evicted:
+            forget = getattr(self.backend, 'forget', None)
+            if forget:
+                self._executor.submit(forget, evicted)
+            logger.debug(f'Evicted {len(evicted)} idle key(s), {total:,} bytes resident')
+        return len(evicted)
+
+    async def compact(self) -> bool:
+        """Fold the journal into a snapshot and drop the covered segments"""
+        if self.journal is None:
+            return False
+        async with self._compacting:
+            loop = asyncio.get_running_loop()
+            # No await between taking the key set and sealing the journal, so
+            # every record in the sealed segments belongs to one of these keys
+            keys = set(self._journaled)
+            self._journaled.clear()
+            rotate = loop.run_in_executor(self._executor, self.journal.rotate)
+            try:
+                sealed = await rotate
+                # mark_dirty() with no keys would mark everything dirty
+                if keys:
+                    self.mark_dirty(*keys)
+                    await self.flush()
+            except Exception:
+                self._journaled.update(keys)
+                raise
+
+            await loop.run_in_executor(self._executor, self.journal.drop, sealed)
+            self._last_compact = time.monotonic()
+            if sealed:
+                logger.debug(f'Compacted journal into snapshot ({len(keys)} key(s))')
+            return bool(sealed)
+
+    def _disk_size(self) -> int:
+        size = self.backend.disk_size()
+        if self.journal is not None:
+            size += file_sizes(self.journal.path, *self.journal.sealed_segments())
+        return size
+
+    async def disk_size(self) -> int:
+        """Bytes the backend files and the journal take on disk, measured on the worker thread"""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._disk_size)
+
+    async def maybe_compact(self) -> bool:
+        """Compact if the interval has passed or the journal has grown too large"""
+        if self.journal is None:
+            return False
+        due = time.monotonic() - self._last_compact >= self.compact_interval
+        if due or self.journal.size >= self.journal_max_bytes:
+            return await self.compact()
+        return False
+
+    def close(self) -> None:
+        """Close the backend and stop the worker thread. Call after the final flush."""
+        if self.journal is not None:
+            self._run_sync(self.journal.close)
+        self._run_sync(self.backend.close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,123 @@
+"""Fold look-alike characters so content filters see what a reader sees.
+
+``fold(text)`` lowercases, drops invisible characters (zero-width spaces,
+joiners, bidi controls, variation selectors, combining marks) and maps
+confusables to plain ASCII: fullwidth and mathematical letters, accented
+Latin, Cyrillic/Greek homoglyphs, small caps, enclosed letters and common
+leetspeak. Everything is one precomputed ``str.translate`` table, so the
+cost is a single C-level pass over the message.
+
+Benchmark:
+    python -m utils.textnorm [--messages 20000]
+"""
+import argparse
+import sys
+import time
+import unicodedata
+
+INVISIBLE = (
+    [0x00AD, 0x034F, 0x061C, 0x115F, 0x1160, 0x17B4, 0x17B5, 0x180E, 0x3164, 0xFEFF, 0xFFA0]
+    + list(range(0x200B, 0x2010))  # zero-width space/joiners, LRM/RLM
+    + list(range(0x202A, 0x202F))  # bidi embedding and overrides
+    + list(range(0x2060, 0x2070))  # word joiner, invisible operators, bidi isolates
+    + list(range(0xFE00, 0xFE10))  # variation selectors
+    + list(range(0x0300, 0x0370))  # combining marks ("zalgo")
+    + list(range(0x1AB0, 0x1B00))
+    + list(range(0x1DC0, 0x1E00))
+    + list(range(0x20D0, 0x2100))
+    + list(range(0xE0000, 0xE0080))  # tag characters
+)
+
+# Homoglyphs with no compatibility decomposition (lowercase forms)
+HOMOGLYPHS = {
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p',
+    'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ѕ': 's', 'і': 'i', 'ї': 'i', 'ј': 'j', 'ԁ': 'd',
+    'ԛ': 'q', 'ԝ': 'w', 'һ': 'h', 'ӏ': 'l', 'ɡ': 'g',
+    # Greek
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w', 'ϲ': 'c', 'ϳ': 'j',
+    # Small capitals and other Latin look-alikes
+    'ᴀ': 'a', 'ʙ': 'b', 'ᴄ': 'c', 'ᴅ': 'd', 'ᴇ': 'e', 'ꜰ': 'f', 'ɢ': 'g', 'ʜ': 'h', 'ɪ': 'i',
+    'ᴊ': 'j', 'ᴋ': 'k', 'ʟ': 'l', 'ᴍ': 'm', 'ɴ': 'n', 'ᴏ': 'o', 'ᴘ': 'p', 'ʀ': 'r', 'ꜱ': 's',
+    'ᴛ': 't', 'ᴜ': 'u', 'ᴠ': 'v', 'ᴡ': 'w', 'ʏ': 'y', 'ᴢ': 'z', 'ı': 'i', 'ł': 'l', 'ø': 'o',
+    'đ': 'd', 'ħ': 'h', 'ß': 'ss', 'æ': 'ae', 'œ': 'oe',
+}
+
+LEETSPEAK = {
+    '0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b',
+    '@': 'a', '$': 's', '|': 'l', '€': 'e', '£': 'l',
+}
+
+# Blocks whose letters fold to ASCII through their compatibility form
+_COMPAT_RANGES = (
+    (0x00C0, 0x0250),  # accented Latin
+    (0x1E00, 0x1F00),  # Latin extended additional
+    (0x2070, 0x20A0),  # superscripts and subscripts
+    (0x2100, 0x2150),  # letterlike symbols
+    (0x2460, 0x2500),  # enclosed alphanumerics
+    (0xFF01, 0xFF5F),  # fullwidth ASCII
+    (0x1D400, 0x1D800),  # mathematical alphanumerics
+    (0x1F130, 0x1F18A),  # squared and circled letters
+)
+
+
+def _ascii_form(char: str) -> str:
+    """ASCII letters/digits a character is a styled version of, or '' if none"""
+    for form in ('NFKC', 'NFKD'):
+        folded = ''.join(c for c in unicodedata.normalize(form, char) if not unicodedata.combining(c))
+        folded = folded.lower()
+        if folded and folded.isascii() and (folded.isalnum() or len(folded) == 1):
+            return folded
+    return ''
+
+
+def _build_table() -> dict:
+    table = {}
+    for start, stop in _COMPAT_RANGES:
+        for code in range(start, stop):
+            char = chr(code)
+            if char.lower() != char:
+                continue  # uppercase is lowered before translating
+            folded = _ascii_form(char)
+            if folded and folded != char:
+                table[code] = folded
+    for char, folded in HOMOGLYPHS.items():
+        table[ord(char)] = folded
+    for char, folded in LEETSPEAK.items():
+        table[ord(char)] = folded
+    for code in INVISIBLE:
+        table[code] = None
+    return table
+
+
+TABLE = _build_table()
+
+
+def fold(text: str) -> str:
+    """Lowercase ``text`` and fold look-alike and invisible characters"""
+    return text.lower().translate(TABLE)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Measure the per-message cost of fold()')
+    parser.add_argument('--messages', type=int, default=20000, help='Messages per sample')
+    args = parser.parse_args(argv)
+
+    samples = {
+        'plain': 'hey everyone, is the event still happening tonight at 8? i might be late',
+        'obfuscated': 'ｆｒｅｅ n​і​trо gіvеаwаy!! сlаіm 𝐧𝐨𝐰 @ dіѕс0rd-gіft dоt соm',
+        'long': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 35,
+    }
+    print(f'{len(TABLE):,} entries in the translate table')
+    for name, message in samples.items():
+        start = time.perf_counter()
+        for _ in range(args.messages):
+            fold(message)
+        elapsed = time.perf_counter() - start
+        print(f'{name:>10} ({len(message):>4} chars): {elapsed / args.messages * 1e6:6.2f} µs per message')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import re
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from utils.textnorm import INVISIBLE
+
+# Bare "name.tld" text that is far more often a file name than a link
+FILE_EXTENSIONS = frozenset((
+    'py', 'js', 'ts', 'md', 'sh', 'rs', 'cs', 'db', 'gz', 'xz', 'so', 'ps', 'txt', 'png', 'jpg',
+    'jpeg', 'gif', 'webp', 'mp3', 'mp4', 'mov', 'wav', 'pdf', 'zip', 'rar', 'exe', 'dll', 'jar',
+    'json', 'yml', 'yaml', 'toml', 'ini', 'cfg', 'log', 'html', 'css', 'java', 'cpp', 'lua',
+))
+
+# TLDs a bare "name.tld" is accepted with. Prose with a missing space after a
+# period ("there.Then", "ok.cool") looks just like a domain, so TLDs that are
+# also everyday words (.is, .to, .me, .cool, .live, ...) only count with a
+# path or a www. prefix; full http(s) URLs are always links.
+BARE_TLDS = frozenset('''
+    com net org edu gov mil int info biz xyz top site online club icu vip click gift gifts link pro
+    app dev io gg co ai sh ly cc tk ml ga cf gq pw ws su ru ua by kz tv fm gl lol wtf xxx porn sex
+    ac ad ae af ag ar au aw az ba bd bg bh bi bj bn bo br bs bt bw bz ca cd ch ci ck cl cm cn cr cu
+    cv cw cx cy cz de dj dk dm dz ec ee eg er es et eu fi fj fk fr gd ge gf gh gi gm gn gp gr gs gt
+    gu gw gy hk hm hn hr ht hu ie il iq ir je jm jo jp ke kg kh ki km kn kp kr kw ky la lb lc li lk
+    lr ls lt lu lv ma mc md mg mh mk mm mn mo mp mq mr ms mt mu mv mw mx mz na nc ne nf ng ni nl np
+    nr nu nz om pa pe pf pg ph pk pl pm pn pr ps pt py qa re ro rs rw sa sb sc sd se sg si sk sl sm
+    sn sr ss st sv sx sy sz tc td tf tg th tj tl tm tn tr tt tw tz ug uk uy uz va vc ve vg vi vn vu
+    wf ye yt za zm zw
+'''.split())
+
+_INVISIBLE_TABLE = dict.fromkeys(INVISIBLE)
+_LINK = re.compile(
+    # [label](https://target), Discord's masked links
+    r'\[(?P<label>[^\]\n]*)\]\(\s*<?(?P<masked>https?://[^\s<>()]+)>?\s*\)'
+    # https://example.com/...
+    r'|(?P<url>https?://[^\s<>]+)'
+    # example.com, discord.gg/abc
+    r'|(?<![\w.@/:-])(?P<bare>(?:[^\W_](?:[\w-]{0,61}[^\W_])?\.)+(?P<tld>[^\W\d_]{2,24}))(?![\w-]|\.[^\W_])'
+    r'(?P<path>[/?#][^\s<>]*)?',
+    re.IGNORECASE
+)
+_DOMAIN = re.compile(r'^(?:[a-z0-9_](?:[a-z0-9_-]*[a-z0-9])?\.)*[a-z0-9](?:[a-z0-9-]*[a-z0-9])?$')
+_VERDICT = ''  # trie key holding a node's own verdict (labels are never empty)
+
+
+class Link(NamedTuple):
+    url: str
+    host: str
+    masked: bool
+
+
+def normalize_host(host: str) -> str:
+    """Lowercase, drop the trailing dot and IDNA-encode, so "DÍSCORD.com." and "xn--dscord-1ta.com" compare equal"""
+    host = host.strip().rstrip('.').lower()
+    if not host.isascii():
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+    return host
+
+
+def _url_host(url: str) -> Optional[str]:
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    return normalize_host(host) if host else None
+
+
+def _trim(url: str) -> str:
+    """Strip punctuation that ends the sentence rather than the URL"""
+    url = url.rstrip('.,;:!?\'"*_~')
+    if url.endswith(')') and url.count('(') < url.count(')'):
+        url = url[:-1]
+    return url
+
+
+def extract_links(text: str) -> list:
+    """Every link in a message: full URLs, masked links and bare domains like ``discord.gg/abc``
+
+    >>> [link.host for link in extract_links('join discord.gg/abc or [here](https://evil.ru/x)')]
+    ['discord.gg', 'evil.ru']
+    >>> [link.host for link in extract_links('see example.com, www.site.cool and news.today/story')]
+    ['example.com', 'www.site.cool', 'news.today']
+    >>> extract_links('i was there.Then left, ok.cool thanks, this.is fine and main.py')
+    []
+    """
+    if '.' not in text:
+        return []
+    text = text.translate(_INVISIBLE_TABLE)
+    links = []
+    for match in _LINK.finditer(text):
+        if match.group('masked'):
+            url, masked = match.group('masked'), True
+        elif match.group('url'):
+            url, masked = _trim(match.group('url')), False
+        else:
+            bare, path = match.group('bare'), _trim(match.group('path') or '')
+            tld = match.group('tld').lower()
+            if tld in FILE_EXTENSIONS:
+                continue
+            if tld not in BARE_TLDS and not path and not bare.lower().startswith('www.'):
+                continue  # "there.Then": a missing space, not a domain
+            url, masked = 'http://' + bare + path, False
+        host = _url_host(url)
+        if host:
+            links.append(Link(url, host, masked))
+    return links
+
+
+def normalize_domain(entry: str) -> Optional[str]:
+    """Turn a list entry (``example.com``, ``*.example.com``, a URL) into a bare domain, or None"""
+    entry = entry.strip()
+    if '://' in entry:
+        host = _url_host(entry)
+    else:
+        host = normalize_host(entry.split('/', 1)[0].lstrip('*').lstrip('.'))
+    if not host or not _DOMAIN.match(host):
+        return None
+    return host
+
+
+def parse_domain_list(lines) -> list:
+    """Domains from a blocklist file.
+
+    Understands plain lists, hosts files (``0.0.0.0 example.com``) and
+    adblock-style ``||example.com^`` rules; ``#`` and ``!`` start comments.
+    """
+    domains = []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line or line.startswith('!'):
+            continue
+        if line.startswith('||'):
+            line = line[2:].split('^', 1)[0]
+        parts = line.split()
+        if len(parts) > 1 and (parts[0][0].isdigit() or ':' in parts[0]):
+            parts = parts[1:]  # hosts file: address followed by names
+        for part in parts:
+            domain = normalize_domain(part)
+            if domain and domain not in ('localhost', 'localhost.localdomain', 'broadcasthost'):
+                domains.append(domain)
+    return domains
+
+
+class DomainIndex:
+    """Allow/deny verdicts for domains, stored as a trie of reversed labels.
+
+    ``mail.example.com`` is stored under com → example → mail, so a rule for
+    ``example.com`` also covers every subdomain and a lookup walks at most
+    one node per label of the host. The most specific rule wins, so a guild
+    can block ``example.com`` but allow ``docs.example.com``.
+
+    Nodes are dicts keyed by label; a domain with no rules below it is stored
+    as a plain bool, which keeps a blocklist of a few hundred thousand
+    domains to roughly one dict entry per domain.
+
+    A ``parent`` index (the bot-wide blocklist) is consulted as well; when
+    both have a rule, the more specific one wins and ties go to this index.
+    """
+
+    def __init__(self, parent: Optional['DomainIndex'] = None):
+        self.parent = parent
+        self._root = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, domain: str, allowed: bool) -> bool:
+        """Add a rule. Returns False if ``domain`` isn't a valid domain."""
+        domain = normalize_domain(domain)
+        if domain is None:
+            return False
+        labels = domain.split('.')[::-1]
+        node = self._root
+        for label in labels[:-1]:
+            child = node.get(label)
+            if child is None:
+                child = node[label] = {}
+            elif type(child) is bool:
+                child = node[label] = {_VERDICT: child}
+            node = child
+        last = labels[-1]
+        child = node.get(last)
+        if type(child) is dict:
+            if _VERDICT not in child:
+                self._size += 1
+            child[_VERDICT] = bool(allowed)
+        else:
+            if child is None:
+                self._size += 1
+            node[last] = bool(allowed)
+        return True
+
+    def update(self, domains, allowed: bool) -> int:
+        """Add many rules at once. Returns how many were valid."""
+        return sum(1 for domain in domains if self.add(domain, allowed))
+
+    def load(self, path: str, allowed: bool = False) -> int:
+        """Add every domain in a blocklist file (see parse_domain_list)"""
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return self.update(parse_domain_list(f), allowed)
+
+    def _match(self, labels: list) -> tuple:
+        """(depth, verdict) of the most specific rule covering the labels"""
+        node = self._root
+        depth, verdict = 0, None
+        for i, label in enumerate(labels, 1):
+            child = node.get(label)
+            if child is None:
+                break
+            if type(child) is bool:
+                return i, child
+            if _VERDICT in child:
+                depth, verdict = i, child[_VERDICT]
+            node = child
+        return depth, verdict
+
+    def lookup(self, host: str) -> Optional[bool]:
+        """True if ``host`` is allowed, False if blocked, None if no rule covers it"""
+        labels = host.split('.')[::-1]
+        depth, verdict = self._match(labels)
+        if self.parent is not None:
+            parent_depth, parent_verdict = self.parent._match(labels)
+            if parent_depth > depth:
+                return parent_verdict
+        return verdict
@@ -0,0 +1,112 @@
+import logging
+import time
+from typing import Optional
+
+import aiohttp
+import discord
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_NAME = 'Synergy Logs'
+RETRY_SECONDS = 600  # how long a channel the bot couldn't make a webhook in uses normal messages
+
+
+class WebhookPool:
+    """Delivers log messages through a webhook on each log channel.
+
+    Webhook executions are rate limited per webhook rather than per bot
+    channel route, so a busy log channel doesn't hold up command replies.
+    Every webhook shares one pooled ``aiohttp`` session. Webhooks are looked
+    up once per channel (reusing one this bot created earlier, so restarts
+    don't pile up webhooks) and cached; a webhook that was deleted is
+    recreated on the next send.
+
+    Guilds opt in with ``/setup log_webhook:True``; ``send`` returns False
+    when a guild hasn't, or the bot lacks Manage Webhooks, and the caller
+    falls back to a normal channel message.
+    """
+
+    def __init__(self, bot, connections: int = 20):
+        self.bot = bot
+        self.connections = connections
+        self._session = None
+        self._webhooks = {}  # channel_id: discord.Webhook
+        self._unavailable = {}  # channel_id: monotonic time the webhook setup failed
+
+    def __len__(self) -> int:
+        return len(self._webhooks)
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+
+    def enabled(self, channel) -> bool:
+        guild = getattr(channel, 'guild', None)
+        return guild is not None and self.bot.settings.get(guild.id).log_webhook
+
+    async def _fetch(self, channel) -> Optional[discord.Webhook]:
+        """The channel's webhook, created if needed; None if the bot may not manage webhooks there"""
+        if not hasattr(channel, 'create_webhook') or not channel.permissions_for(channel.guild.me).manage_webhooks:
+            return None
+        try:
+            for webhook in await channel.webhooks():
+                if webhook.user and webhook.user.id == self.bot.user.id and webhook.token:
+                    break
+            else:
+                avatar = await self.bot.user.display_avatar.read()
+                webhook = await channel.create_webhook(name=WEBHOOK_NAME, avatar=avatar, reason="Log delivery")
+        except discord.HTTPException as e:
+            logger.warning(f'Could not set up a log webhook in channel {channel.id}: {e}')
+            return None
+        # Rebind to the pooled session so executions skip the bot's HTTP client
+        return discord.Webhook.partial(webhook.id, webhook.token, session=self.session)
+
+    async def get(self, channel) -> Optional[discord.Webhook]:
+        webhook = self._webhooks.get(channel.id)
+        if webhook is not None:
+            return webhook
+        failed_at = self._unavailable.get(channel.id)
+        if failed_at is not None and time.monotonic() - failed_at < RETRY_SECONDS:
+            return None
+        webhook = await self._fetch(channel)
+        if webhook is None:
+            self._unavailable[channel.id] = time.monotonic()
+        else:
+            self._unavailable.pop(channel.id, None)
+            self._webhooks[channel.id] = webhook
+        return webhook
+
+    def forget(self, channel_id: int) -> None:
+        self._webhooks.pop(channel_id, None)
+        self._unavailable.pop(channel_id, None)
+
+    async def send(self, channel, embeds: list) -> bool:
+        """Post ``embeds`` through the channel's webhook. Returns False if the webhook can't be used."""
+        if not self.enabled(channel):
+            return False
+        for _ in range(2):
+            webhook = await self.get(channel)
+            if webhook is None:
+                return False
+            try:
+                await webhook.send(embeds=embeds, wait=False)
+                return True
+            except discord.NotFound:
+                # Deleted from the channel settings; make a new one once
+                self.forget(channel.id)
+            except discord.Forbidden:
+                self.forget(channel.id)
+                self._unavailable[channel.id] = time.monotonic()
+                return False
+        return False
+
+    async def close(self) -> None:
+        self._webhooks.clear()
+        self._unavailable.clear()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,93 @@
+from typing import Optional
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class WordMatcher:
+    """Finds any of a list of banned terms in a message in one pass.
+
+    The terms are compiled into an Aho-Corasick automaton, so matching costs
+    O(message length + matches) no matter how many terms there are.
+
+    With ``whole_word`` a term only matches when it isn't part of a longer
+    word. A ``*`` at the start or end of a term lifts that restriction on
+    that side, so ``bad*`` also matches "badly" and ``*bad`` matches "notbad".
+    Without ``whole_word`` every term already matches anywhere and the ``*``
+    is ignored. Matching is case-insensitive.
+    """
+
+    def __init__(self, words, whole_word: bool = False):
+        self.whole_word = whole_word
+        self._goto = [{}]  # node: {char: child node}
+        self._fail = [0]
+        self._out = [[]]  # node: indexes of terms ending here
+        self._link = [0]  # node: nearest fail ancestor with output (0 = none)
+        self._terms = []  # (original word, length, check start, check end)
+
+        for word in words:
+            term = str(word).lower()
+            open_start = term.startswith('*')
+            open_end = term.endswith('*') and len(term) > 1
+            term = term.strip('*')
+            if not term:
+                continue
+            self._add(term, (word, len(term), whole_word and not open_start, whole_word and not open_end))
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def _add(self, term: str, info: tuple) -> None:
+        node = 0
+        for char in term:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._link.append(0)
+            node = nxt
+        self._out[node].append(len(self._terms))
+        self._terms.append(info)
+
+    def _build(self) -> None:
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                link[child] = target if out[target] else link[target]
+
+    def find(self, text: str) -> Optional[str]:
+        """Return the first banned term found in ``text``, or None"""
+        if not self._terms:
+            return None
+        goto, fail, out, link, terms = self._goto, self._fail, self._out, self._link, self._terms
+        text = text.lower()
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+
+            match = node if out[node] else link[node]
+            while match:
+                for index in out[match]:
+                    word, length, check_start, check_end = terms[index]
+                    start = i - length + 1
+                    if check_start and start > 0 and _is_word_char(text[start - 1]):
+                        continue
+                    if check_end and i + 1 < len(text) and _is_word_char(text[i + 1]):
+                        continue
+                    return word
+                match = link[match]
+        return None